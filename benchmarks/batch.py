@@ -0,0 +1,89 @@
+# benchmarks/batch.py
+"""
+N per-unit CSVs: N sequential /api/upload/ requests vs one /api/upload/batch/
+request, as plain files and as a ZIP archive, for each pool size.
+
+    python -m benchmarks.batch --files 24 --rows 20000 --workers 1 2 4 8
+
+With W workers the batch should take about 1/W of the sequential time (plus
+the SQLite write lock, which the workers take turns on). Every run uses
+force=true so nothing is deduplicated.
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+import zipfile
+
+from .harness import setup_django
+from .synthetic import generate_plant_frame, to_csv_bytes
+
+
+def make_files(count, rows, seed):
+    return [(f'unit-{i:03d}.csv', to_csv_bytes(generate_plant_frame(rows, seed=seed + i)[0])) for i in range(count)]
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in files:
+            archive.writestr(f'shift/{name}', data)
+    return buffer.getvalue()
+
+
+def timed_post(client, path, data):
+    started = time.perf_counter()
+    response = client.post(path, data)
+    seconds = time.perf_counter() - started
+    if response.status_code not in (200, 201):
+        raise RuntimeError(f"{path} failed: {response.status_code} {response.content[:200]!r}")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=24)
+    parser.add_argument('--rows', type=int, default=20_000, help="rows per file")
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cv-bench-')
+    setup_django(db_file=os.path.join(workdir, 'bench.sqlite3'), media_dir=workdir)
+
+    from django.conf import settings
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+
+    from core.jobs import get_executor
+
+    # Forked workers inherit the test database settings
+    settings.INGEST_START_METHOD = 'fork'
+    client = Client()
+    files = make_files(args.files, args.rows, args.seed)
+    archive = make_zip(files)
+
+    sequential = sum(
+        timed_post(client, '/api/upload/', {'file': SimpleUploadedFile(name, data), 'force': 'true'})
+        for name, data in files
+    )
+    print(f"{args.files} files x {args.rows} rows, {os.cpu_count()} cpus")
+    print(f"{'sequential':<22} {sequential:>8.2f} s")
+
+    for workers in args.workers:
+        settings.INGEST_WORKERS = workers
+        get_executor(reset=True)
+        uploads = [SimpleUploadedFile(name, data) for name, data in files]
+        batch = timed_post(client, '/api/upload/batch/', {'files': uploads, 'force': 'true'})
+        zipped = timed_post(client, '/api/upload/batch/',
+                            {'files': SimpleUploadedFile('shift.zip', archive), 'force': 'true'})
+        combined = timed_post(client, '/api/upload/batch/',
+                              {'files': SimpleUploadedFile('shift.zip', archive), 'force': 'true', 'combine': 'true'})
+        for label, seconds in ((f'batch, {workers} workers', batch), (f'zip, {workers} workers', zipped),
+                               (f'combined, {workers} workers', combined)):
+            print(f"{label:<22} {seconds:>8.2f} s  x{sequential / seconds:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/compare.py
+"""
+Compare a benchmarks.endpoints result file with a stored baseline.
+
+    python -m benchmarks.compare results.json baseline.json --tolerance 0.25
+
+An entry (endpoint + rows) regresses when its time or peak RSS grows by more
+than the tolerance and by more than a small absolute margin (so 2 ms -> 3 ms
+on a tiny upload is not a regression), when it runs more SQL queries, or
+when the detector finds fewer of the injected anomalies. Exits with status 1
+if anything regressed, so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+# metric -> smallest absolute change worth reporting
+MARGINS = {'seconds': 0.05, 'peak_rss_mb': 20.0}
+RECALL_MARGIN = 0.02
+
+
+def load(path):
+    with open(path) as f:
+        data = json.load(f)
+    return data.get('meta', {}), {(entry['endpoint'], entry['rows']): entry for entry in data['results']}
+
+
+def compare(current, baseline, tolerance):
+    """
+    Returns (rows for the report, number of regressions).
+    """
+    report = []
+    regressions = 0
+    for key in sorted(current, key=lambda k: (k[1], k[0])):
+        new, old = current[key], baseline.get(key)
+        if old is None:
+            report.append((key, 'new', '', ''))
+            continue
+        for metric, margin in MARGINS.items():
+            before, after = old[metric], new[metric]
+            change = (after - before) / before if before else 0.0
+            regressed = change > tolerance and after - before > margin
+            regressions += regressed
+            report.append((key, metric, f"{before:g} -> {after:g} ({change:+.0%})", 'REGRESSION' if regressed else ''))
+        if new['queries'] > old['queries']:
+            regressions += 1
+            report.append((key, 'queries', f"{old['queries']} -> {new['queries']}", 'REGRESSION'))
+        if new['status'] != old['status']:
+            regressions += 1
+            report.append((key, 'status', f"{old['status']} -> {new['status']}", 'REGRESSION'))
+        if 'detection' in new and 'detection' in old:
+            before, after = old['detection']['recall'], new['detection']['recall']
+            regressed = after < before - RECALL_MARGIN
+            regressions += regressed
+            report.append((key, 'recall', f"{before:g} -> {after:g}", 'REGRESSION' if regressed else ''))
+    return report, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('results')
+    parser.add_argument('baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed relative growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    current_meta, current = load(args.results)
+    baseline_meta, baseline = load(args.baseline)
+    print(f"baseline {baseline_meta.get('commit')} ({baseline_meta.get('created')}) -> "
+          f"current {current_meta.get('commit')} ({current_meta.get('created')})")
+    if baseline_meta.get('platform') != current_meta.get('platform'):
+        print("warning: results come from different platforms, timings are not comparable")
+
+    report, regressions = compare(current, baseline, args.tolerance)
+    for (endpoint, rows), metric, change, flag in report:
+        print(f"{rows:>9}  {endpoint:<17} {metric:<12} {change:<32} {flag}")
+    missing = sorted(set(baseline) - set(current))
+    for endpoint, rows in missing:
+        print(f"{rows:>9}  {endpoint:<17} missing from the results")
+
+    print(f"{regressions} regression(s)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# benchmarks/endpoints.py
+"""
+End-to-end timings of the main API endpoints at growing upload sizes.
+
+    python -m benchmarks.endpoints --rows 1000 10000 100000 1000000 --output results.json
+    python -m benchmarks.compare results.json benchmarks/baseline.json
+
+For every size a seeded synthetic CSV (with --anomaly-rate of the rows made
+anomalous) is posted to /api/upload/ through the Django test client, then
+/api/summary/, /api/history/ and /api/export-pdf/ are requested twice: cold
+(response cache cleared, no PDF on disk) and warm. Each request records wall
+time, peak RSS of this process and the number of SQL queries. The PDF is
+rendered in the worker pool, so its RSS is not part of the export numbers.
+
+The upload entry also records how many of the injected anomalies were
+flagged, so a change to the detectors shows up as a quality change as well.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from .harness import ROOT, count_queries, peak_rss_mb, reset_peak_rss, setup_django
+from .synthetic import generate_plant_frame, to_csv_bytes
+
+GET_ENDPOINTS = [('summary', '/api/summary/'), ('history', '/api/history/'), ('export-pdf', '/api/export-pdf/')]
+
+
+def request(client, method, path, **data):
+    """
+    One measured request: wall time, peak RSS, queries, status and body size.
+    """
+    reset_peak_rss()
+    with count_queries() as queries:
+        started = time.perf_counter()
+        response = getattr(client, method)(path, data or None)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        seconds = time.perf_counter() - started
+    return response, {
+        'seconds': round(seconds, 4),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'queries': queries['queries'],
+        'status': response.status_code,
+        'bytes': len(body),
+    }
+
+
+def detection_quality(upload_id, injected):
+    from core.models import FileUpload
+    from core.storage import storage_for
+
+    upload = FileUpload.objects.get(pk=upload_id)
+    flagged = storage_for(upload).frame(upload, ['is_anomaly'])['is_anomaly'].to_numpy(dtype=bool)
+    hits = int((flagged & injected).sum())
+    return {
+        'injected': int(injected.sum()),
+        'flagged': int(flagged.sum()),
+        'recall': round(hits / max(int(injected.sum()), 1), 4),
+        'precision': round(hits / max(int(flagged.sum()), 1), 4),
+    }
+
+
+def run_size(client, rows, seed, anomaly_rate):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from core.caching import invalidate
+
+    frame, injected = generate_plant_frame(rows, seed=seed, anomaly_rate=anomaly_rate)
+    csv = SimpleUploadedFile(f'synthetic-{rows}.csv', to_csv_bytes(frame), content_type='text/csv')
+    del frame
+
+    results = []
+    # force=true: identical files from earlier runs must not be deduplicated
+    response, measured = request(client, 'post', '/api/upload/', file=csv, force='true')
+    if response.status_code != 201:
+        raise RuntimeError(f"Upload of {rows} rows failed: {response.status_code} {response.content[:200]!r}")
+    measured['detection'] = detection_quality(response.json()['id'], injected)
+    results.append(dict(endpoint='upload', rows=rows, **measured))
+
+    for name, path in GET_ENDPOINTS:
+        invalidate()
+        for phase in ('cold', 'warm'):
+            _, measured = request(client, 'get', path)
+            results.append(dict(endpoint=f'{name}:{phase}', rows=rows, **measured))
+    return results
+
+
+def metadata(args):
+    from django.conf import settings
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'anomaly_rate': args.anomaly_rate,
+        'detector': getattr(settings, 'ANOMALY_DETECTOR', None),
+        'storage': getattr(settings, 'UPLOAD_STORAGE_BACKEND', 'orm'),
+        'peak_rss_resettable': reset_peak_rss(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', nargs='+', type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--anomaly-rate', type=float, default=0.02)
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cv-bench-')
+    # On disk, so the worker pool that renders the PDFs sees the same database
+    setup_django(db_file=os.path.join(workdir, 'bench.sqlite3'), media_dir=workdir)
+
+    from django.conf import settings
+    from django.test import Client
+
+    # Forked workers inherit the test database settings; spawned ones would
+    # open the project's db.sqlite3
+    settings.INGEST_START_METHOD = 'fork'
+    settings.REPORT_WAIT_TIMEOUT = 3600
+    client = Client()
+
+    results = []
+    print(f"{'rows':>9}  {'endpoint':<17} {'seconds':>9} {'peak MB':>8} {'queries':>8} {'status':>6}")
+    for rows in args.rows:
+        for entry in run_size(client, rows, args.seed, args.anomaly_rate):
+            results.append(entry)
+            print(f"{rows:>9}  {entry['endpoint']:<17} {entry['seconds']:>9.3f} {entry['peak_rss_mb']:>8.1f} "
+                  f"{entry['queries']:>8} {entry['status']:>6}")
+            if 'detection' in entry:
+                d = entry['detection']
+                print(f"{'':>11}injected {d['injected']}, flagged {d['flagged']}, "
+                      f"recall {d['recall']:.2f}, precision {d['precision']:.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': metadata(args), 'results': results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
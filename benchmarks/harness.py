@@ -0,0 +1,115 @@
+# benchmarks/harness.py
+"""
+Django bootstrapping shared by the benchmark scripts. Benchmarks run against
+a throwaway test database, never the project's db.sqlite3.
+"""
+import os
+import re
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(db_file=None, media_dir=None):
+    """
+    `db_file` puts the test database on disk (default: in memory) and
+    `media_dir` redirects the file-backed stores (Parquet parts, models, ...).
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    if db_file:
+        connection.settings_dict['TEST'] = dict(connection.settings_dict.get('TEST') or {}, NAME=db_file)
+    if media_dir:
+        settings.PARQUET_STORAGE_DIR = os.path.join(media_dir, 'parquet')
+        settings.MODEL_REGISTRY_DIR = os.path.join(media_dir, 'models')
+        settings.INGEST_SPOOL_DIR = os.path.join(media_dir, 'spool')
+        settings.REPORT_CACHE_DIR = os.path.join(media_dir, 'reports')
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def load_rows(frame, file_name='synthetic.csv', backend=None):
+    """
+    Store a synthetic frame as one upload, bypassing the HTTP layer and the
+    anomaly model.
+    """
+    from core.models import FileUpload
+    from core.storage import get_storage
+
+    storage = get_storage(backend)
+    frame = frame.copy()
+    frame['is_anomaly'] = False
+    frame['anomaly_score'] = 0.0
+    upload = FileUpload.objects.create(file_name=file_name, storage=storage.name)
+    writer = storage.writer(upload)
+    writer.write(frame)
+    writer.close()
+    return upload
+
+
+@contextmanager
+def measure():
+    """
+    Wall time and Python-level peak memory of the block.
+    """
+    result = {}
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - started
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+
+
+def reset_peak_rss():
+    """
+    Reset the process' peak RSS (Linux only). Returns False where the peak
+    cannot be reset and peak_rss_mb() is the high-water mark of the process.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            return int(re.search(r'VmHWM:\s+(\d+)', f.read()).group(1)) / 1024
+    except (OSError, AttributeError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+@contextmanager
+def count_queries():
+    """
+    Number of SQL statements run in the block. Counted with an execute
+    wrapper, so the (large) SQL of bulk inserts is never kept around.
+    """
+    from django.db import connection
+
+    result = {'queries': 0}
+
+    def counter(execute, sql, params, many, context):
+        result['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(counter):
+        yield result
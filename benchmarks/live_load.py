@@ -0,0 +1,163 @@
+# benchmarks/live_load.py
+"""
+Load generator for the live streaming endpoints (core/live.py).
+
+    uvicorn config.asgi:application --port 8000
+    python -m benchmarks.live_load --url http://127.0.0.1:8000 --rate 5000 --seconds 20
+
+Each connection sends seeded synthetic readings (about 3% of them pushed
+far out of range) at its share of --rate: as one chunked NDJSON POST per
+connection by default, or as WebSocket frames with --transport ws (needs
+the `websockets` package). --subscribers SSE clients listen at the same
+time; the report compares what was sent with what the server stored.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from .synthetic import TYPES
+
+
+def readings(seed, count):
+    rng = np.random.default_rng(seed)
+    types = rng.choice(TYPES, size=count)
+    flow = rng.normal(175, 40, size=count)
+    pressure = rng.normal(5.0, 1.0, size=count)
+    temperature = rng.normal(110, 20, size=count)
+    spikes = rng.random(count) < 0.03
+    pressure[spikes] *= 3
+    for i in range(count):
+        yield {
+            'equipment_name': f'S{seed}-{i % 200:03d}',
+            'equipment_type': str(types[i]),
+            'flowrate': int(round(flow[i])),
+            'pressure': round(float(pressure[i]), 3),
+            'temperature': int(round(temperature[i])),
+        }
+
+
+async def paced(seed, rate, seconds, batch):
+    """
+    Lists of `batch` readings, spaced to hold `rate` readings per second.
+    """
+    source = readings(seed, int(rate * seconds))
+    started = time.perf_counter()
+    sent = 0
+    while True:
+        chunk = [r for _, r in zip(range(batch), source)]
+        if not chunk:
+            return
+        yield chunk
+        sent += len(chunk)
+        delay = started + sent / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def post_chunked(url, stream, seed, rate, seconds, batch):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    writer.write((
+        f"POST /api/live/ingest/?stream={stream} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Content-Type: application/x-ndjson\r\n"
+        "Transfer-Encoding: chunked\r\n\r\n"
+    ).encode())
+    sent = 0
+    async for chunk in paced(seed, rate, seconds, batch):
+        body = ''.join(json.dumps(r) + '\n' for r in chunk).encode()
+        writer.write(b'%x\r\n%s\r\n' % (len(body), body))
+        await writer.drain()
+        sent += len(chunk)
+    writer.write(b'0\r\n\r\n')
+    await writer.drain()
+    response = await reader.read(4096)
+    writer.close()
+    status = response.split(b' ', 2)[1].decode() if response else 'no response'
+    if status != '202':
+        print(f"  connection {seed}: HTTP {status}")
+    return sent
+
+
+async def send_websocket(url, stream, seed, rate, seconds, batch):
+    import websockets
+
+    ws_url = url.replace('http', 'ws', 1).rstrip('/') + f'/ws/live/ingest/?stream={stream}'
+    sent = 0
+    async with websockets.connect(ws_url) as socket:
+        async for chunk in paced(seed, rate, seconds, batch):
+            await socket.send(json.dumps(chunk))
+            sent += len(chunk)
+    return sent
+
+
+async def subscribe(url, stats, stop):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    writer.write(f"GET /api/live/events/ HTTP/1.1\r\nHost: {parts.netloc}\r\n\r\n".encode())
+    await writer.drain()
+    try:
+        while not stop.is_set():
+            try:
+                line = await asyncio.wait_for(reader.readline(), 0.5)
+            except asyncio.TimeoutError:
+                continue
+            if not line:
+                break
+            if line.startswith(b'data: '):
+                event = json.loads(line[6:])
+                stats['events'] += 1
+                if event['type'] == 'batch':
+                    stats['rows'] += event['rows']
+                    stats['anomalies'] += event['anomalies']
+    finally:
+        writer.close()
+
+
+async def run(args):
+    stop = asyncio.Event()
+    listeners = [{'events': 0, 'rows': 0, 'anomalies': 0} for _ in range(args.subscribers)]
+    subscribers = [asyncio.ensure_future(subscribe(args.url, stats, stop)) for stats in listeners]
+    await asyncio.sleep(0.5)
+
+    send = send_websocket if args.transport == 'ws' else post_chunked
+    share = args.rate / args.connections
+    started = time.perf_counter()
+    sent = await asyncio.gather(*(
+        send(args.url, args.stream, seed, share, args.seconds, args.batch) for seed in range(args.connections)
+    ))
+    elapsed = time.perf_counter() - started
+
+    # Give the server a moment to write the last batches
+    await asyncio.sleep(args.drain)
+    stop.set()
+    await asyncio.gather(*subscribers)
+
+    total = sum(sent)
+    print(f"sent      {total} readings in {elapsed:.1f}s ({total / elapsed:.0f}/s) "
+          f"over {args.connections} {args.transport} connection(s)")
+    for i, stats in enumerate(listeners):
+        print(f"listener {i}: {stats['events']} events, {stats['rows']} rows stored, "
+              f"{stats['anomalies']} anomalies ({stats['rows'] / max(total, 1):.1%} of sent)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--stream', default='load-test')
+    parser.add_argument('--rate', type=float, default=2_000, help="readings per second, all connections")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--connections', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=50, help="readings per chunk or frame")
+    parser.add_argument('--transport', choices=['http', 'ws'], default='http')
+    parser.add_argument('--subscribers', type=int, default=1)
+    parser.add_argument('--drain', type=float, default=2.0, help="seconds to wait for the last events")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+# benchmarks/load.py
+"""
+Parallel uploads against a running server, and a check that none of them
+got lost or half-stored.
+
+    python -m benchmarks.load --uploads 40 --concurrency 8 --workers 4
+    python -m benchmarks.load --url http://127.0.0.1:8000 --db db.sqlite3
+
+Without --url, gunicorn is started with --workers workers against a
+throwaway database (as in benchmarks.startup). --concurrency clients then
+post --uploads CSVs:
+
+  * distinct files, except every --duplicate-every-th one, which repeats
+    the file before it and so usually races it; it must be stored once;
+  * every --invalid-every-th one has no valid row: 400, nothing stored;
+  * every --async-every-th one goes in as a background job, which the
+    client follows to the end.
+
+Meanwhile --pollers clients keep reading /api/summary/ and /api/history/.
+The report gives p50/p95/p99 latency per operation and every failure (5xx,
+connection errors, unexpected statuses).
+
+Then the database is checked (read only; --db for an external server):
+every upload the clients were told about exists, none was stored twice,
+each has its summary and as many rows as the summary counts (ORM storage),
+and no row points at a missing upload. --retention N runs the local server
+with RETENTION_MAX_UPLOADS=N (default: keep everything) and checks that
+exactly that many uploads are left once the background purges are done.
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .harness import ROOT
+from .startup import SETTINGS, free_port, wait_for
+from .synthetic import generate_plant_frame, to_csv_bytes
+
+INVALID_CSV = b"Equipment Name,Type,Flowrate,Pressure,Temperature\nP-1,Pump,n/a,n/a,n/a\nP-2,Pump,,,\n"
+
+
+class Recorder:
+    """
+    Latencies and failures per operation, shared by the client threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(list)
+
+    def call(self, operation, method, url, expect, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = requests.request(method, url, timeout=300, **kwargs)
+        except requests.RequestException as e:
+            self.fail(operation, f"{type(e).__name__}: {e}")
+            return None
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.latencies[operation].append(elapsed)
+        if response.status_code not in expect:
+            self.fail(operation, f"HTTP {response.status_code}: {response.text[:200]}")
+            return None
+        return response
+
+    def fail(self, operation, message):
+        with self.lock:
+            self.failures[operation].append(message)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def plan(args):
+    """
+    (name, csv bytes, kind, content key) per upload; kind is 'sync',
+    'async' or 'invalid', and equal keys mean equal content.
+    """
+    uploads = []
+    for i in range(args.uploads):
+        if args.invalid_every and i % args.invalid_every == args.invalid_every - 1:
+            uploads.append((f'invalid-{i}.csv', INVALID_CSV, 'invalid', None))
+            continue
+        kind = 'async' if args.async_every and i % args.async_every == args.async_every - 1 else 'sync'
+        previous = uploads[-1] if uploads else None
+        if args.duplicate_every and i % args.duplicate_every == args.duplicate_every - 1 and previous \
+                and previous[2] != 'invalid':
+            uploads.append((f'copy-{i}.csv', previous[1], kind, previous[3]))
+            continue
+        frame, _ = generate_plant_frame(args.rows, seed=i, anomaly_rate=0.02)
+        uploads.append((f'load-{i}.csv', to_csv_bytes(frame), kind, i))
+    return uploads
+
+
+def upload(url, recorder, name, data, kind):
+    """
+    Post one file (following its job when async); returns the upload id or None.
+    """
+    if kind == 'invalid':
+        recorder.call('upload invalid', 'POST', f'{url}/api/upload/', {400}, files={'file': (name, data)})
+        return None
+    if kind == 'sync':
+        response = recorder.call('upload', 'POST', f'{url}/api/upload/', {200, 201}, files={'file': (name, data)})
+        return response.json()['id'] if response is not None else None
+
+    started = time.perf_counter()
+    response = recorder.call('upload async', 'POST', f'{url}/api/upload/', {200, 202},
+                             files={'file': (name, data)}, data={'async': 'true'})
+    if response is None:
+        return None
+    if response.status_code == 200:
+        return response.json()['id'] # duplicate, answered at once
+    status_url = response.json()['status_url']
+    while True:
+        time.sleep(0.2)
+        job = recorder.call('job status', 'GET', f'{url}{status_url}', {200})
+        if job is None:
+            return None
+        job = job.json()
+        if job['status'] in ('done', 'failed'):
+            break
+    with recorder.lock:
+        recorder.latencies['async job'].append(time.perf_counter() - started)
+    if job['status'] == 'failed':
+        recorder.fail('async job', job['error'])
+        return None
+    return job['upload']
+
+
+def poll(url, recorder, stop):
+    while not stop.is_set():
+        recorder.call('summary', 'GET', f'{url}/api/summary/', {200, 204})
+        recorder.call('history', 'GET', f'{url}/api/history/', {200})
+
+
+def run_load(url, args, uploads):
+    recorder = Recorder()
+    stop = threading.Event()
+    pollers = [threading.Thread(target=poll, args=(url, recorder, stop)) for _ in range(args.pollers)]
+    for thread in pollers:
+        thread.start()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            ids = list(pool.map(lambda u: upload(url, recorder, u[0], u[1], u[2]), uploads))
+    finally:
+        stop.set()
+        for thread in pollers:
+            thread.join()
+    return recorder, ids, time.perf_counter() - started
+
+
+def report(recorder, elapsed, uploads):
+    print(f"{len(uploads)} uploads in {elapsed:.1f}s")
+    print(f"  {'operation':<16} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7}")
+    for operation in sorted(set(recorder.latencies) | set(recorder.failures)):
+        times = recorder.latencies.get(operation) or [0.0]
+        print(f"  {operation:<16} {len(recorder.latencies.get(operation, [])):>6} "
+              f"{percentile(times, 50) * 1000:>8.0f} {percentile(times, 95) * 1000:>8.0f} "
+              f"{percentile(times, 99) * 1000:>8.0f} {max(times) * 1000:>8.0f} "
+              f"{len(recorder.failures.get(operation, [])):>7}")
+    for operation, messages in sorted(recorder.failures.items()):
+        for message in messages[:5]:
+            print(f"  ! {operation}: {message}")
+
+
+def settle(db, retention, timeout=60):
+    """
+    Wait for background jobs and purges to finish.
+    """
+    def quiet():
+        with sqlite3.connect(db) as conn:
+            busy = conn.execute("SELECT COUNT(*) FROM core_ingestjob WHERE status IN ('queued', 'running')")
+            if busy.fetchone()[0]:
+                return False
+            if retention is None:
+                return True
+            return conn.execute("SELECT COUNT(*) FROM core_fileupload").fetchone()[0] <= retention
+
+    try:
+        wait_for(quiet, timeout, "background jobs and purges")
+    except RuntimeError as e:
+        print(f"  ! {e}")
+
+
+def check(db, uploads, ids, retention):
+    """
+    Problems found in the database, as messages.
+    """
+    with sqlite3.connect(db) as conn:
+        stored = {
+            upload_id: (storage, total)
+            for upload_id, storage, total in conn.execute(
+                "SELECT u.id, u.storage, s.total_count FROM core_fileupload u "
+                "LEFT JOIN core_uploadsummary s ON s.upload_id = u.id")
+        }
+        rows = dict(conn.execute("SELECT upload_id, COUNT(*) FROM core_equipmentdata GROUP BY upload_id"))
+        hashes = conn.execute("SELECT content_hash, COUNT(*) FROM core_fileupload WHERE content_hash != '' "
+                              "GROUP BY content_hash, detector, contamination, model_version HAVING COUNT(*) > 1")
+        twice = hashes.fetchall()
+
+    problems = []
+    by_content = defaultdict(set)
+    for (name, _, kind, key), upload_id in zip(uploads, ids):
+        if kind == 'invalid':
+            continue
+        if upload_id is None:
+            problems.append(f"{name}: the client got no upload id")
+        else:
+            by_content[key].add(upload_id)
+    for key, found in by_content.items():
+        if retention is not None:
+            # A copy posted after its original was purged is stored again
+            found = found & set(stored)
+        if len(found) > 1:
+            problems.append(f"content {key} was stored as uploads {sorted(found)}")
+    if twice:
+        problems.append(f"{len(twice)} content hash(es) stored more than once")
+
+    answered = set().union(*by_content.values()) if by_content else set()
+    if retention is None:
+        missing = answered - set(stored)
+        if missing:
+            problems.append(f"uploads {sorted(missing)} were answered but are not stored")
+    elif len(stored) != min(retention, len(answered)):
+        problems.append(f"{len(stored)} uploads left, retention keeps {retention}")
+
+    for upload_id, (storage, total) in stored.items():
+        if total is None:
+            problems.append(f"upload {upload_id} has no summary")
+        elif storage == 'orm' and rows.get(upload_id, 0) != total:
+            problems.append(f"upload {upload_id} has {rows.get(upload_id, 0)} rows, its summary says {total}")
+    orphans = set(rows) - set(stored)
+    if orphans:
+        problems.append(f"{sum(rows[i] for i in orphans)} rows belong to missing uploads {sorted(orphans)}")
+    print(f"database: {len(stored)} uploads, {sum(rows.values())} rows; {len(answered)} distinct uploads answered")
+    return problems
+
+
+def start_server(workdir, workers, retention):
+    """
+    gunicorn on a fresh database in `workdir`; returns (process, url, db).
+    """
+    db = os.path.join(workdir, 'db.sqlite3')
+    with open(os.path.join(workdir, 'load_settings.py'), 'w') as f:
+        f.write(SETTINGS.format(db=db, media=os.path.join(workdir, 'media')))
+        f.write(f"RETENTION_MAX_UPLOADS = {retention!r}\n")
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='load_settings', PYTHONPATH=os.pathsep.join([workdir, ROOT]))
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=ROOT, env=env, check=True)
+
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    with open(os.path.join(workdir, 'gunicorn.log'), 'w') as log:
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'config.wsgi', '-w', str(workers),
+                                   '-b', f'127.0.0.1:{port}', '--timeout', '300'],
+                                  cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def answers():
+        try:
+            return requests.get(f'{url}/api/summary/', timeout=1).status_code < 500
+        except requests.RequestException:
+            return False
+
+    try:
+        wait_for(answers, 120, "the server")
+    except RuntimeError:
+        server.terminate()
+        raise
+    return server, url, db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help="an already running server (default: start gunicorn)")
+    parser.add_argument('--db', help="its SQLite database, for the checks")
+    parser.add_argument('--workers', type=int, default=4, help="gunicorn workers")
+    parser.add_argument('--uploads', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8, help="clients posting at once")
+    parser.add_argument('--pollers', type=int, default=2, help="clients reading summary and history")
+    parser.add_argument('--rows', type=int, default=5000, help="rows per CSV")
+    parser.add_argument('--duplicate-every', type=int, default=5)
+    parser.add_argument('--invalid-every', type=int, default=7)
+    parser.add_argument('--async-every', type=int, default=4)
+    parser.add_argument('--retention', type=int, default=None, help="RETENTION_MAX_UPLOADS of the local server")
+    args = parser.parse_args()
+
+    uploads = plan(args)
+    with tempfile.TemporaryDirectory(prefix='load-bench-') as workdir:
+        server = None
+        if args.url:
+            url, db = args.url.rstrip('/'), args.db
+        else:
+            server, url, db = start_server(workdir, args.workers, args.retention)
+        try:
+            recorder, ids, elapsed = run_load(url, args, uploads)
+            report(recorder, elapsed, uploads)
+            if db is None:
+                print("no --db given, database checks skipped")
+                problems = []
+            else:
+                settle(db, args.retention)
+                problems = check(db, uploads, ids, args.retention)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(30)
+    for problem in problems:
+        print(f"  ! {problem}")
+    failed = sum(len(messages) for messages in recorder.failures.values())
+    print("OK" if not problems and not failed else f"{len(problems)} problem(s), {failed} failed request(s)")
+    sys.exit(1 if problems or failed else 0)
+
+
+if __name__ == '__main__':
+    main()
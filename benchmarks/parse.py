@@ -0,0 +1,94 @@
+# benchmarks/parse.py
+"""
+CSV parse throughput: the old pd.read_csv(file) + column check against the
+schema parser (core/schema.py) on pandas' C engine and on pyarrow.
+
+    python -m benchmarks.parse --rows 100000 1000000 --dirty 0.01
+
+Every file has two extra columns the parser should not pay for. With
+--dirty, that fraction of the rows gets a bad value (text in a number
+column, a fractional flow, an empty name), which the old path cannot
+ingest at all and the schema parser drops and reports.
+"""
+import argparse
+import gc
+import io
+import time
+
+import numpy as np
+import pandas as pd
+
+from .harness import peak_rss_mb, reset_peak_rss, setup_django
+from .synthetic import generate_plant_frame, to_csv_bytes
+
+
+def make_csv(rows, dirty, seed=42):
+    frame, _ = generate_plant_frame(rows, seed=seed)
+    frame['Site'] = 'north'
+    frame['Notes'] = 'routine reading'
+    if dirty:
+        rng = np.random.default_rng(seed)
+        hit = np.flatnonzero(rng.random(rows) < dirty)
+        frame = frame.astype({'Flowrate': object})
+        for i, row in enumerate(hit):
+            if i % 3 == 0:
+                frame.at[row, 'Flowrate'] = 'n/a'
+            elif i % 3 == 1:
+                frame.at[row, 'Flowrate'] = frame.at[row, 'Flowrate'] + 0.5
+            else:
+                frame.at[row, 'Equipment Name'] = ''
+    return to_csv_bytes(frame)
+
+
+def legacy_parse(data):
+    df = pd.read_csv(io.BytesIO(data))
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def schema_parse(data, engine):
+    from core.schema import RowErrors, read_frame
+
+    errors = RowErrors()
+    return read_frame(io.BytesIO(data), errors, engine=engine), errors
+
+
+def best_of(fn, repeat):
+    """
+    Best wall time of `repeat` runs and the peak RSS they reached (RSS, not
+    tracemalloc: Arrow allocates outside the Python heap).
+    """
+    best = None
+    reset_peak_rss()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return best, peak_rss_mb(), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', nargs='+', type=int, default=[100_000, 1_000_000])
+    parser.add_argument('--dirty', type=float, default=0.0, help="fraction of rows with a bad value")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    print(f"{'rows':>9}  {'parser':<16} {'seconds':>8} {'rows/s':>11} {'peak RSS':>8} {'kept':>9} {'rejected':>9}")
+    for rows in args.rows:
+        data = make_csv(rows, args.dirty)
+        runs = [('read_csv', lambda: (legacy_parse(data), None))]
+        runs += [(f'schema ({engine})', lambda engine=engine: schema_parse(data, engine)) for engine in ('c', 'pyarrow')]
+        for name, fn in runs:
+            seconds, peak_mb, (df, errors) = best_of(fn, args.repeat)
+            rejected = errors.rejected_rows if errors else 0
+            print(f"{rows:>9}  {name:<16} {seconds:>8.3f} {int(rows / seconds):>11,} {peak_mb:>8.1f} "
+                  f"{len(df):>9} {rejected:>9}")
+            del df, errors
+            gc.collect()
+
+
+if __name__ == '__main__':
+    main()
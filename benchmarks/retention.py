@@ -0,0 +1,102 @@
+# benchmarks/retention.py
+"""
+Upload latency when the upload pushes an old one out of retention.
+
+    python -m benchmarks.retention --rows 50000 200000
+
+For each size an old upload of that many rows is stored and a small CSV
+is posted with RETENTION_MAX_UPLOADS=1:
+
+  * "cascade" is what the request used to pay before ingesting: deleting
+    the old upload through the ORM, one DELETE holding the write lock for
+    all of its rows;
+  * "upload" is the request now, with the purge queued in the pool;
+  * "purge" is the background purge (batched raw deletes), and "longest"
+    its slowest statement, i.e. the longest a writer can be held up.
+"""
+import argparse
+import io
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from .harness import load_rows, setup_django
+from .synthetic import generate_frame, generate_plant_frame, to_csv_bytes
+
+
+@contextmanager
+def statement_times():
+    from django.db import connection
+
+    times = []
+
+    def timer(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            times.append(time.perf_counter() - started)
+
+    with connection.execute_wrapper(timer):
+        yield times
+
+
+def post_small(client, seed):
+    frame, _ = generate_plant_frame(2000, seed=seed)
+    f = io.BytesIO(to_csv_bytes(frame))
+    f.name = f'small-{seed}.csv'
+    started = time.perf_counter()
+    response = client.post('/api/upload/', {'file': f})
+    assert response.status_code == 201, response.content
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', nargs='+', type=int, default=[50_000, 200_000])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='retention-bench-')
+    setup_django(db_file=f'{workdir}/bench.sqlite3', media_dir=workdir)
+    from django.conf import settings
+    from django.test import Client
+    from django.utils import timezone
+
+    from core import retention
+    from core.models import FileUpload
+    from core.storage import delete_upload
+
+    settings.INGEST_START_METHOD = 'fork' # workers must see the test database
+    settings.RETENTION_MAX_UPLOADS = 1
+    client = Client()
+    post_small(client, 0) # warm up the pool and the model code
+
+    print(f"{'evicted rows':>12} {'cascade s':>10} {'upload s':>9} {'purge s':>8} {'longest ms':>11}")
+    for seed, rows in enumerate(args.rows, start=1):
+        frame = generate_frame(rows, seed=seed)
+        FileUpload.objects.all().delete()
+
+        old = load_rows(frame)
+        started = time.perf_counter()
+        delete_upload(old)
+        cascade = time.perf_counter() - started
+
+        load_rows(frame)
+        upload = post_small(client, seed)
+        started = time.perf_counter()
+        future = retention._pending[0] if retention._pending else None
+        if future is not None:
+            future.result()
+        purge = time.perf_counter() - started
+
+        # Same purge in this process, to time its statements
+        old = load_rows(frame)
+        FileUpload.objects.filter(pk=old.pk).update(uploaded_at=timezone.now() - timedelta(days=1))
+        with statement_times() as times:
+            retention.purge_expired()
+        print(f"{rows:>12} {cascade:>10.3f} {upload:>9.3f} {purge:>8.3f} {max(times) * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
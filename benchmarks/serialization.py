@@ -0,0 +1,67 @@
+# benchmarks/serialization.py
+"""
+EquipmentDataSerializer + JSONRenderer vs the streaming values_list path.
+
+    python -m benchmarks.serialization --rows 10000 100000 1000000
+
+Time-to-first-byte and total time are measured in a separate pass from peak
+memory, since tracemalloc slows everything down.
+"""
+import argparse
+import time
+
+from .harness import load_rows, measure, setup_django
+from .synthetic import generate_frame
+
+
+def drf_body(upload):
+    from rest_framework.renderers import JSONRenderer
+    from core.serializers import EquipmentDataSerializer
+    data = EquipmentDataSerializer(upload.data_points.order_by('id'), many=True).data
+    yield JSONRenderer().render(data)
+
+
+def stream_body(upload):
+    from core.filters import DEFAULT_FIELDS
+    from core.streaming import iter_json_rows
+    return iter_json_rows(upload.data_points.order_by('id'), DEFAULT_FIELDS)
+
+
+def timed(make_body, upload):
+    started = time.perf_counter()
+    ttfb = None
+    size = 0
+    for chunk in make_body(upload):
+        if ttfb is None:
+            ttfb = time.perf_counter() - started
+        size += len(chunk)
+    return ttfb, time.perf_counter() - started, size
+
+
+def peak(make_body, upload):
+    with measure() as m:
+        for _ in make_body(upload):
+            pass
+    return m['peak_mb']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', nargs='+', type=int, default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    setup_django()
+    print(f"{'rows':>9}  {'path':<7} {'ttfb s':>8} {'total s':>8} {'peak MB':>8} {'MB out':>7}")
+    for rows in args.rows:
+        upload = load_rows(generate_frame(rows))
+        bodies = {'drf': drf_body, 'stream': stream_body}
+        outputs = {name: b''.join(body(upload)) for name, body in bodies.items()}
+        assert outputs['drf'] == outputs['stream'], "streaming output differs from EquipmentDataSerializer"
+        for name, body in bodies.items():
+            ttfb, total, size = timed(body, upload)
+            print(f"{rows:>9}  {name:<7} {ttfb:>8.3f} {total:>8.3f} {peak(body, upload):>8.1f} {size / 1e6:>7.1f}")
+        upload.delete()
+
+
+if __name__ == '__main__':
+    main()
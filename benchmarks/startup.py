@@ -0,0 +1,221 @@
+# benchmarks/startup.py
+"""
+Process startup cost and per-worker memory under gunicorn.
+
+    python -m benchmarks.startup --workers 4
+
+"imports" starts fresh interpreters that run django.setup() and load the
+URLconf (what every worker, `manage.py migrate` and the health check pay),
+then import config.asgi (the same plus the live streaming wrapper), then
+run django.setup() followed by engines.preload(), i.e. the whole analytics
+stack that core.views used to import eagerly. The first two must leave the
+analytics stack unloaded; the benchmark stops with an error if they do not.
+
+"gunicorn" starts `gunicorn config.wsgi` with gunicorn.conf.py against a
+throwaway database for each CV_PRELOAD mode and reports the seconds until
+the first response, the latency of the first upload (which includes the
+imports in "off" mode) and the memory of the master and workers, idle and
+after every worker has handled uploads. PSS charges shared pages
+fractionally, so the sum over the processes is the real footprint; USS is
+what a worker holds on its own.
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .harness import ROOT
+from .synthetic import generate_plant_frame, to_csv_bytes
+
+HEAVY = ['pandas', 'numpy', 'sklearn', 'scipy', 'pyarrow', 'reportlab']
+
+PROBE = """
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+{load}
+from django.urls import resolve
+resolve('/api/summary/')
+if {eager}:
+    from core.engines import preload
+    preload()
+seconds = time.perf_counter() - started
+rss = [l for l in open('/proc/self/status') if l.startswith('VmRSS')][0].split()[1]
+print(json.dumps({{'seconds': seconds, 'rss_mb': int(rss) / 1024,
+                  'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+SETTINGS = """
+from config.settings import *
+
+DATABASES['default']['NAME'] = {db!r}
+PARQUET_STORAGE_DIR = {media!r} + '/parquet'
+MODEL_REGISTRY_DIR = {media!r} + '/models'
+INGEST_SPOOL_DIR = {media!r} + '/spool'
+REPORT_CACHE_DIR = {media!r} + '/reports'
+"""
+
+DJANGO_SETUP = "import django\ndjango.setup()"
+ASGI_SETUP = "import config.asgi"
+
+# (label, setup code, preload); only the preloading probe may load HEAVY
+PROBES = [
+    ('django + URLconf', DJANGO_SETUP, False),
+    ('config.asgi', ASGI_SETUP, False),
+    ('+ engines.preload()', DJANGO_SETUP, True),
+]
+
+
+def probe(load, eager, repeat):
+    runs = []
+    for _ in range(repeat):
+        code = PROBE.format(load=load, eager=eager, heavy=HEAVY)
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return min(runs, key=lambda r: r['seconds'])
+
+
+def memory_mb(pid):
+    """
+    (RSS, PSS, USS) of a process in MB, from /proc/<pid>/smaps_rollup.
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            match = re.match(r'(\w+):\s+(\d+) kB', line)
+            if match:
+                fields[match.group(1)] = int(match.group(2)) / 1024
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(check, timeout, what):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+
+def snapshot(master):
+    workers = [memory_mb(pid) for pid in children(master)]
+    own = memory_mb(master)
+    return {
+        'master_rss': own[0],
+        'worker_pss': sum(w[1] for w in workers) / len(workers),
+        'worker_uss': sum(w[2] for w in workers) / len(workers),
+        'total_pss': own[1] + sum(w[1] for w in workers),
+    }
+
+
+def post_csv(url, data):
+    started = time.perf_counter()
+    response = requests.post(f'{url}/api/upload/', files={'file': ('startup.csv', data)}, data={'force': 'true'})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def run_gunicorn(mode, workers, workdir, csv):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    log_path = os.path.join(workdir, f'gunicorn-{mode}.log')
+    env = dict(os.environ, CV_PRELOAD=mode, DJANGO_SETTINGS_MODULE='startup_settings',
+               PYTHONPATH=os.pathsep.join([workdir, ROOT]))
+    started = time.perf_counter()
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'config.wsgi', '-w', str(workers),
+                                   '-b', f'127.0.0.1:{port}', '--log-level', 'info'],
+                                  cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        def answers():
+            try:
+                return requests.get(f'{url}/api/summary/', timeout=1).status_code < 500
+            except requests.RequestException:
+                return False
+
+        wait_for(answers, 120, "the first response")
+        ready = time.perf_counter() - started
+        expected = {'master': 1, 'worker': workers}.get(mode, 0)
+
+        def booted():
+            with open(log_path) as f:
+                preloaded = f.read().count('Analytics stack preloaded')
+            return len(children(server.pid)) == workers and preloaded >= expected
+
+        wait_for(booted, 120, "the workers")
+        time.sleep(1)
+        idle = snapshot(server.pid)
+        first = post_csv(url, csv)
+        # Enough concurrent uploads that every worker handles some
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda _: post_csv(url, csv), range(workers * 4)))
+        loaded = snapshot(server.pid)
+    finally:
+        server.terminate()
+        server.wait(30)
+    return ready, first, idle, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=2000, help="rows in each uploaded CSV")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--modes', nargs='+', default=['off', 'worker', 'master'])
+    args = parser.parse_args()
+
+    print("imports (best of %d)" % args.repeat)
+    print(f"  {'':<24} {'seconds':>8} {'RSS MB':>8}  heavy modules")
+    leaks = []
+    for name, load, eager in PROBES:
+        run = probe(load, eager, args.repeat)
+        print(f"  {name:<24} {run['seconds']:>8.2f} {run['rss_mb']:>8.1f}  {', '.join(run['heavy']) or '-'}")
+        if run['heavy'] and not eager:
+            leaks.append(f"{name} imported {', '.join(run['heavy'])}")
+    if leaks:
+        sys.exit("The analytics stack is imported at startup: " + '; '.join(leaks))
+
+    frame, _ = generate_plant_frame(args.rows, seed=7)
+    csv = to_csv_bytes(frame)
+    with tempfile.TemporaryDirectory() as workdir:
+        media = os.path.join(workdir, 'media')
+        with open(os.path.join(workdir, 'startup_settings.py'), 'w') as f:
+            f.write(SETTINGS.format(db=os.path.join(workdir, 'db.sqlite3'), media=media))
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='startup_settings',
+                   PYTHONPATH=os.pathsep.join([workdir, ROOT]))
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=ROOT, env=env, check=True)
+
+        print(f"\ngunicorn, {args.workers} workers (MB; worker columns are per-worker means)")
+        print(f"  {'CV_PRELOAD':<10} {'ready s':>8} {'upload s':>9} | {'idle':^31} | {'after uploads':^31}")
+        print(f"  {'':<10} {'':>8} {'':>9} | {'master':>7} {'w PSS':>7} {'w USS':>7} {'total':>7} "
+              f"| {'master':>7} {'w PSS':>7} {'w USS':>7} {'total':>7}")
+        for mode in args.modes:
+            ready, first, idle, loaded = run_gunicorn(mode, args.workers, workdir, csv)
+            cells = ' | '.join(
+                f"{m['master_rss']:>7.0f} {m['worker_pss']:>7.0f} {m['worker_uss']:>7.0f} {m['total_pss']:>7.0f}"
+                for m in (idle, loaded)
+            )
+            print(f"  {mode:<10} {ready:>8.2f} {first:>9.2f} | {cells}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/storage.py
+"""
+ORM rows vs Parquet parts: ingest time, scan time and disk size.
+
+    python -m benchmarks.storage --rows 100000 1000000
+
+"ingest" writes one upload through the storage writer (no anomaly model),
+"aggregate" reads the three numeric columns and averages them, "filtered"
+pulls name + pressure of high-pressure pumps, which exercises predicate
+evaluation and column pruning.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from .harness import load_rows, setup_django
+from .synthetic import generate_frame
+
+
+def sqlite_bytes():
+    from django.db import connection
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA page_count')
+        pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        return pages * cursor.fetchone()[0]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def run(rows, backend_name):
+    from core.filters import DataQuery
+    from core.storage import get_storage
+
+    frame = generate_frame(rows)
+    backend = get_storage(backend_name)
+
+    before = sqlite_bytes()
+    ingest, upload = timed(lambda: load_rows(frame, backend=backend_name))
+    if backend_name == 'parquet':
+        size = backend.size(upload)
+    else:
+        size = sqlite_bytes() - before
+
+    aggregate, _ = timed(lambda: backend.frame(upload, ['flowrate', 'pressure', 'temperature']).mean())
+    filtered, result = timed(lambda: backend.frame(upload, ['equipment_name', 'pressure'], DataQuery(
+        equipment_types=['Pump'], ranges={'pressure': (6.5, None)},
+    )))
+    return {'ingest': ingest, 'aggregate': aggregate, 'filtered': filtered, 'matched': len(result), 'mb': size / 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', nargs='+', type=int, default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cv-bench-')
+    setup_django(db_file=os.path.join(workdir, 'bench.sqlite3'), media_dir=workdir)
+    print(f"{'rows':>9}  {'backend':<8} {'ingest s':>9} {'aggregate s':>12} {'filtered s':>11} {'disk MB':>8}")
+    for rows in args.rows:
+        for backend in ('orm', 'parquet'):
+            r = run(rows, backend)
+            print(f"{rows:>9}  {backend:<8} {r['ingest']:>9.3f} {r['aggregate']:>12.3f} {r['filtered']:>11.3f} {r['mb']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
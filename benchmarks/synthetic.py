@@ -0,0 +1,73 @@
+# benchmarks/synthetic.py
+"""
+Seeded synthetic plant data in the upload CSV schema.
+
+Anomalies can be injected into a fraction of the rows: one of the three
+readings is pushed `anomaly_scale` standard deviations (of its type) away
+from normal. The injected rows are returned too, so a benchmark can check
+how many of them the detector finds.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+TYPES = ['Pump', 'Valve', 'Compressor', 'Reactor', 'HeatExchanger']
+
+# Normal operating range per reading: (mean, std) by type
+PROFILES = {
+    'Pump': {'Flowrate': (180, 25), 'Pressure': (5.5, 0.6), 'Temperature': (95, 8)},
+    'Valve': {'Flowrate': (120, 20), 'Pressure': (4.0, 0.5), 'Temperature': (85, 7)},
+    'Compressor': {'Flowrate': (240, 30), 'Pressure': (8.5, 0.9), 'Temperature': (130, 10)},
+    'Reactor': {'Flowrate': (150, 20), 'Pressure': (6.5, 0.7), 'Temperature': (150, 9)},
+    'HeatExchanger': {'Flowrate': (200, 25), 'Pressure': (3.5, 0.4), 'Temperature': (115, 8)},
+}
+READINGS = ['Flowrate', 'Pressure', 'Temperature']
+
+
+def generate_frame(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Equipment Name': [f'EQ-{i:07d}' for i in range(rows)],
+        'Type': rng.choice(TYPES, size=rows),
+        'Flowrate': rng.integers(50, 300, size=rows),
+        'Pressure': rng.normal(5.0, 1.0, size=rows).round(2),
+        'Temperature': rng.integers(60, 160, size=rows),
+    })
+
+
+def generate_plant_frame(rows, seed=42, anomaly_rate=0.0, anomaly_scale=6.0):
+    """
+    Readings drawn from per-type operating profiles, with `anomaly_rate` of
+    the rows made anomalous. Returns (frame, boolean mask of injected rows).
+    """
+    rng = np.random.default_rng(seed)
+    types = rng.choice(TYPES, size=rows)
+    codes = pd.Categorical(types, categories=TYPES).codes
+    frame = pd.DataFrame({'Equipment Name': [f'EQ-{i:07d}' for i in range(rows)], 'Type': types})
+    for column in READINGS:
+        means = np.array([PROFILES[t][column][0] for t in TYPES])
+        stds = np.array([PROFILES[t][column][1] for t in TYPES])
+        frame[column] = rng.normal(means[codes], stds[codes])
+
+    injected = rng.random(rows) < anomaly_rate
+    if injected.any():
+        rows_hit = np.flatnonzero(injected)
+        columns = rng.integers(0, len(READINGS), size=len(rows_hit))
+        signs = rng.choice([-1.0, 1.0], size=len(rows_hit))
+        for i, column in enumerate(READINGS):
+            hit = rows_hit[columns == i]
+            stds = np.array([PROFILES[t][column][1] for t in TYPES])[codes[hit]]
+            frame.loc[hit, column] += signs[columns == i] * anomaly_scale * stds
+
+    # Match the schema of real exports: integer flow and temperature
+    frame['Flowrate'] = frame['Flowrate'].round().clip(lower=0).astype(int)
+    frame['Temperature'] = frame['Temperature'].round().astype(int)
+    frame['Pressure'] = frame['Pressure'].clip(lower=0).round(2)
+    return frame, injected
+
+
+def to_csv_bytes(frame):
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Live streaming endpoints (/api/live/..., /ws/live/...) are served here
+# directly; everything else goes to Django. See core/live.py.
+from core.live import live_application  # noqa: E402
+
+application = live_application(django_application)
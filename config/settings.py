@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.TimingMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -89,9 +90,30 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Batch workers and gunicorn workers write in parallel; wait for
+            # the write lock instead of failing with "database is locked"
+            # after the default 5 seconds
+            'timeout': 30,
+            # Take the write lock when a transaction starts, so two writers
+            # queue on the busy timeout instead of one failing at once when
+            # both try to upgrade a read lock
+            'transaction_mode': 'IMMEDIATE',
+            # WAL lets the dashboard read while an upload is being written
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+        },
+        # Keep connections (and their pragmas) across requests
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Units of work that still find the database locked after the busy timeout
+# are re-run this many times, waiting DB_LOCK_RETRY_DELAY seconds (doubling,
+# with jitter) in between. See core/concurrency.py.
+DB_LOCK_RETRIES = 3
+DB_LOCK_RETRY_DELAY = 0.5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,3 +158,133 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# CSV ingestion
+# Uploads larger than INGEST_STREAM_THRESHOLD bytes (or posted with stream=true)
+# are read INGEST_CHUNK_SIZE rows at a time and inserted in batches of
+# INGEST_BATCH_SIZE, so worker memory does not grow with the file size.
+INGEST_STREAM_THRESHOLD = 20 * 1024 * 1024
+INGEST_CHUNK_SIZE = 50_000
+INGEST_BATCH_SIZE = 5_000
+
+# Re-uploads of a file already ingested with the same detection options get
+# the existing upload back (send force=true to re-process). Besides the raw
+# bytes, whole-file ingests also compare a hash of the normalized rows.
+INGEST_FRAME_HASH = True
+
+# CSV parsing and validation (core/schema.py). Only the schema columns are
+# read, with pyarrow ('pyarrow') or pandas' C parser ('c'). Rows with bad values
+# are dropped and reported; the first INGEST_MAX_ROW_ERRORS come back with the
+# upload. INGEST_VALUE_RANGES adds plant limits, e.g. {'Pressure': (0, 400)}.
+INGEST_CSV_ENGINE = 'pyarrow'
+INGEST_MAX_ROW_ERRORS = 1000
+INGEST_VALUE_RANGES = {}
+
+# Background ingestion (upload with async=true)
+# Jobs run in a local process pool; INGEST_WORKERS=None means one per core.
+INGEST_ASYNC_DEFAULT = False
+INGEST_WORKERS = None
+INGEST_START_METHOD = 'spawn'
+INGEST_SPOOL_DIR = BASE_DIR / 'media' / 'spool'
+
+# Batch uploads (/api/upload/batch/): several CSVs or ZIP archives, one file
+# per pool worker. BATCH_MAX_FILES caps the CSVs in one request.
+BATCH_MAX_FILES = 100
+
+# Upload retention (core/retention.py). Uploads beyond any limit, counted from
+# the newest, are purged in the background after each upload; None turns a
+# limit off. Run `manage.py purge_uploads` from cron to enforce the age limit
+# when nothing is uploaded. Rows are deleted RETENTION_DELETE_BATCH at a time.
+# Set RETENTION_ARCHIVE_DIR (e.g. BASE_DIR / 'media' / 'archive') to keep a
+# gzipped CSV and a JSON summary of every purged upload.
+RETENTION_MAX_UPLOADS = 5
+RETENTION_MAX_AGE_DAYS = None
+RETENTION_MAX_ROWS = None
+RETENTION_DELETE_BATCH = 5_000
+RETENTION_ARCHIVE_DIR = None
+
+# Anomaly detection
+# Detector backends: isolation_forest, mad, rolling. Both can be overridden
+# per upload with the `detector` and `contamination` form fields. Per-type
+# models are fitted in parallel (ANOMALY_N_JOBS, joblib semantics) once an
+# upload has at least ANOMALY_PARALLEL_MIN_ROWS rows.
+ANOMALY_DETECTOR = 'isolation_forest'
+ANOMALY_CONTAMINATION = 0.15
+ANOMALY_N_JOBS = -1
+ANOMALY_PARALLEL_MIN_ROWS = 100_000
+
+# Baseline model registry
+# Set ANOMALY_BASELINE to "name" or "name@v3" to score every upload against a
+# saved model instead of fitting on the upload itself (or pass `baseline` per
+# upload). MODEL_CACHE_SIZE fitted models are kept in memory per worker.
+ANOMALY_BASELINE = None
+MODEL_REGISTRY_DIR = BASE_DIR / 'media' / 'models'
+MODEL_CACHE_SIZE = 4
+
+# Response cache for /api/summary/ and /api/history/ (see core/caching.py).
+# Keys follow the uploads and summaries in the database, so every worker sees
+# changes made by any process. Local memory is per worker process; switch to
+# the file backend below to share cached responses and hit/miss counters.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chemical-visualizer',
+    },
+    # 'default': {
+    #     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    #     'LOCATION': BASE_DIR / 'media' / 'cache',
+    # },
+}
+API_CACHE_ENABLED = True
+API_CACHE_TIMEOUT = None # entries are invalidated explicitly
+
+# Upload row storage: 'orm' (EquipmentData rows in the database) or
+# 'parquet' (compressed Parquet parts per upload, needs pyarrow).
+UPLOAD_STORAGE_BACKEND = 'orm'
+PARQUET_STORAGE_DIR = BASE_DIR / 'media' / 'parquet'
+PARQUET_COMPRESSION = 'zstd'
+
+# PDF reports (/api/uploads/<id>/report.pdf), rendered in the ingest process
+# pool and cached on disk per upload and detector version. /api/export-pdf/
+# waits up to REPORT_WAIT_TIMEOUT seconds for a render before answering 202;
+# keep it well below the gunicorn worker timeout (gunicorn.conf.py).
+# reportlab holds every page until the PDF is saved, so uploads with more
+# than REPORT_MAX_ROWS rows list only their flagged rows (capped the same).
+REPORT_CACHE_DIR = BASE_DIR / 'media' / 'reports'
+REPORT_CHUNK_SIZE = 5_000
+REPORT_WAIT_TIMEOUT = 10
+REPORT_MAX_ROWS = 20_000
+
+# Live sensor streaming (core/live.py, ASGI only: uvicorn config.asgi:application).
+# Readings are micro-batched by size or interval, scored against the last
+# LIVE_WINDOW readings of their stream and stored under one upload per stream.
+# The hub is per process, so run the ASGI server with a single worker.
+# A streamed HTTP body line (one reading) longer than LIVE_MAX_LINE_BYTES is
+# answered with a 413.
+LIVE_DETECTOR = 'mad'
+LIVE_BATCH_SIZE = 2_000
+LIVE_BATCH_INTERVAL = 0.25
+LIVE_WINDOW = 5_000
+LIVE_QUEUE_SIZE = 50_000
+LIVE_SUBSCRIBER_QUEUE = 100
+LIVE_SUMMARY_INTERVAL = 5
+LIVE_MAX_LINE_BYTES = 64 * 1024
+
+# Instrumentation (core/metrics.py): named stage timings, a Server-Timing
+# header and a logfmt line per request on the core.requests logger, and
+# Prometheus histograms at /api/metrics/. Off, it costs a settings lookup.
+METRICS_ENABLED = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
@@ -0,0 +1,241 @@
+# core/batch.py
+"""
+Batch uploads for /api/upload/batch/: several CSVs, ZIP archives of CSVs,
+or both, in one request.
+
+Every CSV (or archive member) becomes a BatchItem and is ingested by the
+process pool from core/jobs.py, one file per worker, so N files take about
+N / cores times as long as one upload instead of N round trips. An archive
+is spooled once as it is; the workers read their member straight out of
+the ZIP, so nothing is extracted to disk.
+
+By default every file becomes its own upload, deduplicated like a single
+upload. With `combine` the batch is stored as one upload: each file is
+still parsed and scored on its own (models fitted on that file, or the
+baseline), then appended to the shared upload as part N of its storage,
+and the per-file summaries are merged.
+"""
+import hashlib
+import os
+import time
+import zipfile
+from concurrent.futures import wait
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .caching import invalidate as invalidate_cache
+from .ingest import (IngestError, duplicate_result, file_hash, find_duplicate, ingest_file, ingest_part,
+                     model_fields, resolve_options, should_stream)
+from .jobs import spool_upload, submit_task
+from .metrics import collect, record_job, stage
+from .models import FileUpload
+from .retention import schedule_purge
+from .storage import delete_upload, get_storage
+from .summaries import SummaryBuilder
+
+
+class BatchItem:
+    """
+    One CSV of a batch: a spooled file, or a member of a spooled archive.
+    Pickled to the worker that ingests it.
+    """
+
+    def __init__(self, path, name, size, member=None):
+        self.path = path
+        self.name = name
+        self.size = size
+        self.member = member
+
+
+@contextmanager
+def open_item(item):
+    if item.member is None:
+        with open(item.path, 'rb') as f:
+            yield f
+    else:
+        # A seekable stream over the compressed member
+        with zipfile.ZipFile(item.path) as archive, archive.open(item.member) as f:
+            yield f
+
+
+def is_csv_member(info):
+    name = info.filename
+    base = os.path.basename(name)
+    # Members are read in place, never extracted, but a name that climbs out
+    # of the archive or an encrypted member is not a plant export either
+    parts = name.replace('\\', '/').split('/')
+    unsafe = name.startswith('/') or '..' in parts or bool(info.flag_bits & 0x1)
+    return (not info.is_dir() and not unsafe and name.lower().endswith('.csv') and not name.startswith('__MACOSX/')
+            and not base.startswith('.'))
+
+
+def collect_items(files):
+    """
+    Spool the uploaded files and list the CSVs to ingest. Returns (items,
+    spooled paths); the caller removes the paths when the batch is done.
+    """
+    limit = getattr(settings, 'BATCH_MAX_FILES', 100)
+    items, paths = [], []
+    try:
+        for file_obj in files:
+            archive = zipfile.is_zipfile(file_obj)
+            file_obj.seek(0)
+            path = spool_upload(file_obj, suffix='.zip' if archive else '.csv')
+            paths.append(path)
+            if not archive:
+                items.append(BatchItem(path, file_obj.name, file_obj.size))
+                continue
+            with zipfile.ZipFile(path) as zf:
+                members = [info for info in zf.infolist() if is_csv_member(info)]
+            if not members:
+                raise IngestError(f"{file_obj.name} contains no CSV files")
+            items.extend(BatchItem(path, info.filename, info.file_size, member=info.filename) for info in members)
+        if len(items) > limit:
+            raise IngestError(f"A batch takes at most {limit} CSV files, got {len(items)}")
+    except Exception:
+        remove_spooled(paths)
+        raise
+    return items, paths
+
+
+def remove_spooled(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def batch_hash(items):
+    """
+    Content hash of a combined batch: the member hashes in order.
+    """
+    digests = []
+    for item in items:
+        with open_item(item) as f:
+            digests.append(file_hash(f))
+    return hashlib.sha256('\n'.join(digests).encode()).hexdigest()
+
+
+def one_process():
+    # The files are what runs in parallel; fitting each file's per-type models
+    # in parallel as well (ANOMALY_N_JOBS) would oversubscribe the cores
+    from joblib import parallel_config
+    return parallel_config(backend='sequential')
+
+
+def run_item(item, options):
+    """
+    Runs inside a worker process: ingest one file as its own upload.
+    """
+    close_old_connections()
+    try:
+        with open_item(item) as f, collect() as timings, one_process():
+            result = ingest_file(f, item.name, stream=should_stream(item), **options)
+    except IngestError as e:
+        return {'file': item.name, 'error': str(e)}
+    upload = result.pop('upload')
+    return dict(result, file=item.name, id=upload.id, stages=timings)
+
+
+def run_part(item, upload_id, part, options):
+    """
+    Runs inside a worker process: append one file to a combined upload.
+    """
+    close_old_connections()
+    upload = FileUpload.objects.get(pk=upload_id)
+    try:
+        with open_item(item) as f, collect() as timings, one_process():
+            result, summary = ingest_part(f, upload, part, **options)
+    except IngestError as e:
+        return {'file': item.name, 'error': str(e)}
+    result.pop('upload')
+    return dict(result, file=item.name, stages=timings, summary=summary)
+
+
+def ingest_batch(items, detector=None, contamination=None, baseline=None, force=False, combine=False, name=None):
+    """
+    Ingest every item in the worker pool and wait for all of them. Returns
+    {'files': [per-file result], 'combined': upload or None, ...}.
+    """
+    started = time.perf_counter()
+    options = resolve_options(detector, contamination, baseline)
+    combined = None
+    if combine:
+        with stage('hash'):
+            content_hash = batch_hash(items)
+        duplicate = None if force else find_duplicate(options, content_hash=content_hash)
+        if duplicate is not None:
+            return _batch_result([], duplicate_result(duplicate), started)
+        combined = FileUpload.objects.create(
+            file_name=name or f"batch of {len(items)} files", storage=get_storage().name,
+            content_hash=content_hash,
+            **model_fields(options['detector'], options['contamination'], options.get('baseline')),
+        )
+        futures = [submit_task(run_part, item, combined.id, part, options) for part, item in enumerate(items)]
+    else:
+        # Workers resolve the baseline label themselves, like async jobs
+        options = {'detector': detector, 'contamination': contamination, 'baseline': baseline, 'force': force}
+        futures = [submit_task(run_item, item, options) for item in items]
+
+    with stage('batch'):
+        wait(futures)
+    files = []
+    for item, future in zip(items, futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            # A crashed worker fails its file, not the batch
+            result = {'file': item.name, 'error': f"Worker failed: {e or repr(e)}"}
+        if 'stages' in result:
+            record_job(result.pop('stages'), 0 if result['duplicate'] else result['rows'])
+        files.append(result)
+
+    combined_result = None
+    if combined is not None:
+        combined_result = _finish_combined(combined, files, started)
+    stored = [f['id'] for f in files if 'id' in f]
+    if combined_result is not None or any(not f.get('duplicate', True) for f in files):
+        invalidate_cache()
+        # The batch's own uploads stay even if it is bigger than the retention limit
+        schedule_purge(keep_ids=stored + ([combined.id] if combined_result else []))
+    return _batch_result(files, combined_result, started)
+
+
+def _finish_combined(upload, files, started):
+    summary = SummaryBuilder()
+    rows = anomalies = 0
+    for result in files:
+        if 'summary' in result:
+            summary.merge(result.pop('summary'))
+            rows += result['rows']
+            anomalies += result['anomalies']
+    if not rows:
+        delete_upload(upload)
+        return None
+    with stage('summary'):
+        summary.save(upload)
+    elapsed = time.perf_counter() - started
+    return {
+        "upload": upload,
+        "rows": rows,
+        "anomalies": anomalies,
+        "chunks": len([f for f in files if 'error' not in f]),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": int(rows / elapsed) if elapsed > 0 else rows,
+        "duplicate": False,
+        # The row errors themselves are in each file's result
+        "rejected_rows": sum(f.get('rejected_rows', 0) for f in files),
+        "row_errors": [],
+    }
+
+
+def _batch_result(files, combined, started):
+    return {
+        'files': files,
+        'combined': combined,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
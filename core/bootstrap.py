@@ -0,0 +1,20 @@
+# core/bootstrap.py
+"""
+Initializer of the worker process pool (core/jobs.py).
+
+With the "spawn" start method a new worker unpickles its initializer before
+Django is set up, so this module must import cleanly on a bare interpreter:
+no models, nothing that touches the app registry at import time.
+"""
+import os
+
+
+def init_worker():
+    # With "fork" this is a no-op apart from dropping the connections
+    # inherited from the parent.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+
+    from django.db import connections
+    connections.close_all()
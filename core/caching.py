@@ -0,0 +1,137 @@
+# core/caching.py
+"""
+Response cache for the polled read endpoints (/api/summary/, /api/history/).
+
+A response only goes stale when an upload is added or removed, or when an
+upload's summary is (re)written: at the end of an ingest, after
+re-flagging, and every few seconds for a live stream. Cache keys and ETags
+are therefore built from the database itself: the latest FileUpload id, the
+number of uploads, the number of summaries and the newest summary's
+computed_at. Every process sees those change, whichever process made the
+change and whatever the cache backend. The generation counter that
+invalidate() bumps comes on top, for changes made in this process.
+Responses carry an ETag and Last-Modified, and a client sending a matching
+If-None-Match (or an If-Modified-Since that is not older than the latest
+change) gets a 304.
+
+Uses Django's cache framework (see CACHES in settings). With the default
+local-memory backend every gunicorn worker keeps its own copy; point CACHES
+at the file backend to share entries and counters between workers.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import FileUpload
+
+PREFIX = 'api-cache'
+COUNTERS = ['hits', 'misses', 'not_modified', 'invalidations']
+
+
+def enabled():
+    return getattr(settings, 'API_CACHE_ENABLED', True)
+
+
+def generation():
+    return cache.get(f'{PREFIX}:generation', 0)
+
+
+def invalidate():
+    """
+    Drop every cached response. Call after anything that changes what the
+    cached endpoints return (new upload, retention delete, re-thresholding).
+    """
+    try:
+        cache.incr(f'{PREFIX}:generation')
+    except ValueError:
+        cache.set(f'{PREFIX}:generation', 1, None)
+    cache.set(f'{PREFIX}:changed_at', timezone.now(), None)
+    _bump('invalidations')
+
+
+def stats():
+    counters = cache.get_many([f'{PREFIX}:{name}' for name in COUNTERS])
+    result = {name: counters.get(f'{PREFIX}:{name}', 0) for name in COUNTERS}
+    lookups = result['hits'] + result['misses'] + result['not_modified']
+    result['hit_ratio'] = round((result['hits'] + result['not_modified']) / lookups, 4) if lookups else None
+    result['generation'] = generation()
+    result['backend'] = settings.CACHES['default']['BACKEND']
+    return result
+
+
+def _bump(name):
+    key = f'{PREFIX}:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _state():
+    return FileUpload.objects.aggregate(latest=Max('id'), count=Count('id'), modified=Max('uploaded_at'),
+                                        summaries=Count('summary'), summarized=Max('summary__computed_at'))
+
+
+def not_modified(request, etag, modified=None):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and modified is not None and int(modified.timestamp()) <= since
+
+
+def cached_api(namespace):
+    """
+    Decorator for APIView.get methods returning a plain DRF Response. Other
+    responses (streaming bodies, errors) pass through untouched.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not enabled():
+                return method(view, request, *args, **kwargs)
+
+            state = _state()
+            summarized = state['summarized'].timestamp() if state['summarized'] else 0
+            raw = (f"{state['latest']}:{state['count']}:{state['summaries']}:{summarized}:"
+                   f"{generation()}:{request.GET.urlencode()}")
+            # Query strings (e.g. a list of equipment names) can be long, and
+            # memcached refuses keys over 250 characters
+            digest = hashlib.sha1(raw.encode()).hexdigest()
+            key = f"{PREFIX}:{namespace}:{digest}"
+            etag = '"%s"' % digest[:24]
+            # Re-flagging changes data without a new upload, so Last-Modified
+            # also moves with the summaries and the last explicit invalidation
+            modified = max(filter(None, [state['modified'], state['summarized'], cache.get(f'{PREFIX}:changed_at')]),
+                           default=None)
+
+            if not_modified(request, etag, modified):
+                _bump('not_modified')
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                data = cache.get(key)
+                if data is not None:
+                    _bump('hits')
+                    response = Response(data)
+                else:
+                    response = method(view, request, *args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != status.HTTP_200_OK:
+                        return response
+                    _bump('misses')
+                    cache.set(key, response.data, getattr(settings, 'API_CACHE_TIMEOUT', None))
+
+            response['ETag'] = etag
+            if modified is not None:
+                response['Last-Modified'] = http_date(modified.timestamp())
+            # Let clients keep a copy but always revalidate it
+            response['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,217 @@
+# core/charts.py
+"""
+Chart-ready aggregates for /api/uploads/<id>/chart/.
+
+Instead of shipping every row to the clients, the server reduces an upload
+to what the charts draw:
+
+    histogram  counts (normal / anomalous) per bin for each variable
+    box        per-type quantiles and whiskers for each variable
+    series     each variable in row order, LTTB-reduced to `points` points
+    density    2-D bin counts of Pressure vs Temperature
+
+The payload size depends only on the bin/point counts, not on the upload.
+The stored columns are read once (float32), everything else is NumPy.
+Results are cached per upload and summary version, since the rows only
+change when an upload is re-thresholded (which rebuilds its summary).
+"""
+import hashlib
+
+import numpy as np
+from django.core.cache import cache
+
+from .filters import int_params, split_list
+from .metrics import stage
+from .storage import storage_for
+from .summaries import get_summary
+
+VARIABLES = ['flowrate', 'pressure', 'temperature']
+SECTIONS = ['histogram', 'box', 'series', 'density']
+
+# parameter -> (default, min, max)
+LIMITS = {
+    'bins': (30, 2, 200),
+    'points': (150, 10, 5000),
+    'grid': (20, 2, 100),
+}
+
+
+class ChartOptions:
+
+    def __init__(self, sections=None, bins=30, points=150, grid=20):
+        self.sections = sections or list(SECTIONS)
+        self.bins = bins
+        self.points = points
+        self.grid = grid
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Raises ValueError with a message fit for a 400 response.
+        """
+        sections = split_list(params.get('include'))
+        unknown = [s for s in sections if s not in SECTIONS]
+        if unknown:
+            raise ValueError(f"Unknown chart sections: {unknown}. Choose from: {SECTIONS}")
+        return cls(sections=sections, **int_params(params, LIMITS))
+
+    def key(self):
+        return f"{','.join(sorted(self.sections))}:{self.bins}:{self.points}:{self.grid}"
+
+
+def chart_cache_key(upload, options):
+    version = int(get_summary(upload).computed_at.timestamp() * 1000)
+    raw = f"chart:{upload.id}:{version}:{options.key()}"
+    return 'chart:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_chart(upload, options):
+    """
+    Returns (payload, cache key); the key doubles as the ETag.
+    """
+    key = chart_cache_key(upload, options)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_chart(upload, options)
+        cache.set(key, payload, None)
+    return payload, key
+
+
+@stage('chart')
+def build_chart(upload, options):
+    columns = load_columns(upload)
+    flags = columns['is_anomaly']
+    payload = {'id': upload.id, 'rows': int(len(flags))}
+    if 'histogram' in options.sections:
+        payload['histogram'] = {v: histogram(columns[v], flags, options.bins) for v in VARIABLES}
+    if 'box' in options.sections:
+        payload['box'] = box_stats(columns, columns['types'], columns['type_names'])
+    if 'series' in options.sections:
+        payload['series'] = {v: series(columns[v], flags, options.points) for v in VARIABLES}
+    if 'density' in options.sections:
+        payload['density'] = density(columns['temperature'], columns['pressure'], flags, options.grid)
+    return payload
+
+
+def load_columns(upload):
+    """
+    The numeric columns as float32, anomaly flags and equipment types as
+    integer codes, read chunk by chunk from the upload's storage.
+    """
+    parts = {name: [] for name in VARIABLES + ['is_anomaly', 'equipment_type']}
+    backend = storage_for(upload)
+    for frame in backend.iter_frames(upload, VARIABLES + ['is_anomaly', 'equipment_type']):
+        for name in VARIABLES:
+            parts[name].append(frame[name].to_numpy(dtype=np.float32, na_value=np.nan))
+        parts['is_anomaly'].append(frame['is_anomaly'].to_numpy(dtype=bool))
+        parts['equipment_type'].append(frame['equipment_type'].astype(str).to_numpy())
+
+    def joined(name, dtype):
+        return np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype)
+
+    columns = {name: joined(name, np.float32) for name in VARIABLES}
+    columns['is_anomaly'] = joined('is_anomaly', bool)
+    columns['type_names'], columns['types'] = np.unique(joined('equipment_type', object).astype(str),
+                                                        return_inverse=True)
+    return columns
+
+
+def histogram(values, flags, bins):
+    valid = ~np.isnan(values)
+    values, flags = values[valid], flags[valid]
+    if not len(values):
+        return {'edges': [], 'counts': [], 'anomalies': []}
+    edges = np.histogram_bin_edges(values, bins=bins)
+    counts, _ = np.histogram(values, bins=edges)
+    anomalies, _ = np.histogram(values[flags], bins=edges)
+    return {'edges': _round(edges), 'counts': counts.tolist(), 'anomalies': anomalies.tolist()}
+
+
+def box_stats(columns, types, type_names):
+    """
+    Per type and variable: quartiles, whiskers at 1.5 IQR (clipped to the
+    data) and the number of points outside them.
+    """
+    result = {}
+    order = np.argsort(types, kind='stable')
+    bounds = np.searchsorted(types[order], np.arange(len(type_names) + 1))
+    for code, name in enumerate(type_names):
+        rows = order[bounds[code]:bounds[code + 1]]
+        stats = {'count': int(len(rows))}
+        for variable in VARIABLES:
+            values = columns[variable][rows]
+            values = values[~np.isnan(values)]
+            if not len(values):
+                stats[variable] = None
+                continue
+            q1, median, q3 = np.percentile(values, [25, 50, 75])
+            reach = 1.5 * (q3 - q1)
+            inside = values[(values >= q1 - reach) & (values <= q3 + reach)]
+            stats[variable] = dict(zip(
+                ['whisker_low', 'q1', 'median', 'q3', 'whisker_high'],
+                _round([inside.min(), q1, median, q3, inside.max()]),
+            ), outliers=int(len(values) - len(inside)))
+        result[str(name)] = stats
+    return result
+
+
+def series(values, flags, points):
+    """
+    LTTB-reduced series in row order: x is the row number and `anomalies`
+    lists the positions (into x/y) of flagged points.
+    """
+    index = np.flatnonzero(~np.isnan(values))
+    keep = lttb(index.astype(np.float64), values[index].astype(np.float64), points)
+    rows = index[keep]
+    return {
+        'x': rows.tolist(),
+        'y': _round(values[rows]),
+        'anomalies': np.flatnonzero(flags[rows]).tolist(),
+    }
+
+
+def density(x, y, flags, grid):
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y, flags = x[valid], y[valid], flags[valid]
+    if not len(x):
+        return {'x_edges': [], 'y_edges': [], 'counts': [], 'anomalies': []}
+    x_edges = np.histogram_bin_edges(x, bins=grid)
+    y_edges = np.histogram_bin_edges(y, bins=grid)
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    anomalies, _, _ = np.histogram2d(x[flags], y[flags], bins=[x_edges, y_edges])
+    # counts[i][j]: i-th temperature bin, j-th pressure bin
+    return {
+        'x': 'temperature',
+        'y': 'pressure',
+        'x_edges': _round(x_edges),
+        'y_edges': _round(y_edges),
+        'counts': counts.astype(np.int64).tolist(),
+        'anomalies': anomalies.astype(np.int64).tolist(),
+    }
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the `threshold` points that best keep the shape of the series
+    (Largest-Triangle-Three-Buckets). x must be sorted.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    bounds = np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_start, next_end = (bounds[i + 1], bounds[i + 2]) if i + 2 < len(bounds) else (n - 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def _round(values):
+    return [round(float(v), 4) for v in values]
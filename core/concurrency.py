@@ -0,0 +1,96 @@
+# core/concurrency.py
+"""
+Helpers for the several writers sharing one database and media directory:
+gunicorn workers, the ingest process pool and management commands.
+
+    @retry_on_lock
+    def store():
+        with transaction.atomic():
+            ...
+
+re-runs a unit of work that failed because SQLite's write lock stayed taken
+past the busy timeout ("database is locked"), with exponential backoff and
+jitter. Only whole transactions can be retried, so inside an atomic block
+the error is passed on to the enclosing one. Waits show up as the
+`lock_wait` stage (see core/metrics.py).
+
+    with exclusive('retention'):
+        ...
+
+is an advisory lock held by one process of the deployment at a time: a
+file lock next to the spooled uploads where fcntl exists, a lock within
+the process elsewhere (Windows development servers).
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+from .metrics import stage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def is_lock_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in LOCK_MESSAGES)
+
+
+def retry_on_lock(fn):
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        retries = getattr(settings, 'DB_LOCK_RETRIES', 3)
+        delay = getattr(settings, 'DB_LOCK_RETRY_DELAY', 0.5)
+        for attempt in range(retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except OperationalError as e:
+                if attempt == retries or not is_lock_error(e) or connection.in_atomic_block:
+                    raise
+                wait = delay * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning("Database locked in %s, retry %s of %s in %.2f s", fn.__name__, attempt + 1,
+                               retries, wait)
+                with stage('lock_wait'):
+                    time.sleep(wait)
+    return wrapper
+
+
+@contextmanager
+def exclusive(name):
+    """
+    Hold the deployment-wide lock `name` for the block, waiting for it.
+    """
+    with _local_lock(name):
+        if fcntl is None:
+            yield
+            return
+        from .jobs import spool_dir
+
+        with open(os.path.join(spool_dir(), f'.{name}.lock'), 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _local_lock(name):
+    # Threads of this process queue here before taking the file lock; on
+    # Windows this is the only lock there is
+    with _local_locks_guard:
+        return _local_locks.setdefault(name, threading.Lock())
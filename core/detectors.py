@@ -0,0 +1,211 @@
+# core/detectors.py
+"""
+Anomaly detection backends.
+
+Every detector works on the numeric process variables (Pressure, Flowrate,
+Temperature) and produces a continuous score where higher means "more
+anomalous". A row is flagged when its score is above the threshold learned
+at fit time from the requested contamination. Scores tied at the threshold
+are not flagged: robust z-scores of integer readings take few distinct
+values, and flagging a whole tie would overshoot the contamination rate.
+Scores are stored next to EquipmentData.is_anomaly so a different cut-off
+can be applied later with a single UPDATE instead of refitting.
+
+Models are fitted separately for each equipment Type (a pump and a heat
+exchanger do not share a "normal" pressure), in parallel when the upload is
+big enough to make it worth it.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from joblib import Parallel, delayed
+from sklearn.ensemble import IsolationForest
+
+FEATURES = ['Pressure', 'Flowrate', 'Temperature']
+
+DEFAULT_DETECTOR = 'isolation_forest'
+DEFAULT_CONTAMINATION = 0.15
+
+# Types with fewer rows than this are scored by the model fitted on the
+# whole upload instead of getting their own.
+MIN_GROUP_SIZE = 20
+
+# 1.4826 * MAD estimates the standard deviation for normally distributed data
+MAD_SCALE = 1.4826
+
+
+class Detector:
+    name = None
+
+    def __init__(self, contamination=DEFAULT_CONTAMINATION):
+        self.contamination = contamination
+        self.threshold_ = None
+
+    def fit(self, X):
+        self._fit(X)
+        self.threshold_ = float(np.quantile(self.score(X), 1 - self.contamination))
+        return self
+
+    def score(self, X):
+        raise NotImplementedError
+
+    def predict(self, X):
+        return self.score(X) > self.threshold_
+
+    def _fit(self, X):
+        pass
+
+
+class IsolationForestDetector(Detector):
+    """
+    IsolationForest over all three process variables.
+    """
+    name = 'isolation_forest'
+
+    def _fit(self, X):
+        self.model_ = IsolationForest(contamination=self.contamination, random_state=42)
+        self.model_.fit(X)
+
+    def score(self, X):
+        # decision_function is positive for inliers; flip it so higher = worse
+        return -self.model_.decision_function(X)
+
+
+class RobustZScoreDetector(Detector):
+    """
+    Largest robust z-score (distance from the median in MAD units) across the
+    three variables. Fully vectorized, no model to train.
+    """
+    name = 'mad'
+
+    def _fit(self, X):
+        self.median_ = np.median(X, axis=0)
+        mad = np.median(np.abs(X - self.median_), axis=0) * MAD_SCALE
+        self.mad_ = np.where(mad > 0, mad, 1.0)
+
+    def score(self, X):
+        return np.max(np.abs(X - self.median_) / self.mad_, axis=1)
+
+
+class RollingWindowDetector(Detector):
+    """
+    Robust z-score against a centred rolling median/MAD, for exports where the
+    rows are in time order and the process drifts over the file.
+    """
+    name = 'rolling'
+
+    def __init__(self, contamination=DEFAULT_CONTAMINATION, window=50):
+        super().__init__(contamination)
+        self.window = window
+
+    def score(self, X):
+        frame = pd.DataFrame(X)
+        rolling = frame.rolling(self.window, center=True, min_periods=1)
+        median = rolling.median()
+        mad = (frame - median).abs().rolling(self.window, center=True, min_periods=1).median() * MAD_SCALE
+        mad = mad.where(mad > 0, 1.0)
+        return ((frame - median).abs() / mad).max(axis=1).to_numpy()
+
+
+DETECTORS = {
+    IsolationForestDetector.name: IsolationForestDetector,
+    RobustZScoreDetector.name: RobustZScoreDetector,
+    RollingWindowDetector.name: RollingWindowDetector,
+}
+
+
+def get_detector(name, contamination):
+    try:
+        return DETECTORS[name](contamination=contamination)
+    except KeyError:
+        raise ValueError(f"Unknown detector '{name}'. Choose from: {sorted(DETECTORS)}")
+
+
+def feature_matrix(df):
+    X = df[FEATURES].apply(pd.to_numeric, errors='coerce').astype(float)
+    # A missing reading should not sink the whole group; score it at the median
+    return X.fillna(X.median()).fillna(0.0).to_numpy()
+
+
+def _fit_one(name, contamination, X):
+    return get_detector(name, contamination).fit(X)
+
+
+class GroupedModel:
+    """
+    One fitted detector per equipment Type plus a fallback fitted on every
+    row, used for small or previously unseen types.
+    """
+
+    def __init__(self, detector=DEFAULT_DETECTOR, contamination=DEFAULT_CONTAMINATION):
+        get_detector(detector, contamination)  # fail fast on a bad name
+        self.detector = detector
+        self.contamination = contamination
+        self.fallback = None
+        self.groups = {}
+
+    def fit(self, df, n_jobs=None):
+        X = feature_matrix(df)
+        types = df['Type'].astype(str).to_numpy()
+        keys, inverse = np.unique(types, return_inverse=True)
+        subsets = [(key, X[inverse == i]) for i, key in enumerate(keys)]
+        subsets = [(key, rows) for key, rows in subsets if len(rows) >= MIN_GROUP_SIZE]
+
+        jobs = [(None, X)] + subsets
+        fitted = Parallel(n_jobs=_n_jobs(len(X), len(jobs), n_jobs))(
+            delayed(_fit_one)(self.detector, self.contamination, rows) for _, rows in jobs
+        )
+        self.fallback = fitted[0]
+        self.groups = {key: model for (key, _), model in zip(subsets, fitted[1:])}
+        return self
+
+    def score(self, df):
+        """
+        Returns (scores, flags). Each score is measured relative to the
+        threshold of the model that produced it, so 0 is the cut-off for
+        every type and scores from different groups are comparable.
+        """
+        X = feature_matrix(df)
+        types = df['Type'].astype(str).to_numpy()
+        scores = np.empty(len(X), dtype=float)
+        handled = np.zeros(len(X), dtype=bool)
+        for key, model in self.groups.items():
+            mask = types == key
+            if mask.any():
+                scores[mask] = model.score(X[mask]) - model.threshold_
+                handled |= mask
+        if not handled.all():
+            rest = ~handled
+            scores[rest] = self.fallback.score(X[rest]) - self.fallback.threshold_
+        return scores, scores > 0
+
+
+def _n_jobs(rows, tasks, requested):
+    if requested is not None:
+        return requested
+    if tasks < 2 or rows < getattr(settings, 'ANOMALY_PARALLEL_MIN_ROWS', 100_000):
+        return 1
+    return getattr(settings, 'ANOMALY_N_JOBS', -1)
+
+
+def detect(df, detector=DEFAULT_DETECTOR, contamination=DEFAULT_CONTAMINATION):
+    model = GroupedModel(detector, contamination).fit(df)
+    return (model,) + model.score(df)
+
+
+def apply_threshold(upload, threshold=None, contamination=None):
+    """
+    Re-flag an upload from its stored anomaly scores without refitting.
+    Either an absolute score threshold (0 = the fitted cut-off) or a target
+    contamination, which is turned into a score quantile first. Rows scoring
+    above the threshold are flagged.
+    """
+    from .storage import storage_for
+
+    backend = storage_for(upload)
+    if threshold is None:
+        scores = backend.frame(upload, ['anomaly_score'])['anomaly_score'].dropna().to_numpy(dtype=float)
+        if not len(scores):
+            return 0
+        threshold = float(np.quantile(scores, 1 - contamination))
+    return backend.apply_threshold(upload, threshold)
@@ -0,0 +1,107 @@
+# core/engines.py
+"""
+Lazy handles on the analytics and reporting stack.
+
+The modules listed in ENGINE_MODULES pull in pandas, NumPy, scikit-learn
+(with SciPy) and pyarrow at import time, which costs over a second and
+well over 100 MB per process. Code that only routes requests (views, urls)
+goes through the handles below instead of importing them; the real module
+is imported on first attribute access:
+
+    from .engines import ingest
+    result = ingest.ingest_file(...)   # core.ingest is imported here
+
+so migrate, the health check, job polling, metrics and cached responses
+never load the stack. reportlab is only imported while a PDF is rendered.
+
+preload() imports all of it up front. The gunicorn config calls it in the
+master before the workers are forked (see gunicorn.conf.py), so they share
+the loaded modules copy-on-write instead of each importing them again on
+its first request.
+"""
+import gc
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+ENGINE_MODULES = [
+    'core.schema',
+    'core.detectors',
+    'core.storage',
+    'core.summaries',
+    'core.registry',
+    'core.ingest',
+    'core.retention',
+    'core.batch',
+    'core.charts',
+    'core.trends',
+    'core.reports',
+]
+
+# Imported inside functions by the engine modules; optional ones may be missing
+WARM_IMPORTS = [
+    'sklearn.ensemble',
+    'pyarrow.csv',
+    'pyarrow.compute',
+    'pyarrow.parquet',
+    'reportlab.pdfgen.canvas',
+    'reportlab.graphics.charts.barcharts',
+]
+
+
+class LazyModule:
+    """
+    Stands in for a module until one of its attributes is used.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            # import_module holds the import lock, so this is thread-safe
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+batch = LazyModule('core.batch')
+charts = LazyModule('core.charts')
+detectors = LazyModule('core.detectors')
+ingest = LazyModule('core.ingest')
+registry = LazyModule('core.registry')
+reports = LazyModule('core.reports')
+retention = LazyModule('core.retention')
+storage = LazyModule('core.storage')
+summaries = LazyModule('core.summaries')
+trends = LazyModule('core.trends')
+
+
+def preload(freeze=False):
+    """
+    Import the whole stack now. With `freeze`, everything allocated so far
+    is moved out of the garbage collector's reach (gc.freeze()), so
+    collections in forked workers do not write to, and thereby unshare, the
+    pages holding it. Returns the seconds spent.
+    """
+    started = time.perf_counter()
+    for name in ENGINE_MODULES:
+        importlib.import_module(name)
+    for name in WARM_IMPORTS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    seconds = time.perf_counter() - started
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    logger.info("Analytics stack preloaded in %.2f s", seconds)
+    return seconds
@@ -0,0 +1,142 @@
+# core/filters.py
+"""
+Query-string parsing for /api/uploads/<id>/data/.
+
+    ?cursor=<last id>&limit=500
+    &fields=equipment_name,pressure,is_anomaly
+    &equipment_type=Pump,Valve&is_anomaly=true
+    &pressure_min=4.5&pressure_max=9&flowrate_min=100 ...
+
+Rows are paged by id (keyset pagination), so every page is an index range
+scan no matter how deep the client has scrolled.
+"""
+from .serializers import EquipmentDataSerializer
+
+DEFAULT_FIELDS = list(EquipmentDataSerializer.Meta.fields)
+DATA_FIELDS = ['id'] + DEFAULT_FIELDS + ['anomaly_score']
+RANGE_FIELDS = ['flowrate', 'pressure', 'temperature', 'anomaly_score']
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+class DataQuery:
+
+    def __init__(self, fields=None, cursor=None, limit=DEFAULT_LIMIT, equipment_types=None,
+                 is_anomaly=None, ranges=None):
+        self.fields = fields or list(DEFAULT_FIELDS)
+        self.cursor = cursor
+        self.limit = limit
+        self.equipment_types = equipment_types or []
+        self.is_anomaly = is_anomaly
+        self.ranges = ranges or {} # field -> (min, max), either may be None
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Build a query from request.query_params. Raises ValueError with a
+        message fit for a 400 response.
+        """
+        fields = split_list(params.get('fields'))
+        unknown = [f for f in fields if f not in DATA_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {unknown}. Choose from: {DATA_FIELDS}")
+
+        limit = _number(params, 'limit', int)
+        if limit is None:
+            limit = DEFAULT_LIMIT
+        if not 0 < limit <= MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+
+        is_anomaly = params.get('is_anomaly')
+        if is_anomaly not in (None, ''):
+            if is_anomaly.lower() not in ('true', 'false', '1', '0'):
+                raise ValueError("is_anomaly must be true or false")
+            is_anomaly = is_anomaly.lower() in ('true', '1')
+        else:
+            is_anomaly = None
+
+        ranges = {}
+        for field in RANGE_FIELDS:
+            low, high = _number(params, f'{field}_min', float), _number(params, f'{field}_max', float)
+            if low is not None or high is not None:
+                ranges[field] = (low, high)
+
+        return cls(
+            fields=fields,
+            cursor=_number(params, 'cursor', int),
+            limit=limit,
+            equipment_types=split_list(params.get('equipment_type')),
+            is_anomaly=is_anomaly,
+            ranges=ranges,
+        )
+
+    def filter(self, queryset):
+        """
+        Apply the row filters (not the cursor or limit) to an EquipmentData queryset.
+        """
+        if self.equipment_types:
+            queryset = queryset.filter(equipment_type__in=self.equipment_types)
+        if self.is_anomaly is not None:
+            queryset = queryset.filter(is_anomaly=self.is_anomaly)
+        for field, (low, high) in self.ranges.items():
+            if low is not None:
+                queryset = queryset.filter(**{f'{field}__gte': low})
+            if high is not None:
+                queryset = queryset.filter(**{f'{field}__lte': high})
+        return queryset
+
+    def page(self, queryset):
+        """
+        Returns (rows, next_cursor) for one keyset page.
+        """
+        queryset = self.filter(queryset).order_by('id')
+        if self.cursor is not None:
+            queryset = queryset.filter(id__gt=self.cursor)
+
+        columns = ['id'] + [field for field in self.fields if field != 'id']
+        rows = list(queryset.values_list(*columns)[:self.limit + 1])
+        next_cursor = rows[self.limit - 1][0] if len(rows) > self.limit else None
+
+        results = []
+        for row in rows[:self.limit]:
+            record = dict(zip(columns, row))
+            results.append({field: record[field] for field in self.fields})
+        return results, next_cursor
+
+
+def split_list(value):
+    """
+    'a, b,,c' -> ['a', 'b', 'c']; None or '' -> [].
+    """
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def int_params(params, limits):
+    """
+    {name: int} for `limits` ({name: (default, min, max)}), defaults filled
+    in. Raises ValueError with a message fit for a 400 response.
+    """
+    values = {}
+    for name, (default, low, high) in limits.items():
+        raw = params.get(name)
+        if raw in (None, ''):
+            values[name] = default
+            continue
+        try:
+            values[name] = int(raw)
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+        if not low <= values[name] <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+    return values
+
+
+def _number(params, name, cast):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
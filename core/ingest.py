@@ -0,0 +1,470 @@
+# core/ingest.py
+import hashlib
+import os
+import time
+
+import pandas as pd
+from django.conf import settings
+from django.db import transaction
+
+from . import registry
+from .concurrency import retry_on_lock
+from .detectors import DEFAULT_CONTAMINATION, DEFAULT_DETECTOR, GroupedModel
+from .metrics import record_rows, stage
+from .models import FileUpload
+from .schema import COLUMN_NAMES, RowErrors, SchemaError, iter_frames, read_frame
+from .storage import delete_upload, get_storage, storage_for
+from .summaries import SummaryBuilder
+
+REQUIRED_COLUMNS = COLUMN_NAMES
+
+DEFAULT_CHUNK_SIZE = 50_000
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class IngestError(Exception):
+    """
+    Raised when an upload cannot be ingested (bad CSV, missing columns, ...).
+    The message is safe to return to the client.
+    """
+
+
+def chunk_size():
+    return getattr(settings, 'INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+
+
+def should_stream(file_obj, requested=None):
+    """
+    Decide whether an upload goes through the chunked path: either the client
+    asked for it explicitly or the file is bigger than INGEST_STREAM_THRESHOLD.
+    """
+    if requested is not None:
+        return str(requested).lower() in ('1', 'true', 'yes', 'stream')
+    threshold = getattr(settings, 'INGEST_STREAM_THRESHOLD', 20 * 1024 * 1024)
+    return getattr(file_obj, 'size', 0) >= threshold
+
+
+def detection_defaults():
+    return (
+        getattr(settings, 'ANOMALY_DETECTOR', DEFAULT_DETECTOR),
+        getattr(settings, 'ANOMALY_CONTAMINATION', DEFAULT_CONTAMINATION),
+    )
+
+
+def score_chunk(model, df):
+    df['anomaly_score'], df['is_anomaly'] = model.score(df)
+    return df
+
+
+def resolve_options(detector=None, contamination=None, baseline=None):
+    """
+    Detection options with the settings defaults filled in and the baseline
+    looked up in the registry.
+    """
+    default_detector, default_contamination = detection_defaults()
+    options = {
+        'detector': detector or default_detector,
+        'contamination': contamination or default_contamination,
+    }
+    baseline = baseline or getattr(settings, 'ANOMALY_BASELINE', None)
+    if baseline:
+        try:
+            options['baseline'] = registry.resolve(baseline)
+        except registry.RegistryError as e:
+            raise IngestError(str(e))
+    return options
+
+
+def ingest_file(file_obj, file_name, stream=False, progress=None, detector=None, contamination=None,
+                baseline=None, force=False, content_hash=None):
+    """
+    Entry point shared by the upload view and the background job workers.
+    `progress(stage, rows, fraction)` is called as the ingest moves along.
+    `baseline` names a registered model ("name" or "name@v3") to score the
+    rows with instead of fitting new models on the upload itself.
+
+    A file that was already ingested with the same detection options returns
+    the existing upload (result["duplicate"] is True) unless `force` is set.
+    """
+    options = resolve_options(detector, contamination, baseline)
+    if not content_hash:
+        with stage('hash'):
+            content_hash = file_hash(file_obj)
+    if not force:
+        duplicate = find_duplicate(options, content_hash=content_hash)
+        if duplicate is not None:
+            return duplicate_result(duplicate)
+    options.update(progress=progress, content_hash=content_hash, force=force)
+    if stream:
+        result = ingest_csv_stream(file_obj, file_name, **options)
+    else:
+        result = ingest_csv(file_obj, file_name, **options)
+    if not result['duplicate']:
+        record_rows(result['rows'])
+    return result
+
+
+def file_hash(file_obj):
+    """
+    sha256 of the raw upload, read block by block. Leaves the file at the start.
+    """
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for block in iter(lambda: file_obj.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+class FrameHasher:
+    """
+    sha256 over the normalized rows: the required columns in a fixed order,
+    names and types stripped, numbers as floats. Re-exports that only differ
+    in column order, extra columns, quoting, whitespace or line endings hash
+    the same. Rows are hashed independently, so feeding chunks gives the same
+    digest as feeding the whole frame.
+    """
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+
+    def add(self, df):
+        normalized = pd.DataFrame({
+            'Equipment Name': df['Equipment Name'].astype(str).str.strip(),
+            'Type': df['Type'].astype(str).str.strip(),
+            **{column: pd.to_numeric(df[column], errors='coerce').astype('float64')
+               for column in ['Flowrate', 'Pressure', 'Temperature']},
+        })
+        self.digest.update(pd.util.hash_pandas_object(normalized, index=False).to_numpy().tobytes())
+        return self
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+
+def frame_hashing():
+    return getattr(settings, 'INGEST_FRAME_HASH', True)
+
+
+def find_duplicate(options, content_hash=None, frame_hash=None):
+    """
+    The newest upload with the same content (raw bytes or normalized rows)
+    that was scored the same way, or None.
+    """
+    if not content_hash and not frame_hash:
+        return None
+    uploads = FileUpload.objects.select_related('summary')
+    uploads = uploads.filter(content_hash=content_hash) if content_hash else uploads.filter(frame_hash=frame_hash)
+    baseline = options.get('baseline')
+    if baseline is not None:
+        uploads = uploads.filter(model_version=baseline.label)
+    else:
+        uploads = uploads.filter(detector=options['detector'], contamination=options['contamination'],
+                                 model_version='')
+    return uploads.order_by('-uploaded_at').first()
+
+
+def duplicate_result(upload):
+    from .summaries import get_summary
+
+    summary = get_summary(upload)
+    return {
+        "upload": upload,
+        "rows": summary.total_count,
+        "anomalies": summary.anomaly_count,
+        "chunks": 0,
+        "seconds": 0.0,
+        "rows_per_sec": 0,
+        "duplicate": True,
+        "rejected_rows": 0,
+        "row_errors": [],
+    }
+
+
+def parse(file_obj, errors):
+    """
+    The whole upload as a validated frame (see core/schema.py). Rejected rows
+    go to `errors`; a file without a single valid row is an IngestError.
+    """
+    try:
+        df = read_frame(file_obj, errors)
+    except SchemaError as e:
+        raise IngestError(str(e))
+    if df.empty:
+        raise IngestError(no_rows_message(errors))
+    return df
+
+
+def no_rows_message(errors):
+    if errors.rejected_rows:
+        return f"CSV file contains no valid rows: {errors.describe()}"
+    return "CSV file contains no rows"
+
+
+def prepare_model(df, detector, contamination, baseline=None):
+    """
+    Returns (model, upload fields). A baseline is loaded from the registry
+    and only used for scoring; otherwise fresh models are fitted on `df`.
+    """
+    if baseline is not None:
+        try:
+            model = registry.load(baseline)
+        except registry.RegistryError as e:
+            raise IngestError(str(e))
+    else:
+        model = GroupedModel(detector, contamination).fit(df)
+    return model, model_fields(detector, contamination, baseline)
+
+
+def model_fields(detector, contamination, baseline=None):
+    """
+    The FileUpload fields recording how an upload was scored.
+    """
+    if baseline is not None:
+        return {
+            'detector': baseline.detector,
+            'contamination': baseline.contamination,
+            'model_version': baseline.label,
+        }
+    return {'detector': detector, 'contamination': contamination}
+
+
+def ingest_csv(file_obj, file_name, progress=None, detector=DEFAULT_DETECTOR, contamination=DEFAULT_CONTAMINATION,
+               baseline=None, content_hash='', force=False):
+    """
+    Whole-file ingest: parse everything, fit the per-type models on the full
+    frame (or load the baseline) and insert the rows. Fine for the typical
+    plant export. A frame whose normalized rows were already ingested returns
+    that upload before any model is fitted.
+    """
+    report = progress or _no_progress
+    started = time.perf_counter()
+    frame_hash = ''
+    dedup = None if force else {'detector': detector, 'contamination': contamination, 'baseline': baseline}
+    errors = RowErrors()
+    try:
+        report('parsing', 0, 0.0)
+        with stage('parse'):
+            df = parse(file_obj, errors)
+        if frame_hashing():
+            with stage('hash'):
+                frame_hash = FrameHasher().add(df).hexdigest()
+            duplicate = None if force else find_duplicate(dedup, frame_hash=frame_hash)
+            if duplicate is not None:
+                return duplicate_result(duplicate)
+        report('detecting', 0, 0.3)
+        with stage('fit'):
+            model, fields = prepare_model(df, detector, contamination, baseline)
+        with stage('score'):
+            score_chunk(model, df)
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(f"Failed to read CSV or run AI model: {str(e)}")
+
+    report('writing', 0, 0.6)
+    try:
+        upload, rows = store_frame(df, file_name, fields, content_hash, frame_hash, dedup)
+    except Exception as e:
+        raise IngestError(f"Failed to store rows: {str(e)}")
+    if rows is None:
+        return duplicate_result(upload)
+    report('done', rows, 1.0)
+    return _result(upload, rows, int(df['is_anomaly'].sum()), started, chunks=1, errors=errors)
+
+
+@retry_on_lock
+def store_frame(df, file_name, fields, content_hash='', frame_hash='', dedup=None):
+    """
+    Create the upload, its rows and its summary in one transaction, so a
+    failure or a killed worker leaves nothing half-stored behind. With
+    `dedup` (the detection options) the duplicate check is repeated inside
+    the transaction, which SQLite serializes with other writers: of two
+    identical uploads racing each other only one is stored, and the other
+    gets (that upload, None). Returns (upload, rows).
+    """
+    backend = get_storage()
+    upload = writer = None
+    try:
+        with transaction.atomic():
+            if dedup is not None:
+                duplicate = find_duplicate(dedup, content_hash=content_hash)
+                if duplicate is None and frame_hash:
+                    duplicate = find_duplicate(dedup, frame_hash=frame_hash)
+                if duplicate is not None:
+                    return duplicate, None
+            upload = FileUpload.objects.create(file_name=file_name, storage=backend.name,
+                                               content_hash=content_hash, frame_hash=frame_hash, **fields)
+            writer = backend.writer(upload)
+            with stage('write'):
+                rows = writer.write(df)
+                writer.close()
+            with stage('summary'):
+                SummaryBuilder().add(df).save(upload)
+    except Exception:
+        # The rows in the database are rolled back, files are not
+        if writer is not None:
+            writer.abort()
+        if upload is not None:
+            backend.delete(upload.id)
+        raise
+    return upload, rows
+
+
+def ingest_part(file_obj, upload, part, detector=DEFAULT_DETECTOR, contamination=DEFAULT_CONTAMINATION,
+                baseline=None):
+    """
+    One file of a combined batch upload: parsed, scored with models fitted on
+    this file alone (or the baseline) and appended to `upload` as part
+    `part`. Returns the result and the file's SummaryBuilder; the caller
+    merges the builders and saves the summary once every part is in.
+    """
+    started = time.perf_counter()
+    errors = RowErrors()
+    try:
+        with stage('parse'):
+            df = parse(file_obj, errors)
+        with stage('fit'):
+            model, _ = prepare_model(df, detector, contamination, baseline)
+        with stage('score'):
+            score_chunk(model, df)
+    except IngestError:
+        raise
+    except Exception as e:
+        raise IngestError(f"Failed to read CSV or run AI model: {str(e)}")
+
+    writer = storage_for(upload).writer(upload, part=part)
+    try:
+        with stage('write'):
+            rows = retry_on_lock(writer.write)(df)
+            writer.close()
+    except Exception as e:
+        writer.abort()
+        raise IngestError(f"Failed to store rows: {str(e)}")
+    with stage('summary'):
+        summary = SummaryBuilder().add(df)
+    return _result(upload, rows, int(df['is_anomaly'].sum()), started, chunks=1, errors=errors), summary
+
+
+def ingest_csv_stream(file_obj, file_name, size=None, progress=None, detector=DEFAULT_DETECTOR,
+                      contamination=DEFAULT_CONTAMINATION, baseline=None, content_hash='', force=False):
+    """
+    Chunked ingest for very large exports. The CSV is read and validated
+    about `size` rows at a time, the models are fitted on the first chunk
+    with valid rows (or the baseline is loaded) and reused to score the
+    rest, and every chunk is written with its own bulk insert. Peak memory is
+    bounded by the chunk size, not the file size. The frame hash is only
+    known at the end, so here it is recorded for later uploads, not checked.
+
+    Every chunk is committed on its own, so job progress stays visible and
+    other writers get the SQLite write lock between chunks; if the ingest
+    fails, the upload and the chunks written so far are deleted again.
+    """
+    report = progress or _no_progress
+    total_bytes = _file_size(file_obj)
+    started = time.perf_counter()
+    backend = get_storage()
+    upload = writer = None
+    rows = anomalies = chunks = 0
+    model = None
+    summary = SummaryBuilder()
+    hasher = FrameHasher() if frame_hashing() else None
+    errors = RowErrors()
+    try:
+        report('parsing', 0, 0.0)
+        reader = iter_frames(file_obj, size or chunk_size(), errors)
+        while True:
+            # Chunks are parsed lazily, so the read happens in next()
+            with stage('parse'):
+                df = next(reader, None)
+            if df is None:
+                break
+            if df.empty:
+                # Every row of the chunk was rejected
+                continue
+            if model is None:
+                with stage('fit'):
+                    model, fields = prepare_model(df, detector, contamination, baseline)
+                upload = retry_on_lock(FileUpload.objects.create)(
+                    file_name=file_name, storage=backend.name, content_hash=content_hash, **fields)
+                writer = backend.writer(upload)
+                write = retry_on_lock(writer.write)
+            if hasher is not None:
+                with stage('hash'):
+                    hasher.add(df)
+            with stage('score'):
+                score_chunk(model, df)
+            with stage('write'):
+                rows += write(df)
+            anomalies += int(df['is_anomaly'].sum())
+            with stage('summary'):
+                summary.add(df)
+            chunks += 1
+            report('writing', rows, _fraction_read(file_obj, total_bytes))
+        if writer is not None:
+            with stage('write'):
+                writer.close()
+    except Exception as e:
+        # Don't leave a half-written upload behind
+        if upload is not None:
+            writer.abort()
+            retry_on_lock(delete_upload)(upload)
+        if isinstance(e, IngestError):
+            raise
+        if isinstance(e, SchemaError):
+            raise IngestError(str(e))
+        raise IngestError(f"Failed to read CSV or run AI model: {str(e)}")
+
+    if upload is None:
+        raise IngestError(no_rows_message(errors))
+    report('summarizing', rows, 0.99)
+    with stage('summary'):
+        _finish_stream(upload, summary, hasher.hexdigest() if hasher is not None else '')
+    return _result(upload, rows, anomalies, started, chunks=chunks, errors=errors)
+
+
+@retry_on_lock
+def _finish_stream(upload, summary, frame_hash):
+    with transaction.atomic():
+        summary.save(upload)
+        if frame_hash:
+            FileUpload.objects.filter(pk=upload.pk).update(frame_hash=frame_hash)
+
+
+def _no_progress(stage, rows, fraction):
+    pass
+
+
+def _file_size(file_obj):
+    size = getattr(file_obj, 'size', None)
+    if size is None:
+        try:
+            size = os.fstat(file_obj.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            pass
+    return size
+
+
+def _fraction_read(file_obj, total_bytes):
+    # pandas reads ahead in blocks, so the file position is only an estimate
+    if not total_bytes:
+        return None
+    try:
+        return min(file_obj.tell() / total_bytes, 0.99)
+    except (OSError, ValueError):
+        return None
+
+
+def _result(upload, rows, anomalies, started, chunks, errors=None):
+    elapsed = time.perf_counter() - started
+    return {
+        "upload": upload,
+        "rows": rows,
+        "anomalies": anomalies,
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": int(rows / elapsed) if elapsed > 0 else rows,
+        "duplicate": False,
+        "rejected_rows": errors.rejected_rows if errors else 0,
+        "row_errors": errors.report() if errors else [],
+    }
@@ -0,0 +1,144 @@
+# core/jobs.py
+"""
+Background ingestion jobs.
+
+Uploads posted with async=true are spooled to disk and handed to a local
+ProcessPoolExecutor, so parsing, the anomaly model and the inserts happen
+outside the gunicorn request. Job state lives in the IngestJob table, which
+is what /api/jobs/<id>/ reads. No external broker is needed.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from .bootstrap import init_worker
+from .caching import invalidate as invalidate_cache
+from .concurrency import retry_on_lock
+from .metrics import collect, record_job
+from .models import IngestJob
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(reset=False):
+    global _executor
+    with _executor_lock:
+        if reset and _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=False)
+            _executor = None
+        if _executor is None:
+            workers = getattr(settings, 'INGEST_WORKERS', None) or os.cpu_count() or 1
+            context = multiprocessing.get_context(getattr(settings, 'INGEST_START_METHOD', 'spawn'))
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker)
+        return _executor
+
+
+def spool_dir():
+    path = getattr(settings, 'INGEST_SPOOL_DIR', settings.BASE_DIR / 'media' / 'spool')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_upload(file_obj, suffix='.csv'):
+    """
+    Copy an uploaded file to the spool directory so a worker process can read
+    it after the request has finished.
+    """
+    path = os.path.join(spool_dir(), f"{uuid.uuid4().hex}{suffix}")
+    with open(path, 'wb') as out:
+        for chunk in file_obj.chunks():
+            out.write(chunk)
+    return path
+
+
+def submit_ingest(file_obj, stream=False, **options):
+    job = IngestJob.objects.create(file_name=file_obj.name)
+    path = spool_upload(file_obj)
+    future = submit_task(run_ingest_job, job.id, path, file_obj.name, stream, options)
+    future.add_done_callback(lambda f: _on_job_finished(job.id, f))
+    return job
+
+
+def submit_task(fn, *args):
+    try:
+        return get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        # A worker died earlier (OOM kill, segfault); start a fresh pool
+        return get_executor(reset=True).submit(fn, *args)
+
+
+@retry_on_lock
+def update_job(job_id, **fields):
+    # queryset.update() skips auto_now, so stamp updated_at ourselves
+    IngestJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **fields)
+
+
+def run_ingest_job(job_id, path, file_name, stream=False, options=None):
+    """
+    Runs inside a worker process. Returns the upload id, rows and stage
+    timings, which the web process adds to its metrics.
+    """
+    from .ingest import IngestError, ingest_file
+
+    close_old_connections()
+
+    def progress(stage, rows, fraction):
+        fields = {'stage': stage, 'rows_processed': rows}
+        if fraction is not None:
+            fields['progress'] = fraction
+        update_job(job_id, **fields)
+
+    update_job(job_id, status=IngestJob.STATUS_RUNNING, stage='parsing')
+    try:
+        with open(path, 'rb') as f, collect() as timings:
+            result = ingest_file(f, file_name, stream=stream, progress=progress, **(options or {}))
+    except IngestError as e:
+        update_job(job_id, status=IngestJob.STATUS_FAILED, stage='failed', error=str(e))
+        return None
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    upload = result.pop('upload')
+    invalidate_cache()
+    update_job(
+        job_id,
+        status=IngestJob.STATUS_DONE,
+        stage='done',
+        progress=1.0,
+        rows_processed=result['rows'],
+        upload=upload,
+        result=dict(result, id=upload.id),
+    )
+    return {'id': upload.id, 'rows': 0 if result['duplicate'] else result['rows'], 'stages': timings}
+
+
+def _on_job_finished(job_id, future):
+    # Anything that escaped run_ingest_job (a crash, a broken pool, an
+    # unexpected exception) still has to be reported on the job.
+    error = future.exception()
+    if error is None:
+        if future.result() is not None:
+            record_job(future.result()['stages'], future.result()['rows'])
+            if future.result()['rows']:
+                from .retention import schedule_purge
+                schedule_purge()
+        return
+    logger.error("Ingest job %s crashed: %s", job_id, error)
+    try:
+        update_job(job_id, status=IngestJob.STATUS_FAILED, stage='failed', error=str(error) or repr(error))
+    finally:
+        connections.close_all()
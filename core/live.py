@@ -0,0 +1,518 @@
+# core/live.py
+"""
+Live sensor streaming over ASGI.
+
+Readings are pushed one JSON object per reading, using the CSV column names
+("Equipment Name", "Type", "Flowrate", ...) or the EquipmentData field names:
+
+    POST /api/live/ingest/?stream=<name>   NDJSON body, chunked (read as it arrives)
+    ws   /ws/live/ingest/?stream=<name>    text frames: one reading, a list, or NDJSON
+
+Every reading is checked against the upload schema (core/schema.py), like
+a CSV row: a missing or non-numeric value, a fractional Flowrate or
+Temperature, an out-of-range value or an over-long name rejects that
+reading alone. The reply (the HTTP response, or an error frame per
+WebSocket message) lists the rejected readings by position, counting from 1.
+An HTTP body line longer than LIVE_MAX_LINE_BYTES ends the request with a
+413; the readings before it are kept.
+
+Subscribers get aggregates and anomaly events:
+
+    GET  /api/live/events/                 Server-Sent Events
+    ws   /ws/live/events/                  JSON text frames
+
+Readings land in a bounded queue (a full queue slows the senders down instead
+of growing memory). One batcher task drains it into micro-batches of up to
+LIVE_BATCH_SIZE rows or LIVE_BATCH_INTERVAL seconds. Each batch is scored
+with a GroupedModel fitted on a sliding window of the last LIVE_WINDOW
+readings of its stream, stored with the ORM writer under one FileUpload per
+stream, folded into that upload's summary and then published.
+Scoring and inserts run on a dedicated thread, so the event loop keeps
+accepting readings while a batch is being written.
+
+The hub lives in the server process. Run the ASGI app with a single worker
+(e.g. `uvicorn config.asgi:application`) so every producer and subscriber
+shares it.
+
+config.asgi imports this module in every ASGI process, so pandas and the
+rest of the analytics stack are only imported once the first reading
+arrives, like the views do through core.engines.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM = 'live'
+MAX_EVENT_ANOMALIES = 20 # flagged readings listed per anomaly event
+HEARTBEAT_SECONDS = 15
+
+# Accepted reading keys -> CSV column
+READING_KEYS = {
+    'Equipment Name': 'Equipment Name', 'equipment_name': 'Equipment Name',
+    'Type': 'Type', 'equipment_type': 'Type',
+    'Flowrate': 'Flowrate', 'flowrate': 'Flowrate',
+    'Pressure': 'Pressure', 'pressure': 'Pressure',
+    'Temperature': 'Temperature', 'temperature': 'Temperature',
+}
+NUMERIC = ['Flowrate', 'Pressure', 'Temperature']
+
+
+def option(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_readings(text, errors, first=1):
+    """
+    Readings from one message: a JSON object, a JSON list or NDJSON lines.
+    Bad readings are reported to `errors` (a RowErrors) by position,
+    counting from `first`. Returns (valid readings as CSV-named dicts,
+    number of readings in the message).
+    """
+    from .schema import validate_records
+
+    text = text.strip()
+    if not text:
+        return [], 0
+    try:
+        items = json.loads(text)
+        items = items if isinstance(items, list) else [items]
+    except ValueError:
+        items = []
+        for line in text.splitlines():
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    items.append(line) # reported as it was sent
+    records, numbers = [], []
+    for number, item in enumerate(items, start=first):
+        if isinstance(item, dict):
+            records.append({READING_KEYS[key]: value for key, value in item.items() if key in READING_KEYS})
+            numbers.append(number)
+        else:
+            errors.add([number], '', "not a JSON object", [item if isinstance(item, str) else json.dumps(item)])
+            errors.rejected_rows += 1
+    if not records:
+        return [], len(items)
+    return validate_records(records, errors, numbers).to_dict('records'), len(items)
+
+
+class StreamSession:
+    """
+    One named stream: its FileUpload, scoring window and running summary.
+    Only touched from the hub's worker thread.
+    """
+
+    def __init__(self, name):
+        import pandas as pd
+
+        self.name = name
+        self.detector = option('LIVE_DETECTOR', 'mad')
+        self.contamination = option('ANOMALY_CONTAMINATION', 0.15)
+        self.window = pd.DataFrame(columns=['Type'] + NUMERIC)
+        self.summary = None
+        self.upload = None
+        self.saved_at = 0.0
+
+    def open_upload(self):
+        from .models import FileUpload
+        from .storage import ORMStorage
+        from .summaries import SummaryBuilder
+
+        self.upload = FileUpload.objects.create(
+            file_name=f'live:{self.name}',
+            detector=self.detector,
+            contamination=self.contamination,
+            storage=ORMStorage.name, # rows arrive for as long as the stream runs
+        )
+        self.summary = SummaryBuilder()
+        return self.upload
+
+    def score(self, df):
+        import pandas as pd
+
+        from .detectors import GroupedModel
+
+        # The window includes the batch, so the first readings of a stream
+        # are scored against each other instead of against nothing
+        window = pd.concat([self.window, df[['Type'] + NUMERIC]], ignore_index=True)
+        self.window = window.iloc[-option('LIVE_WINDOW', 5_000):]
+        model = GroupedModel(self.detector, self.contamination).fit(window, n_jobs=1)
+        df['anomaly_score'], df['is_anomaly'] = model.score(df)
+        return df
+
+    def store(self, df):
+        from .concurrency import retry_on_lock
+        from .storage import ORMWriter
+
+        if self.upload is None:
+            retry_on_lock(self.open_upload)()
+        try:
+            retry_on_lock(ORMWriter(self.upload).write)(df)
+        except IntegrityError:
+            # The upload was removed (retention) while the stream was running
+            retry_on_lock(self.open_upload)()
+            retry_on_lock(ORMWriter(self.upload).write)(df)
+        self.summary.add(df)
+
+    def save_summary(self, force=False):
+        from .caching import invalidate
+
+        now = time.monotonic()
+        if self.upload is None or not (force or now - self.saved_at >= option('LIVE_SUMMARY_INTERVAL', 5)):
+            return
+        self.saved_at = now
+        self.summary.save(self.upload)
+        invalidate()
+
+
+class LiveHub:
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=option('LIVE_QUEUE_SIZE', 50_000))
+        self.subscribers = set()
+        self.sessions = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='live-writer')
+        self.totals = {'rows': 0, 'anomalies': 0, 'rejected': 0, 'failed': 0, 'batches': 0}
+        self.recent = deque() # (monotonic time, rows) of the last few seconds
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def put(self, stream, readings):
+        for reading in readings:
+            await self.queue.put((stream, reading))
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=option('LIVE_SUBSCRIBER_QUEUE', 100))
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def snapshot(self):
+        return dict(self.totals, type='snapshot', rows_per_sec=self.rate(), subscribers=len(self.subscribers),
+                    streams={name: s.upload.id if s.upload else None for name, s in list(self.sessions.items())})
+
+    def rate(self):
+        now = time.monotonic()
+        while self.recent and now - self.recent[0][0] > 5:
+            self.recent.popleft()
+        if not self.recent:
+            return 0.0
+        return round(sum(rows for _, rows in self.recent) / max(now - self.recent[0][0], 1.0), 1)
+
+    def publish(self, event):
+        message = json.dumps(event)
+        for queue in list(self.subscribers):
+            if queue.full():
+                # A slow subscriber loses its oldest events, never blocks the hub
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def close(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self._flush_summaries)
+        self.executor.shutdown(wait=True)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        size = option('LIVE_BATCH_SIZE', 2_000)
+        interval = option('LIVE_BATCH_INTERVAL', 0.25)
+        while True:
+            first = await self.queue.get()
+            batch = [first]
+            deadline = loop.time() + interval
+            while len(batch) < size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                events = await loop.run_in_executor(self.executor, self._process, batch)
+            except Exception:
+                logger.exception("Live batch of %s readings failed", len(batch))
+                continue
+            for event in events:
+                self.publish(event)
+
+    def _process(self, batch):
+        """
+        Runs on the writer thread: score, store and summarise one batch.
+        """
+        close_old_connections()
+        by_stream = {}
+        for stream, reading in batch:
+            by_stream.setdefault(stream, []).append(reading)
+
+        events = []
+        for stream, readings in by_stream.items():
+            try:
+                events.extend(self._process_stream(stream, readings))
+            except Exception:
+                # Only this stream's readings are lost, the other streams' are stored
+                logger.exception("Live batch of %s readings for stream %s failed", len(readings), stream)
+                self.totals['failed'] += len(readings)
+        return events
+
+    def _process_stream(self, stream, readings):
+        import pandas as pd
+
+        events = []
+        session = self.sessions.get(stream) or self.sessions.setdefault(stream, StreamSession(stream))
+        df = session.score(pd.DataFrame.from_records(readings, columns=['Equipment Name', 'Type'] + NUMERIC))
+        session.store(df)
+        session.save_summary()
+
+        flagged = df[df['is_anomaly']]
+        self.totals['rows'] += len(df)
+        self.totals['anomalies'] += len(flagged)
+        self.totals['batches'] += 1
+        self.recent.append((time.monotonic(), len(df)))
+        events.append({
+            'type': 'batch',
+            'stream': stream,
+            'upload': session.upload.id,
+            'rows': len(df),
+            'anomalies': len(flagged),
+            'means': {column.lower(): _mean(df[column]) for column in NUMERIC},
+            'total_rows': session.summary.total,
+            'total_anomalies': session.summary.anomalies,
+            'rows_per_sec': self.rate(),
+        })
+        if len(flagged):
+            top = flagged.nlargest(MAX_EVENT_ANOMALIES, 'anomaly_score')
+            events.append({
+                'type': 'anomaly',
+                'stream': stream,
+                'upload': session.upload.id,
+                'readings': [
+                    {
+                        'equipment_name': row['Equipment Name'],
+                        'equipment_type': row['Type'],
+                        'flowrate': _number(row['Flowrate']),
+                        'pressure': _number(row['Pressure']),
+                        'temperature': _number(row['Temperature']),
+                        'anomaly_score': round(float(row['anomaly_score']), 4),
+                    }
+                    for _, row in top.iterrows()
+                ],
+            })
+        return events
+
+    def _flush_summaries(self):
+        close_old_connections()
+        for session in self.sessions.values():
+            session.save_summary(force=True)
+
+
+def _mean(series):
+    import pandas as pd
+
+    value = series.mean()
+    return None if pd.isna(value) else round(float(value), 4)
+
+
+def _number(value):
+    import pandas as pd
+
+    return None if value is None or pd.isna(value) else float(value)
+
+
+_hub = None
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        _hub = LiveHub()
+    return _hub
+
+
+# ASGI plumbing. Everything that is not a live endpoint goes to Django.
+
+def live_application(django_app):
+
+    async def application(scope, receive, send):
+        path = scope.get('path', '')
+        if scope['type'] == 'lifespan':
+            return await lifespan(receive, send)
+        if scope['type'] == 'websocket':
+            if path.rstrip('/') == '/ws/live/ingest':
+                return await websocket_ingest(scope, receive, send)
+            if path.rstrip('/') == '/ws/live/events':
+                return await websocket_events(scope, receive, send)
+            return await send({'type': 'websocket.close', 'code': 4404})
+        if scope['type'] == 'http':
+            if path.rstrip('/') == '/api/live/ingest' and scope['method'] == 'POST':
+                return await http_ingest(scope, receive, send)
+            if path.rstrip('/') == '/api/live/events' and scope['method'] == 'GET':
+                return await sse_events(scope, receive, send)
+        return await django_app(scope, receive, send)
+
+    return application
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _hub is not None:
+                await _hub.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def stream_name(scope):
+    query = parse_qs(scope.get('query_string', b'').decode())
+    return (query.get('stream') or [DEFAULT_STREAM])[0][:100]
+
+
+def cors_headers(scope):
+    if getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False):
+        return [(b'access-control-allow-origin', b'*')]
+    origin = dict(scope.get('headers', [])).get(b'origin', b'').decode()
+    if origin and origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', []):
+        return [(b'access-control-allow-origin', origin.encode()), (b'vary', b'Origin')]
+    return []
+
+
+async def http_ingest(scope, receive, send):
+    from .schema import RowErrors
+
+    hub, stream = get_hub(), stream_name(scope)
+    errors = RowErrors()
+    accepted = seen = 0
+    max_line = option('LIVE_MAX_LINE_BYTES', 64 * 1024)
+    pending = b''
+    more = True
+    while more:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        more = message.get('more_body', False)
+        pending += message.get('body', b'')
+        # Only complete lines are parsed; the rest waits for the next chunk
+        lines, _, pending = pending.rpartition(b'\n') if more else (pending, b'', b'')
+        if lines:
+            readings, count = parse_readings(lines.decode('utf-8', errors='replace'), errors, first=seen + 1)
+            await hub.put(stream, readings)
+            accepted += len(readings)
+            seen += count
+        if len(pending) > max_line:
+            # A sender that never ends its line would grow the buffer forever
+            hub.totals['rejected'] += errors.rejected_rows
+            return await json_response(scope, send, 413, {
+                'error': f"Reading {seen + 1} is longer than {max_line} bytes; send one reading per line",
+                'stream': stream, 'accepted': accepted, 'rejected': errors.rejected_rows,
+                'errors': errors.report()})
+    hub.totals['rejected'] += errors.rejected_rows
+    await json_response(scope, send, 202, {'stream': stream, 'accepted': accepted,
+                                           'rejected': errors.rejected_rows, 'errors': errors.report()})
+
+
+async def json_response(scope, send, status, payload):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json')] + cors_headers(scope)})
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+
+async def sse_events(scope, receive, send):
+    hub = get_hub()
+    queue = hub.subscribe()
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ] + cors_headers(scope)})
+    disconnected = asyncio.ensure_future(_wait_for(receive, 'http.disconnect'))
+    try:
+        await send({'type': 'http.response.body', 'body': _sse(json.dumps(hub.snapshot())), 'more_body': True})
+        while not disconnected.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=HEARTBEAT_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await send({'type': 'http.response.body', 'body': _sse(getter.result()), 'more_body': True})
+            else:
+                getter.cancel()
+                if not disconnected.done():
+                    await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+    finally:
+        hub.unsubscribe(queue)
+        disconnected.cancel()
+
+
+async def websocket_ingest(scope, receive, send):
+    from .schema import RowErrors
+
+    hub, stream = get_hub(), stream_name(scope)
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    await send({'type': 'websocket.accept'})
+    while True:
+        message = await receive()
+        if message['type'] == 'websocket.disconnect':
+            return
+        text = message.get('text')
+        if text is None and message.get('bytes') is not None:
+            text = message['bytes'].decode('utf-8', errors='replace')
+        errors = RowErrors()
+        readings, _ = parse_readings(text or '', errors)
+        await hub.put(stream, readings)
+        if errors.rejected_rows:
+            hub.totals['rejected'] += errors.rejected_rows
+            await send({'type': 'websocket.send', 'text': json.dumps(
+                {'type': 'error', 'rejected': errors.rejected_rows, 'errors': errors.report()})})
+
+
+async def websocket_events(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    hub = get_hub()
+    queue = hub.subscribe()
+    await send({'type': 'websocket.accept'})
+    disconnected = asyncio.ensure_future(_wait_for(receive, 'websocket.disconnect'))
+    try:
+        await send({'type': 'websocket.send', 'text': json.dumps(hub.snapshot())})
+        while not disconnected.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await send({'type': 'websocket.send', 'text': getter.result()})
+            else:
+                getter.cancel()
+    finally:
+        hub.unsubscribe(queue)
+        disconnected.cancel()
+
+
+async def _wait_for(receive, message_type):
+    while True:
+        message = await receive()
+        if message['type'] == message_type:
+            return message
+
+
+def _sse(data):
+    return f'data: {data}\n\n'.encode()
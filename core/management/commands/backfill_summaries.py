@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.caching import invalidate as invalidate_cache
+from core.models import FileUpload
+from core.summaries import build_summary
+
+
+class Command(BaseCommand):
+    help = "Compute UploadSummary rows for uploads that do not have one yet (or all with --all)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Recompute existing summaries as well")
+
+    def handle(self, *args, **options):
+        uploads = FileUpload.objects.order_by('id')
+        if not options['all']:
+            uploads = uploads.filter(summary__isnull=True)
+
+        done = 0
+        for upload in uploads.iterator():
+            summary = build_summary(upload)
+            done += 1
+            self.stdout.write(f"  {upload.id}: {upload.file_name} ({summary.total_count} rows)")
+        if done:
+            invalidate_cache()
+        self.stdout.write(self.style.SUCCESS(f"Summarized {done} upload(s)"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.caching import invalidate as invalidate_cache
+from core.retention import policy, purge_expired
+
+
+class Command(BaseCommand):
+    help = "Archive (if RETENTION_ARCHIVE_DIR is set) and delete uploads outside the retention limits."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only list the uploads that would be purged")
+
+    def handle(self, *args, **options):
+        limits = ', '.join(f"{name}={value}" for name, value in policy().items())
+        self.stdout.write(f"Retention: {limits}")
+        purged = purge_expired(dry_run=options['dry_run'])
+        for entry in purged:
+            details = f", {entry['rows']} rows" if 'rows' in entry else ''
+            archive = f" -> {entry['archive']}" if 'archive' in entry else ''
+            self.stdout.write(f"  {entry['id']}: {entry['file_name']} ({entry['uploaded_at']}{details}){archive}")
+        if purged and not options['dry_run']:
+            invalidate_cache()
+        verb = "Would purge" if options['dry_run'] else "Purged"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(purged)} upload(s)"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.detectors import DETECTORS
+from core.ingest import detection_defaults
+from core.registry import RegistryError, train_baseline, validate_name
+
+
+class Command(BaseCommand):
+    help = "Train a baseline anomaly model from historical uploads and save it to the model registry."
+
+    def add_arguments(self, parser):
+        detector, contamination = detection_defaults()
+        parser.add_argument('name', help="Baseline name; each run creates the next version")
+        parser.add_argument('--uploads', nargs='+', type=int, required=True, help="FileUpload ids to train on")
+        parser.add_argument('--detector', default=detector, choices=sorted(DETECTORS))
+        parser.add_argument('--contamination', type=float, default=contamination)
+
+    def handle(self, *args, **options):
+        try:
+            validate_name(options['name'])
+            baseline = train_baseline(
+                options['name'], options['uploads'], options['detector'], options['contamination']
+            )
+        except (ValueError, RegistryError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained {baseline.label} ({baseline.detector}) on {baseline.rows} rows -> {baseline.path}"
+        ))
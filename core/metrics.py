@@ -0,0 +1,228 @@
+# core/metrics.py
+"""
+Stage timings, per-request instrumentation and /api/metrics/.
+
+    with stage('fit'):
+        model = GroupedModel(...).fit(df)
+
+    @stage('chart')
+    def build_chart(...): ...
+
+Every finished stage is added to the `cv_stage_seconds` histogram and, during
+a request, to that request's timings. TimingMiddleware turns those into a
+Server-Timing header (plus `db` and `total`) and one logfmt line on the
+`core.requests` logger with the status, the time and the SQL query count.
+/api/metrics/ publishes the histograms and the response cache counters in
+the Prometheus text format.
+
+Histograms live in the process that records them; with several gunicorn
+workers each worker reports its own. Ingest jobs send their stage timings
+back with the job result, so they are counted in the web process.
+
+METRICS_ENABLED = False turns it all into a settings lookup per stage and
+per request.
+"""
+import logging
+import threading
+import time
+from contextlib import ContextDecorator, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger('core.requests')
+
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+ROWS_BUCKETS = [100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+QUERY_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 1_000, 5_000]
+
+# Stage timings of the request (or job) being handled, if any
+_timings = ContextVar('cv_stage_timings', default=None)
+
+
+def enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {} # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        for label_values, series in items:
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            prefix = labels + ',' if labels else ''
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {series[-1]}')
+            suffix = '{' + labels + '}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{suffix} {series[-1]}')
+        return lines
+
+
+STAGE_SECONDS = Histogram('cv_stage_seconds', "Time spent in a named processing stage.", SECONDS_BUCKETS,
+                          ('stage',))
+REQUEST_SECONDS = Histogram('cv_request_seconds', "Time to produce a response, by route.", SECONDS_BUCKETS,
+                            ('route', 'method'))
+REQUEST_QUERIES = Histogram('cv_request_db_queries', "SQL queries run per request, by route.", QUERY_BUCKETS,
+                            ('route',))
+ROWS_INGESTED = Histogram('cv_rows_ingested', "Rows stored per ingested upload.", ROWS_BUCKETS)
+HISTOGRAMS = [STAGE_SECONDS, REQUEST_SECONDS, REQUEST_QUERIES, ROWS_INGESTED]
+
+
+class stage(ContextDecorator):
+    """
+    Times a block or a function as the stage `name`.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = None
+
+    def _recreate_cm(self):
+        # A fresh instance per call, so a decorated function is reentrant
+        return stage(self.name)
+
+    def __enter__(self):
+        if enabled():
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is not None:
+            record_stage(self.name, time.perf_counter() - self.started)
+        return False
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def record_rows(rows):
+    if enabled():
+        ROWS_INGESTED.observe(rows)
+
+
+@contextmanager
+def collect():
+    """
+    Collects the stages finished inside the block as (name, seconds) pairs.
+    """
+    timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def record_job(timings, rows):
+    """
+    Counts the stages and rows reported back by an ingest worker process.
+    """
+    if not enabled():
+        return
+    for name, seconds in timings:
+        STAGE_SECONDS.observe(seconds, name)
+    if rows:
+        ROWS_INGESTED.observe(rows)
+
+
+def totals(timings):
+    """
+    Stage -> total milliseconds; a stage run per chunk is summed up.
+    """
+    result = {}
+    for name, seconds in timings:
+        result[name] = result.get(name, 0.0) + seconds * 1000
+    return result
+
+
+class TimingMiddleware:
+    """
+    Server-Timing header and a structured log line for every request.
+    Queries run while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+
+        db = {'queries': 0, 'seconds': 0.0}
+
+        def count(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                db['queries'] += 1
+                db['seconds'] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with collect() as timings, connection.execute_wrapper(count):
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = (match.url_name or match.view_name) if match else 'unmatched'
+        REQUEST_SECONDS.observe(total, route, request.method)
+        REQUEST_QUERIES.observe(db['queries'], route)
+
+        stages = totals(timings)
+        entries = [f'{name};dur={ms:.1f}' for name, ms in stages.items()]
+        entries.append(f'db;dur={db["seconds"] * 1000:.1f};desc="{db["queries"]} queries"')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(entries)
+
+        logger.info(
+            'method=%s path=%s route=%s status=%s ms=%.1f queries=%d db_ms=%.1f%s',
+            request.method, request.path, route, response.status_code, total * 1000, db['queries'],
+            db['seconds'] * 1000, ''.join(f' {name}_ms={ms:.1f}' for name, ms in stages.items()),
+        )
+        return response
+
+
+def render():
+    from .caching import stats as cache_stats
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    cache = cache_stats()
+    lines += ['# HELP cv_cache_requests_total Lookups of the summary/history response cache.',
+              '# TYPE cv_cache_requests_total counter']
+    for result, key in (('hit', 'hits'), ('miss', 'misses'), ('not_modified', 'not_modified')):
+        lines.append(f'cv_cache_requests_total{{result="{result}"}} {cache[key]}')
+    lines += ['# HELP cv_cache_invalidations_total Times the response cache was invalidated.',
+              '# TYPE cv_cache_invalidations_total counter',
+              f'cv_cache_invalidations_total {cache["invalidations"]}']
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdata',
+            name='anomaly_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='contamination',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fileupload',
+            name='detector',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_anomaly_detectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=120),
+        ),
+        migrations.CreateModel(
+            name='BaselineModel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('version', models.PositiveIntegerField()),
+                ('detector', models.CharField(max_length=50)),
+                ('contamination', models.FloatField()),
+                ('path', models.CharField(max_length=500)),
+                ('trained_on', models.JSONField(default=list)),
+                ('rows', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('name', 'version')},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_baseline_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSummary',
+            fields=[
+                ('upload', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='core.fileupload')),
+                ('total_count', models.IntegerField(default=0)),
+                ('anomaly_count', models.IntegerField(default=0)),
+                ('avg_flow', models.FloatField(null=True)),
+                ('avg_pressure', models.FloatField(null=True)),
+                ('avg_temp', models.FloatField(null=True)),
+                ('metrics', models.JSONField(default=dict)),
+                ('distribution', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
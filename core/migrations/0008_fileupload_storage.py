@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_equipmentdata_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileupload',
+            name='storage',
+            field=models.CharField(default='orm', max_length=20),
+        ),
+    ]
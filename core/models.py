@@ -3,6 +3,13 @@ from django.db import models
 class FileUpload(models.Model):
     file_name = models.CharField(max_length=255)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    detector = models.CharField(max_length=50, blank=True, default='') # e.g., isolation_forest, mad
+    contamination = models.FloatField(null=True, blank=True)
+    model_version = models.CharField(max_length=120, blank=True, default='') # baseline that scored it, e.g. plant-a@v3
+    storage = models.CharField(max_length=20, default='orm') # backend holding the rows, see core/storage.py
+    # sha256 of the uploaded bytes and of the parsed, normalized rows; used to spot re-uploads
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    frame_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
 
     def __str__(self):
         return f"{self.file_name} ({self.uploaded_at})"
@@ -15,6 +22,79 @@ class EquipmentData(models.Model):
     pressure = models.FloatField()
     temperature = models.IntegerField()
     is_anomaly = models.BooleanField(default=False)
+    anomaly_score = models.FloatField(null=True, blank=True) # > 0 means anomalous at the fitted threshold
+
+    class Meta:
+        # Keep filtered, keyset-paginated reads of one upload on an index
+        indexes = [
+            models.Index(fields=['upload', 'equipment_type'], name='equipment_upload_type_idx'),
+            models.Index(fields=['upload', 'is_anomaly'], name='equipment_upload_anomaly_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.equipment_name} - {self.equipment_type}"
\ No newline at end of file
+        return f"{self.equipment_name} - {self.equipment_type}"
+
+class IngestJob(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    file_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    stage = models.CharField(max_length=50, default=STATUS_QUEUED) # e.g., parsing, writing
+    progress = models.FloatField(default=0.0) # 0.0 - 1.0
+    rows_processed = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    upload = models.ForeignKey(FileUpload, null=True, blank=True, on_delete=models.SET_NULL, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job {self.id}: {self.file_name} [{self.status}]"
+
+class BaselineModel(models.Model):
+    name = models.CharField(max_length=100)
+    version = models.PositiveIntegerField()
+    detector = models.CharField(max_length=50)
+    contamination = models.FloatField()
+    path = models.CharField(max_length=500)
+    trained_on = models.JSONField(default=list) # ids of the uploads used for training
+    rows = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [('name', 'version')]
+
+    @property
+    def label(self):
+        return f"{self.name}@v{self.version}"
+
+    def __str__(self):
+        return self.label
+
+class UploadSummary(models.Model):
+    """
+    Aggregates for one upload, computed once at ingest time. Upload data never
+    changes afterwards, so the dashboard, history and PDF read this instead of
+    re-aggregating EquipmentData.
+    """
+    upload = models.OneToOneField(FileUpload, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_count = models.IntegerField(default=0)
+    anomaly_count = models.IntegerField(default=0)
+    avg_flow = models.FloatField(null=True)
+    avg_pressure = models.FloatField(null=True)
+    avg_temp = models.FloatField(null=True)
+    metrics = models.JSONField(default=dict) # per variable: min, max, p5, p25, p50, p75, p95
+    distribution = models.JSONField(default=list) # per type: count, anomalies, anomaly_rate, mean/std per variable
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Summary of {self.upload_id} ({self.total_count} rows)"
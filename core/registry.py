@@ -0,0 +1,153 @@
+# core/registry.py
+"""
+Baseline model registry.
+
+A baseline is a GroupedModel trained once from a chosen set of historical
+uploads and saved to MODEL_REGISTRY_DIR/<name>/v<version>.joblib. Uploads
+that name a baseline are only scored against it, which is much cheaper than
+fitting and also catches a file that is faulty from start to finish.
+
+Loaded models are kept in a small per-process LRU cache so repeat uploads
+do not hit the disk.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import joblib
+import pandas as pd
+from django.conf import settings
+from django.db.models import Max
+
+from .concurrency import exclusive, retry_on_lock
+from .detectors import GroupedModel
+from .models import BaselineModel, FileUpload
+from .storage import storage_for
+
+# EquipmentData field -> CSV column the detectors expect
+TRAINING_FIELDS = {
+    'equipment_type': 'Type',
+    'pressure': 'Pressure',
+    'flowrate': 'Flowrate',
+    'temperature': 'Temperature',
+}
+
+# Names become directory names under MODEL_REGISTRY_DIR
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,100}$')
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class RegistryError(Exception):
+    pass
+
+
+def registry_dir():
+    return getattr(settings, 'MODEL_REGISTRY_DIR', settings.BASE_DIR / 'media' / 'models')
+
+
+def validate_name(name):
+    if not isinstance(name, str) or not NAME_PATTERN.match(name):
+        raise RegistryError("Baseline names are 1-100 letters, digits, '-' or '_'")
+    return name
+
+
+def model_folder(name):
+    """
+    MODEL_REGISTRY_DIR/<name>, refusing anything that resolves outside it.
+    """
+    root = os.path.realpath(registry_dir())
+    folder = os.path.realpath(os.path.join(root, validate_name(name)))
+    if os.path.dirname(folder) != root:
+        raise RegistryError(f"Baseline '{name}' resolves outside the model registry")
+    return folder
+
+
+def training_frame(upload_ids):
+    frames = [
+        storage_for(upload).frame(upload, list(TRAINING_FIELDS)).rename(columns=TRAINING_FIELDS)
+        for upload in FileUpload.objects.filter(id__in=upload_ids)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=list(TRAINING_FIELDS.values()))
+    return pd.concat(frames, ignore_index=True)
+
+
+def train_baseline(name, upload_ids, detector, contamination):
+    folder = model_folder(name)
+    df = training_frame(upload_ids)
+    if df.empty:
+        raise RegistryError(f"No rows found for uploads {list(upload_ids)}")
+
+    model = GroupedModel(detector, contamination).fit(df)
+
+    # Two trainings of one name in different workers would otherwise pick
+    # the same version and overwrite each other's file
+    with exclusive('baselines'):
+        version = (BaselineModel.objects.filter(name=name).aggregate(v=Max('version'))['v'] or 0) + 1
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"v{version}.joblib")
+        joblib.dump(model, path)
+        try:
+            return retry_on_lock(BaselineModel.objects.create)(
+                name=name,
+                version=version,
+                detector=detector,
+                contamination=contamination,
+                path=path,
+                trained_on=sorted(upload_ids),
+                rows=len(df),
+            )
+        except Exception:
+            os.remove(path)
+            raise
+
+
+def resolve(reference):
+    """
+    Look up a baseline by "name" (latest version) or "name@v3".
+    """
+    if not isinstance(reference, str):
+        raise RegistryError("A baseline is named as 'name' or 'name@v3'")
+    name, _, version = reference.partition('@')
+    baselines = BaselineModel.objects.filter(name=name)
+    if version:
+        if not version.lstrip('v').isdigit():
+            raise RegistryError(f"Bad baseline version in '{reference}'")
+        baselines = baselines.filter(version=int(version.lstrip('v')))
+    baseline = baselines.order_by('-version').first()
+    if baseline is None:
+        raise RegistryError(f"Unknown baseline model '{reference}'")
+    return baseline
+
+
+def load(baseline):
+    """
+    Return the fitted GroupedModel for a BaselineModel row, from the LRU cache
+    when possible.
+    """
+    key = baseline.path
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    try:
+        model = joblib.load(baseline.path)
+    except (OSError, EOFError) as e:
+        raise RegistryError(f"Could not load baseline model {baseline.label}: {e}")
+
+    with _cache_lock:
+        _cache[key] = model
+        _cache.move_to_end(key)
+        while len(_cache) > getattr(settings, 'MODEL_CACHE_SIZE', 4):
+            _cache.popitem(last=False)
+    return model
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
@@ -0,0 +1,410 @@
+# core/reports.py
+"""
+Full PDF reports for /api/uploads/<id>/report.pdf.
+
+A report has a summary page (headline numbers, a distribution chart and
+per-type statistics), the highest-scoring anomalies, and then every row of
+the upload, with the flagged rows highlighted. Reports are rendered in the
+background process pool (see core/jobs.py). They are cached on disk as
+REPORT_CACHE_DIR/upload-<id>/<version>.pdf. The version is built from the
+detector, the baseline model version and the time the summary was computed,
+so re-thresholding an upload produces a new file instead of serving a stale
+one.
+
+Rows are read from storage one chunk at a time and drawn straight onto the
+page, so the report never holds the upload's rows as a frame. The PDF
+itself is another matter: reportlab keeps every page until the file is
+saved, about 50 rows a page. So the row listing is capped at
+REPORT_MAX_ROWS. A longer upload lists only its flagged rows, up to the
+same cap, and the report points to /api/uploads/<id>/data/ for the rest.
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PAGE_MARGIN = 50
+ROW_HEIGHT = 14
+TOP_ANOMALIES = 40
+
+# (field, header, x position, format)
+ROW_COLUMNS = [
+    ('equipment_name', 'Equipment Name', 50, '{}'),
+    ('equipment_type', 'Type', 210, '{}'),
+    ('flowrate', 'Flowrate', 310, '{:.1f}'),
+    ('pressure', 'Pressure', 370, '{:.2f}'),
+    ('temperature', 'Temperature', 430, '{:.1f}'),
+    ('anomaly_score', 'Score', 510, '{:.3f}'),
+]
+ROW_FIELDS = [field for field, _, _, _ in ROW_COLUMNS] + ['is_anomaly']
+ROW_HEADERS = [(header, x) for _, header, x, _ in ROW_COLUMNS]
+
+_pending = {}
+_failed = {} # path -> error of the last render, until the next attempt
+_pending_lock = threading.Lock()
+
+
+def report_dir(upload_id):
+    root = getattr(settings, 'REPORT_CACHE_DIR', settings.BASE_DIR / 'media' / 'reports')
+    return os.path.join(root, f'upload-{upload_id}')
+
+
+def report_version(upload):
+    from .summaries import get_summary
+
+    computed = int(get_summary(upload).computed_at.timestamp() * 1000)
+    return f"{upload.detector}-{upload.model_version or 'self'}-{computed}"
+
+
+def report_path(upload):
+    return os.path.join(report_dir(upload.id), f'{report_version(upload)}.pdf')
+
+
+def cached_report(upload):
+    """
+    Path of the rendered report, or None if it has not been rendered yet.
+    """
+    path = report_path(upload)
+    return path if os.path.exists(path) else None
+
+
+def submit_report(upload):
+    """
+    Queue a render of the upload's report, unless one is already running in
+    this process. Returns the future.
+    """
+    from .jobs import get_executor
+
+    path = report_path(upload)
+    with _pending_lock:
+        future = _pending.get(path)
+        if future is not None:
+            return future
+        _failed.pop(path, None)
+        try:
+            future = get_executor().submit(render_report, upload.id, path)
+        except BrokenProcessPool:
+            future = get_executor(reset=True).submit(render_report, upload.id, path)
+        _pending[path] = future
+    future.add_done_callback(lambda f: _on_report_finished(path, f))
+    return future
+
+
+def take_failure(upload):
+    """
+    The error of the last failed render of the upload's report, if any. It
+    is only reported once; the next request renders again.
+    """
+    with _pending_lock:
+        return _failed.pop(report_path(upload), None)
+
+
+def discard_reports(upload_id):
+    import shutil
+    shutil.rmtree(report_dir(upload_id), ignore_errors=True)
+
+
+def _on_report_finished(path, future):
+    error = future.exception()
+    with _pending_lock:
+        _pending.pop(path, None)
+        if error is not None:
+            _failed[path] = str(error) or repr(error)
+    if error is not None:
+        logger.error("Rendering %s failed: %s", path, error)
+
+
+def render_report(upload_id, path):
+    """
+    Runs inside a worker process. Writes to a temporary file and moves it into
+    place, so a half-written report is never served.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    from .models import FileUpload
+    from .storage import storage_for
+    from .summaries import get_summary
+
+    close_old_connections()
+    upload = FileUpload.objects.get(pk=upload_id)
+    summary = get_summary(upload)
+    backend = storage_for(upload)
+    per_type, top = _scan(backend, upload)
+
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f'.{uuid.uuid4().hex}.tmp')
+    try:
+        pdf = canvas.Canvas(tmp, pagesize=letter, pageCompression=1)
+        pdf.setTitle(f"Chemical Equipment Report - {upload.file_name}")
+        page = _Pages(pdf, upload)
+        _draw_summary(page, upload, summary, per_type)
+        _draw_top_anomalies(page, top)
+        _draw_rows(page, backend, upload, summary.total_count)
+        pdf.save()
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    # Older versions of this upload's report are stale now
+    for name in os.listdir(folder):
+        if name.endswith('.pdf') and os.path.join(folder, name) != path:
+            os.remove(os.path.join(folder, name))
+    return path
+
+
+def _scan(backend, upload):
+    """
+    One pass over the stored rows for the per-type means and the top anomalies.
+    """
+    sums, top = None, None
+    for frame in backend.iter_frames(upload, ROW_FIELDS, chunk_size=_chunk_size()):
+        grouped = frame.groupby('equipment_type')[['flowrate', 'pressure', 'temperature']].agg(['sum', 'count'])
+        sums = grouped if sums is None else sums.add(grouped, fill_value=0)
+        flagged = frame[frame['is_anomaly']]
+        if not flagged.empty:
+            candidates = flagged if top is None else pd.concat([top, flagged])
+            top = candidates.nlargest(TOP_ANOMALIES, 'anomaly_score')
+
+    per_type = {}
+    if sums is not None:
+        for eq_type, row in sums.iterrows():
+            per_type[eq_type] = {
+                column: row[(column, 'sum')] / row[(column, 'count')] if row[(column, 'count')] else None
+                for column in ('flowrate', 'pressure', 'temperature')
+            }
+    return per_type, top
+
+
+def _chunk_size():
+    return getattr(settings, 'REPORT_CHUNK_SIZE', 5_000)
+
+
+def _max_rows():
+    return getattr(settings, 'REPORT_MAX_ROWS', 20_000)
+
+
+class _Pages:
+    """
+    Page bookkeeping: the running y position, a footer on every page and
+    breaking to a new page when the next block does not fit.
+    """
+
+    def __init__(self, pdf, upload):
+        from reportlab.lib.pagesizes import letter
+
+        self.pdf = pdf
+        self.upload = upload
+        self.width, self.height = letter
+        self.number = 1
+        self.y = self.height - PAGE_MARGIN
+
+    def ensure(self, needed):
+        if self.y - needed < PAGE_MARGIN:
+            self.new_page()
+            return True
+        return False
+
+    def new_page(self):
+        self._footer()
+        self.pdf.showPage()
+        self.number += 1
+        self.y = self.height - PAGE_MARGIN
+
+    def finish(self):
+        self._footer()
+        self.pdf.showPage()
+
+    def _footer(self):
+        self.pdf.setFont("Helvetica", 8)
+        self.pdf.setFillGray(0.4)
+        self.pdf.drawString(PAGE_MARGIN, 30, f"{self.upload.file_name} (upload {self.upload.id})")
+        self.pdf.drawRightString(self.width - PAGE_MARGIN, 30, f"Page {self.number}")
+        self.pdf.setFillGray(0)
+
+
+def _draw_summary(page, upload, summary, per_type):
+    from reportlab.lib import colors
+
+    pdf = page.pdf
+    pdf.setFont("Helvetica-Bold", 20)
+    pdf.drawString(PAGE_MARGIN, page.y, "Chemical Equipment Report")
+    page.y -= 28
+
+    pdf.setFont("Helvetica", 11)
+    model = f"{upload.detector}" + (f", baseline {upload.model_version}" if upload.model_version else "")
+    for line in [
+        f"Generated: {timezone.localtime().strftime('%Y-%m-%d %H:%M')}",
+        f"Source File: {upload.file_name} (uploaded {timezone.localtime(upload.uploaded_at).strftime('%Y-%m-%d %H:%M')})",
+        f"Detector: {model}",
+    ]:
+        pdf.drawString(PAGE_MARGIN, page.y, line)
+        page.y -= 16
+
+    page.y -= 10
+    pdf.setStrokeColor(colors.blue)
+    pdf.rect(PAGE_MARGIN, page.y - 50, page.width - 2 * PAGE_MARGIN, 56, fill=0)
+    pdf.setStrokeColor(colors.black)
+    rate = summary.anomaly_count / summary.total_count if summary.total_count else 0
+    headline = [
+        (f"Total Units: {summary.total_count}", f"Anomalies: {summary.anomaly_count} ({rate:.1%})"),
+        (f"Avg Flowrate: {_fmt(summary.avg_flow, '{:.1f}')} m3/h", f"Avg Pressure: {_fmt(summary.avg_pressure, '{:.2f}')} bar"),
+        (f"Avg Temperature: {_fmt(summary.avg_temp, '{:.1f}')} C", ""),
+    ]
+    y = page.y - 10
+    for left, right in headline:
+        pdf.drawString(PAGE_MARGIN + 15, y, left)
+        pdf.drawString(PAGE_MARGIN + 260, y, right)
+        y -= 15
+    page.y -= 80
+
+    if summary.distribution:
+        _draw_distribution_chart(page, summary.distribution)
+    _draw_type_table(page, summary.distribution, per_type)
+
+
+def _draw_distribution_chart(page, distribution):
+    from reportlab.graphics import renderPDF
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.shapes import Drawing, String
+    from reportlab.lib import colors
+
+    height = 220
+    page.ensure(height)
+    drawing = Drawing(page.width - 2 * PAGE_MARGIN, height)
+    chart = VerticalBarChart()
+    chart.x, chart.y = 40, 30
+    chart.width, chart.height = drawing.width - 60, height - 60
+    chart.data = [
+        [row['count'] - row['anomalies'] for row in distribution],
+        [row['anomalies'] for row in distribution],
+    ]
+    chart.categoryAxis.categoryNames = [row['equipment_type'] for row in distribution]
+    chart.categoryAxis.labels.fontSize = 8
+    chart.categoryAxis.style = 'stacked'
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 8
+    chart.bars[0].fillColor = colors.HexColor('#4a90d9')
+    chart.bars[1].fillColor = colors.HexColor('#d9534f')
+    drawing.add(chart)
+    drawing.add(String(40, height - 15, "Equipment distribution (red: anomalies)", fontName="Helvetica-Bold", fontSize=11))
+    renderPDF.draw(drawing, page.pdf, PAGE_MARGIN, page.y - height)
+    page.y -= height + 10
+
+
+def _draw_type_table(page, distribution, per_type):
+    pdf = page.pdf
+    columns = [('Type', 50), ('Count', 160), ('Anomalies', 220), ('Rate', 290),
+               ('Avg Flow', 350), ('Avg Pressure', 420), ('Avg Temp', 500)]
+    page.ensure(40)
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(PAGE_MARGIN, page.y, "Per-type statistics")
+    page.y -= 20
+    _header(page, columns)
+    pdf.setFont("Helvetica", 9)
+    for row in distribution:
+        means = per_type.get(row['equipment_type'], {})
+        values = [
+            row['equipment_type'], str(row['count']), str(row['anomalies']), f"{row['anomaly_rate']:.1%}",
+            _fmt(means.get('flowrate'), '{:.1f}'), _fmt(means.get('pressure'), '{:.2f}'),
+            _fmt(means.get('temperature'), '{:.1f}'),
+        ]
+        if page.ensure(ROW_HEIGHT):
+            _header(page, columns)
+            pdf.setFont("Helvetica", 9)
+        for (_, x), value in zip(columns, values):
+            pdf.drawString(x, page.y, value)
+        page.y -= ROW_HEIGHT
+
+
+def _draw_top_anomalies(page, top):
+    pdf = page.pdf
+    page.new_page()
+    pdf.setFont("Helvetica-Bold", 14)
+    pdf.drawString(PAGE_MARGIN, page.y, f"Highest-scoring anomalies (top {TOP_ANOMALIES})")
+    page.y -= 22
+    if top is None:
+        pdf.setFont("Helvetica", 10)
+        pdf.drawString(PAGE_MARGIN, page.y, "No rows were flagged in this upload.")
+        page.y -= ROW_HEIGHT
+        return
+    _header(page, ROW_HEADERS)
+    _draw_row_block(page, top)
+
+
+def _draw_rows(page, backend, upload, total):
+    from .filters import DataQuery
+
+    limit = _max_rows()
+    query = None
+    title = "All equipment (anomalies highlighted)"
+    if total > limit:
+        query = DataQuery(is_anomaly=True)
+        title = f"Flagged equipment ({total} rows are too many to list)"
+    page.new_page()
+    page.pdf.setFont("Helvetica-Bold", 14)
+    page.pdf.drawString(PAGE_MARGIN, page.y, title)
+    page.y -= 22
+    _header(page, ROW_HEADERS)
+    drawn = 0
+    for frame in backend.iter_frames(upload, ROW_FIELDS, query, chunk_size=_chunk_size()):
+        frame = frame.iloc[:limit - drawn]
+        _draw_row_block(page, frame)
+        drawn += len(frame)
+        if drawn >= limit:
+            break
+    if query is not None:
+        page.ensure(ROW_HEIGHT * 2)
+        page.y -= ROW_HEIGHT
+        page.pdf.setFont("Helvetica-Oblique", 9)
+        page.pdf.drawString(PAGE_MARGIN, page.y, f"{drawn} of {total} rows listed. Every row is available "
+                                                 f"from /api/uploads/{upload.id}/data/?all=true")
+    page.finish()
+
+
+def _draw_row_block(page, frame):
+    from reportlab.lib import colors
+
+    pdf = page.pdf
+    pdf.setFont("Helvetica", 8)
+    for row in frame[ROW_FIELDS].itertuples(index=False):
+        if page.ensure(ROW_HEIGHT):
+            _header(page, ROW_HEADERS)
+            pdf.setFont("Helvetica", 8)
+        record = row._asdict()
+        if record['is_anomaly']:
+            pdf.setFillColor(colors.HexColor('#fbe3e2'))
+            pdf.rect(PAGE_MARGIN - 3, page.y - 3, page.width - 2 * PAGE_MARGIN + 6, ROW_HEIGHT - 2, stroke=0, fill=1)
+            pdf.setFillColor(colors.HexColor('#b52b27'))
+        for field, _, x, fmt in ROW_COLUMNS:
+            pdf.drawString(x, page.y, _fmt(record[field], fmt)[:30])
+        pdf.setFillColor(colors.black)
+        page.y -= ROW_HEIGHT
+
+
+def _header(page, columns):
+    pdf = page.pdf
+    pdf.setFont("Helvetica-Bold", 9)
+    for header, x in columns:
+        pdf.drawString(x, page.y, header)
+    pdf.line(PAGE_MARGIN, page.y - 4, page.width - PAGE_MARGIN, page.y - 4)
+    page.y -= ROW_HEIGHT + 2
+
+
+def _fmt(value, fmt):
+    if value is None or (isinstance(value, float) and value != value):
+        return "-"
+    try:
+        return fmt.format(value)
+    except (TypeError, ValueError):
+        return str(value)
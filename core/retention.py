@@ -0,0 +1,223 @@
+# core/retention.py
+"""
+Upload retention.
+
+An upload expires once it falls outside any of the configured limits,
+counted from the newest upload back:
+
+    RETENTION_MAX_UPLOADS    keep at most this many uploads
+    RETENTION_MAX_AGE_DAYS   drop uploads older than this
+    RETENTION_MAX_ROWS       keep at most this many rows in total
+
+(None switches a limit off). The newest upload is always kept, and so are
+uploads a caller names in `keep_ids` (a batch that just came in) and
+uploads still being written: streamed and combined batch uploads only get
+their summary at the end, so a recent upload without one is in progress.
+Uploads in progress are left out of the count altogether, so they neither
+push a finished upload out nor stand in for the newest one.
+
+Only one purge runs at a time across the deployment (the 'retention'
+lock of core/concurrency.py), and it picks the expired uploads once it
+holds the lock, so purges queued by several workers never evict more
+than the limits ask for.
+
+Expired uploads are purged in the background process pool after an
+upload succeeds (schedule_purge), and by `manage.py purge_uploads` for
+age limits on a quiet server, so a request never waits for an old upload
+to be deleted. Rows go in batched raw deletes (UploadStorage.purge) before
+the FileUpload row itself. With RETENTION_ARCHIVE_DIR set, each upload is
+first written there as a gzipped CSV (re-uploadable as it is) plus a JSON
+file with its metadata and summary; an upload that cannot be archived is
+kept.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .caching import invalidate as invalidate_cache
+from .concurrency import exclusive, retry_on_lock
+from .models import FileUpload, UploadSummary
+from .storage import CSV_FIELDS, delete_upload, storage_for
+
+logger = logging.getLogger(__name__)
+
+# Stored field -> CSV column, in the order of the archived CSV
+ARCHIVE_COLUMNS = {field: column for column, field in CSV_FIELDS.items()}
+
+# An upload without a summary younger than this is still being written
+IN_PROGRESS_HOURS = 6
+
+_pending = None # (future, keep_ids) of the purge queued by this process
+_pending_lock = threading.Lock()
+
+
+def policy():
+    return {
+        'max_uploads': getattr(settings, 'RETENTION_MAX_UPLOADS', 5),
+        'max_age_days': getattr(settings, 'RETENTION_MAX_AGE_DAYS', None),
+        'max_rows': getattr(settings, 'RETENTION_MAX_ROWS', None),
+    }
+
+
+def expired_uploads(keep_ids=(), now=None):
+    """
+    Ids of the uploads outside the retention limits, oldest first.
+    """
+    limits = policy()
+    now = now or timezone.now()
+    cutoff = None
+    if limits['max_age_days'] is not None:
+        cutoff = now - timedelta(days=limits['max_age_days'])
+    in_progress = in_progress_cutoff(now)
+    keep_ids = set(keep_ids)
+
+    uploads = FileUpload.objects.order_by('-uploaded_at', '-id').values_list('id', 'uploaded_at',
+                                                                             'summary__total_count')
+    expired, total_rows, position = [], 0, 0
+    for upload_id, uploaded_at, rows in uploads:
+        if rows is None and uploaded_at >= in_progress:
+            continue
+        total_rows += rows or 0
+        too_many = limits['max_uploads'] is not None and position >= limits['max_uploads']
+        too_old = cutoff is not None and uploaded_at < cutoff
+        too_big = limits['max_rows'] is not None and total_rows > limits['max_rows']
+        if position > 0 and upload_id not in keep_ids and (too_many or too_old or too_big):
+            expired.append(upload_id)
+        position += 1
+    return expired[::-1]
+
+
+def in_progress_cutoff(now=None):
+    """
+    An upload without a summary uploaded after this is still being written.
+    """
+    return (now or timezone.now()) - timedelta(hours=IN_PROGRESS_HOURS)
+
+
+def purge_expired(keep_ids=(), dry_run=False):
+    """
+    Archive (if configured) and delete every expired upload. Runs in a pool
+    worker or the purge_uploads command. Returns one entry per upload.
+    """
+    close_old_connections()
+    purged = []
+    with exclusive('retention'):
+        for upload_id in expired_uploads(keep_ids):
+            upload = FileUpload.objects.filter(pk=upload_id).first()
+            if upload is None:
+                continue # deleted by hand meanwhile
+            entry = {'id': upload.id, 'file_name': upload.file_name, 'uploaded_at': upload.uploaded_at.isoformat()}
+            if not dry_run:
+                if archive_dir():
+                    try:
+                        entry['archive'] = archive_upload(upload)
+                    except OSError as e:
+                        logger.error("Archiving upload %s failed, keeping it: %s", upload.id, e)
+                        continue
+                entry['rows'] = _purge(upload)
+            purged.append(entry)
+    if purged and not dry_run:
+        logger.info("Purged %s expired upload(s)", len(purged))
+    return purged
+
+
+@retry_on_lock
+def _purge(upload):
+    # Every statement commits on its own, so a retry picks up where the
+    # locked one stopped
+    rows = storage_for(upload).purge(upload, getattr(settings, 'RETENTION_DELETE_BATCH', 5_000))
+    delete_upload(upload)
+    return rows
+
+
+def schedule_purge(keep_ids=()):
+    """
+    Queue a purge in the background pool. A purge that is queued but not
+    running yet already sees the new upload, so it is reused.
+    """
+    global _pending
+    from .jobs import submit_task
+
+    keep_ids = tuple(sorted(keep_ids))
+    with _pending_lock:
+        if _pending is not None:
+            future, queued_keep = _pending
+            if queued_keep == keep_ids and not future.running() and not future.done():
+                return future
+        future = submit_task(purge_expired, keep_ids)
+        _pending = (future, keep_ids)
+    future.add_done_callback(_on_purge_finished)
+    return future
+
+
+def _on_purge_finished(future):
+    global _pending
+    with _pending_lock:
+        if _pending is not None and _pending[0] is future:
+            _pending = None
+    error = future.exception()
+    if error is not None:
+        logger.error("Purging expired uploads failed: %s", error)
+    elif future.result():
+        # The worker's cache is not this process's one
+        invalidate_cache()
+
+
+def archive_dir():
+    path = getattr(settings, 'RETENTION_ARCHIVE_DIR', None)
+    if path:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def archive_upload(upload):
+    """
+    Write the upload's rows to ARCHIVE_DIR/upload-<id>.csv.gz and its
+    metadata and summary to upload-<id>.json. Returns the CSV path.
+    """
+    folder = archive_dir()
+    path = os.path.join(folder, f'upload-{upload.id}.csv.gz')
+    tmp = os.path.join(folder, f'.{uuid.uuid4().hex}.tmp')
+    try:
+        with gzip.open(tmp, 'wt', encoding='utf-8', newline='') as out:
+            out.write(','.join(ARCHIVE_COLUMNS.values()) + '\n')
+            for frame in storage_for(upload).iter_frames(upload, list(ARCHIVE_COLUMNS)):
+                frame.to_csv(out, header=False, index=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    with open(os.path.join(folder, f'upload-{upload.id}.json'), 'w') as out:
+        json.dump(_metadata(upload), out, indent=2, default=str)
+    return path
+
+
+def _metadata(upload):
+    metadata = {
+        'id': upload.id,
+        'file_name': upload.file_name,
+        'uploaded_at': upload.uploaded_at,
+        'detector': upload.detector,
+        'contamination': upload.contamination,
+        'model_version': upload.model_version,
+        'content_hash': upload.content_hash,
+        'archived_at': timezone.now(),
+    }
+    summary = UploadSummary.objects.filter(upload=upload).first()
+    if summary is not None:
+        metadata['summary'] = {
+            'total_count': summary.total_count,
+            'anomaly_count': summary.anomaly_count,
+            'metrics': summary.metrics,
+            'distribution': summary.distribution,
+        }
+    return metadata
@@ -0,0 +1,310 @@
+# core/schema.py
+"""
+The declared shape of an equipment CSV, and the parser built on it.
+
+SCHEMA lists the columns an upload must have, the EquipmentData field each
+one fills and its type. The parser reads only those columns (headers are
+matched after stripping whitespace; other columns are never decoded), with
+pyarrow's multithreaded CSV reader when it is installed and pandas' C
+engine otherwise (INGEST_CSV_ENGINE). Every value is read as text and then
+checked column by column with vectorized operations: missing, not a
+number, not a whole number for an integer field, out of range, too long
+for the field. Rows that fail a check are dropped and reported as
+(row, column, reason, value); the rest of the file is ingested.
+
+Rows are numbered the way a spreadsheet shows them: the header is row 1.
+validate_records() runs the same checks on records that arrive already
+decoded (live readings), numbered by the caller.
+"""
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .models import EquipmentData
+
+# Bounds of a Django IntegerField
+INTEGER_RANGE = (-2_147_483_648, 2_147_483_647)
+
+
+class SchemaError(Exception):
+    """
+    The file as a whole does not match the schema (no header, missing
+    columns). Row-level problems are reported in RowErrors instead.
+    """
+
+
+class Column:
+
+    def __init__(self, name, field, kind):
+        self.name = name
+        self.field = field
+        self.kind = kind # 'text', 'integer' or 'float'
+
+    @property
+    def max_length(self):
+        return EquipmentData._meta.get_field(self.field).max_length
+
+    def limits(self):
+        """
+        (minimum, maximum), either may be None. INGEST_VALUE_RANGES narrows
+        them per column, e.g. {'Pressure': (0, 400)}.
+        """
+        low, high = INTEGER_RANGE if self.kind == 'integer' else (None, None)
+        configured = getattr(settings, 'INGEST_VALUE_RANGES', {}).get(self.name)
+        if configured:
+            low = configured[0] if configured[0] is not None else low
+            high = configured[1] if configured[1] is not None else high
+        return low, high
+
+
+SCHEMA = [
+    Column('Equipment Name', 'equipment_name', 'text'),
+    Column('Type', 'equipment_type', 'text'),
+    Column('Flowrate', 'flowrate', 'integer'),
+    Column('Pressure', 'pressure', 'float'),
+    Column('Temperature', 'temperature', 'integer'),
+]
+COLUMN_NAMES = [column.name for column in SCHEMA]
+
+
+class RowErrors:
+    """
+    The rows rejected while parsing one upload. Every bad value is counted;
+    only the first INGEST_MAX_ROW_ERRORS are kept with their details.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit if limit is not None else getattr(settings, 'INGEST_MAX_ROW_ERRORS', 1000)
+        self.rejected_rows = 0
+        self.count = 0
+        self.details = []
+
+    def add(self, rows, column, reason, values):
+        self.count += len(rows)
+        room = max(self.limit - len(self.details), 0)
+        for row, value in zip(rows[:room], values[:room]):
+            self.details.append({'row': int(row), 'column': column, 'reason': reason,
+                                 'value': '' if value is None else str(value)})
+
+    def report(self):
+        # Problems with a whole row (column '') come before its values
+        return sorted(self.details, key=lambda d: (d['row'], COLUMN_NAMES.index(d['column'])
+                                                   if d['column'] in COLUMN_NAMES else -1))
+
+    def describe(self, examples=3):
+        """
+        One line for error messages: the count and the first few problems.
+        """
+        first = '; '.join(f"row {d['row']} {d['column']}: {d['reason']}" for d in self.report()[:examples])
+        return f"{self.rejected_rows} rows rejected ({first})" if first else "no rows"
+
+
+def csv_engine():
+    engine = getattr(settings, 'INGEST_CSV_ENGINE', 'pyarrow')
+    if engine == 'pyarrow':
+        try:
+            import pyarrow.csv # noqa: F401
+        except ImportError:
+            return 'c'
+    return engine
+
+
+def read_frame(file_obj, errors, engine=None):
+    """
+    The whole file as one validated frame: the SCHEMA columns only,
+    integers as int64, floats as float64, text stripped.
+    """
+    header = read_header(file_obj)
+    if (engine or csv_engine()) == 'pyarrow':
+        import pyarrow.csv as pacsv
+        table = pacsv.read_csv(file_obj, read_options=_arrow_read_options(header),
+                               convert_options=_arrow_convert_options())
+        return validate(_arrow_columns(table), errors, offset=0)
+    frame = pd.read_csv(file_obj, **_pandas_options(header))
+    return validate(_pandas_columns(frame), errors, offset=0)
+
+
+def iter_frames(file_obj, rows, errors, engine=None):
+    """
+    Validated chunks of about `rows` rows; chunks may come out smaller (or
+    empty) when rows are rejected.
+    """
+    header = read_header(file_obj)
+    offset = 0
+    if (engine or csv_engine()) == 'pyarrow':
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        reader = pacsv.open_csv(file_obj, read_options=_arrow_read_options(header),
+                                convert_options=_arrow_convert_options())
+        batches, pending = [], 0
+        for batch in reader:
+            batches.append(batch)
+            pending += batch.num_rows
+            if pending >= rows:
+                yield validate(_arrow_columns(pa.Table.from_batches(batches)), errors, offset)
+                offset += pending
+                batches, pending = [], 0
+        if batches:
+            yield validate(_arrow_columns(pa.Table.from_batches(batches)), errors, offset)
+        return
+    for frame in pd.read_csv(file_obj, chunksize=rows, **_pandas_options(header)):
+        yield validate(_pandas_columns(frame), errors, offset)
+        offset += len(frame)
+
+
+def read_header(file_obj):
+    """
+    Header names with whitespace (and a UTF-8 BOM) stripped, made unique.
+    Leaves the file where it was.
+    """
+    start = file_obj.tell()
+    line = file_obj.readline()
+    file_obj.seek(start)
+    if isinstance(line, bytes):
+        line = line.decode('utf-8-sig', errors='replace')
+    names = next(csv.reader(io.StringIO(line.lstrip('\ufeff'))), [])
+    if not names:
+        raise SchemaError("CSV file is empty")
+    header, seen = [], set()
+    for i, name in enumerate(names):
+        name = name.strip() or f'column {i + 1}'
+        while name in seen:
+            name = f'{name} ({i + 1})'
+        seen.add(name)
+        header.append(name)
+    missing = [name for name in COLUMN_NAMES if name not in seen]
+    if missing:
+        raise SchemaError(f"Missing columns: {missing}. Found: {header}")
+    return header
+
+
+def _arrow_read_options(header):
+    import pyarrow.csv as pacsv
+    # Our own (normalized) names replace the header row
+    return pacsv.ReadOptions(column_names=header, skip_rows=1)
+
+
+def _arrow_convert_options():
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    return pacsv.ConvertOptions(include_columns=COLUMN_NAMES, column_types=dict.fromkeys(COLUMN_NAMES, pa.string()),
+                                strings_can_be_null=True, quoted_strings_can_be_null=True)
+
+
+def _pandas_options(header):
+    return {'header': 0, 'names': header, 'usecols': COLUMN_NAMES, 'dtype': str, 'keep_default_na': False,
+            'na_values': ['']}
+
+
+def _arrow_columns(table):
+    """
+    Column name -> (values, missing mask, raw text getter) from a pyarrow table.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = {}
+    for column in SCHEMA:
+        text = pc.utf8_trim_whitespace(table.column(column.name))
+        missing = pc.fill_null(pc.equal(text, ''), True).to_numpy(zero_copy_only=False)
+        if column.kind == 'text':
+            values = text.to_pandas()
+        else:
+            try:
+                values = pc.cast(text, pa.float64()).to_numpy(zero_copy_only=False)
+            except pa.ArrowInvalid:
+                # Some value is not a number; find out which ones the slow way
+                values = pd.to_numeric(text.to_pandas(), errors='coerce').to_numpy(dtype='float64')
+        columns[column.name] = (values, missing, lambda rows, text=text: text.take(rows).to_pylist())
+    return columns
+
+
+def _pandas_columns(frame):
+    columns = {}
+    for column in SCHEMA:
+        text = frame[column.name].str.strip()
+        missing = (text.isna() | (text == '')).to_numpy(dtype=bool)
+        if column.kind == 'text':
+            values = text
+        else:
+            values = pd.to_numeric(text, errors='coerce').to_numpy(dtype='float64')
+        columns[column.name] = (values, missing, lambda rows, text=text: _picked(text, rows))
+    return columns
+
+
+def _picked(text, rows):
+    picked = text.iloc[rows]
+    return picked.astype(object).where(picked.notna(), None).tolist()
+
+
+def validate_records(records, errors, numbers):
+    """
+    validate() for dicts keyed by the SCHEMA column names. Values may be
+    numbers or text; `numbers` are the row numbers reported for them.
+    """
+    frame = pd.DataFrame({
+        name: pd.Series([_text(record.get(name)) for record in records], dtype=object) for name in COLUMN_NAMES
+    })
+    return validate(_pandas_columns(frame), errors, offset=0, numbers=np.asarray(numbers))
+
+
+def _text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, bool):
+        return str(value).lower() # a JSON true is not a number
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def validate(columns, errors, offset, numbers=None):
+    """
+    Check every value, report the bad ones to `errors` and return a frame
+    of the rows that passed. `offset` is the number of data rows before
+    this chunk; `numbers` replaces the row numbers altogether.
+    """
+    length = len(next(iter(columns.values()))[1])
+    bad = np.zeros(length, dtype=bool)
+    frame = {}
+    for column in SCHEMA:
+        values, missing, raw = columns[column.name]
+        checks = [(missing, "missing value")]
+        if column.kind == 'text':
+            lengths = values.str.len().to_numpy(dtype='float64', na_value=0)
+            checks.append((lengths > column.max_length, f"longer than {column.max_length} characters"))
+        else:
+            present = ~missing
+            checks.append((present & np.isnan(values), "not a number"))
+            checks.append((present & np.isinf(values), "not a finite number"))
+            finite = np.isfinite(values)
+            if column.kind == 'integer':
+                whole = np.zeros(length, dtype=bool)
+                np.equal(values, np.round(values), out=whole, where=finite)
+                checks.append((finite & ~whole, "not a whole number"))
+            low, high = column.limits()
+            if low is not None:
+                checks.append((finite & (values < low), f"below the minimum of {low}"))
+            if high is not None:
+                checks.append((finite & (values > high), f"above the maximum of {high}"))
+
+        # One reason per value: the first check it fails
+        failed = np.zeros(length, dtype=bool)
+        for mask, reason in checks:
+            mask = mask & ~failed
+            if mask.any():
+                rows = np.flatnonzero(mask)
+                errors.add(rows + offset + 2 if numbers is None else numbers[rows], column.name, reason, raw(rows))
+                failed |= mask
+        bad |= failed
+        frame[column.name] = values
+
+    keep = ~bad
+    errors.rejected_rows += int(bad.sum())
+    df = pd.DataFrame({name: (values[keep].reset_index(drop=True) if isinstance(values, pd.Series)
+                              else values[keep]) for name, values in frame.items()})
+    for column in SCHEMA:
+        if column.kind == 'integer':
+            df[column.name] = df[column.name].astype('int64')
+    return df
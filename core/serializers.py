@@ -1,13 +1,31 @@
 # core/serializers.py
 from rest_framework import serializers
-from .models import FileUpload, EquipmentData
+from .models import FileUpload, EquipmentData, IngestJob, BaselineModel, UploadSummary
 
 class EquipmentDataSerializer(serializers.ModelSerializer):
     class Meta:
         model = EquipmentData
         fields = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature','is_anomaly']
 
+class UploadSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSummary
+        fields = ['total_count', 'anomaly_count', 'avg_flow', 'avg_pressure', 'avg_temp', 'metrics', 'distribution']
+
 class FileUploadSerializer(serializers.ModelSerializer):
+    summary = UploadSummarySerializer(read_only=True, default=None)
+
     class Meta:
         model = FileUpload
-        fields = ['id', 'file_name', 'uploaded_at']
+        fields = ['id', 'file_name', 'uploaded_at', 'detector', 'contamination', 'model_version', 'summary']
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = IngestJob
+        fields = ['id', 'file_name', 'status', 'stage', 'progress', 'rows_processed',
+                  'error', 'upload', 'result', 'created_at', 'updated_at']
+
+class BaselineModelSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BaselineModel
+        fields = ['id', 'name', 'version', 'label', 'detector', 'contamination', 'trained_on', 'rows', 'created_at']
@@ -0,0 +1,422 @@
+# core/storage.py
+"""
+Where the rows of an upload live.
+
+Views, summaries, the model registry and the reports read upload rows only
+through this interface, so the storage can be swapped with the
+UPLOAD_STORAGE_BACKEND setting:
+
+  * 'orm'     - one EquipmentData row per CSV row (the original layout)
+  * 'parquet' - one directory of compressed Parquet parts per upload under
+                PARQUET_STORAGE_DIR, next to a slim FileUpload record. Reads
+                are memory-mapped, only the requested columns are decoded and
+                row groups that cannot match the cursor are skipped.
+
+Each FileUpload remembers which backend holds it, so switching the setting
+only affects new uploads.
+
+Rows are exchanged as DataFrames with the EquipmentData field names
+(filters.DATA_FIELDS); `id` is the row's stable id within its backend.
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import BooleanField, ExpressionWrapper, Q
+
+from .filters import DATA_FIELDS
+from .models import EquipmentData
+from .streaming import DEFAULT_CHUNK_SIZE, iter_json_array, iter_json_rows
+
+# CSV column -> EquipmentData field
+CSV_FIELDS = {
+    'Equipment Name': 'equipment_name',
+    'Type': 'equipment_type',
+    'Flowrate': 'flowrate',
+    'Pressure': 'pressure',
+    'Temperature': 'temperature',
+    'is_anomaly': 'is_anomaly',
+    'anomaly_score': 'anomaly_score',
+}
+
+# Ids of part N start at N << 32, so parts written in parallel never collide
+PART_ID_SHIFT = 32
+
+
+class UploadStorage:
+    name = None
+
+    def writer(self, upload, part=0):
+        """
+        Returns an object with write(df) and close(); `df` uses the CSV
+        column names plus is_anomaly and anomaly_score.
+        """
+        raise NotImplementedError
+
+    def iter_frames(self, upload, fields, query=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Yield DataFrames of `fields` for rows matching `query`, in id order.
+        """
+        raise NotImplementedError
+
+    def frame(self, upload, fields, query=None):
+        frames = list(self.iter_frames(upload, fields, query))
+        if not frames:
+            return pd.DataFrame(columns=fields)
+        return pd.concat(frames, ignore_index=True)
+
+    def page(self, upload, query):
+        """
+        One keyset page: (list of dicts, next_cursor).
+        """
+        columns = ['id'] + [field for field in query.fields if field != 'id']
+        rows = []
+        for frame in self.iter_frames(upload, columns, query, chunk_size=query.limit + 1):
+            rows.extend(frame.to_dict('records'))
+            if len(rows) > query.limit:
+                break
+        next_cursor = int(rows[query.limit - 1]['id']) if len(rows) > query.limit else None
+        return [{field: row[field] for field in query.fields} for row in rows[:query.limit]], next_cursor
+
+    def iter_json(self, upload, query):
+        """
+        Every matching row as one streamed JSON array (see core/streaming.py).
+        """
+        return iter_json_array(
+            _records(frame) for frame in self.iter_frames(upload, query.fields, query)
+        )
+
+    def apply_threshold(self, upload, threshold):
+        """
+        Re-flag rows from their stored anomaly_score (rows without one keep
+        their flag); returns the upload's anomaly count.
+        """
+        raise NotImplementedError
+
+    def purge(self, upload, batch_size):
+        """
+        Delete the upload's rows ahead of its FileUpload row, in batches of
+        at most `batch_size`. Returns the rows deleted. Backends keeping rows
+        outside the database drop them in delete() instead.
+        """
+        return 0
+
+    def delete(self, upload_id):
+        """
+        Drop stored rows of an upload whose FileUpload row is already gone.
+        """
+
+
+class ORMStorage(UploadStorage):
+    name = 'orm'
+
+    def writer(self, upload, part=0):
+        return ORMWriter(upload)
+
+    def iter_frames(self, upload, fields, query=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        rows = EquipmentData.objects.filter(upload=upload)
+        if query is not None:
+            rows = query.filter(rows)
+            if query.cursor is not None:
+                rows = rows.filter(id__gt=query.cursor)
+        chunk = []
+        for row in rows.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame.from_records(chunk, columns=fields)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=fields)
+
+    def page(self, upload, query):
+        return query.page(EquipmentData.objects.filter(upload=upload))
+
+    def iter_json(self, upload, query):
+        rows = query.filter(EquipmentData.objects.filter(upload=upload)).order_by('id')
+        if query.cursor is not None:
+            rows = rows.filter(id__gt=query.cursor)
+        return iter_json_rows(rows, query.fields)
+
+    def apply_threshold(self, upload, threshold):
+        # Rows stored without a score keep their flag
+        rows = EquipmentData.objects.filter(upload=upload)
+        rows.exclude(anomaly_score=None).update(
+            is_anomaly=ExpressionWrapper(Q(anomaly_score__gt=threshold), output_field=BooleanField()))
+        return rows.filter(is_anomaly=True).count()
+
+    def purge(self, upload, batch_size):
+        # Raw deletes over id ranges, each committed on its own: no rows are
+        # loaded into Python and no statement holds the write lock for long
+        table = connection.ops.quote_name(EquipmentData._meta.db_table)
+        deleted = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table} WHERE upload_id = %s", [upload.id])
+            low, high = cursor.fetchone()
+            if low is None:
+                return 0
+            for start in range(low, high + 1, batch_size):
+                cursor.execute(f"DELETE FROM {table} WHERE upload_id = %s AND id >= %s AND id < %s",
+                               [upload.id, start, start + batch_size])
+                deleted += cursor.rowcount
+        return deleted
+
+
+class ORMWriter:
+
+    def __init__(self, upload):
+        self.upload = upload
+
+    def write(self, df):
+        batch = getattr(settings, 'INGEST_BATCH_SIZE', 5_000)
+        EquipmentData.objects.bulk_create(self.instances(df), batch_size=batch)
+        return len(df)
+
+    def instances(self, df):
+        """
+        Unsaved EquipmentData objects for a chunk. Columns are pulled out as
+        plain Python lists once instead of walking df.iterrows().
+        """
+        return [
+            EquipmentData(
+                upload=self.upload,
+                equipment_name=name,
+                equipment_type=eq_type,
+                flowrate=flow,
+                pressure=pressure,
+                temperature=temp,
+                is_anomaly=anomaly,
+                anomaly_score=score,
+            )
+            for name, eq_type, flow, pressure, temp, anomaly, score in zip(
+                df['Equipment Name'].tolist(),
+                df['Type'].tolist(),
+                df['Flowrate'].tolist(),
+                df['Pressure'].tolist(),
+                df['Temperature'].tolist(),
+                df['is_anomaly'].tolist(),
+                df['anomaly_score'].tolist(),
+            )
+        ]
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class ParquetStorage(UploadStorage):
+    name = 'parquet'
+
+    def __init__(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured("The 'parquet' upload storage backend requires pyarrow")
+
+    def directory(self, upload_id):
+        root = getattr(settings, 'PARQUET_STORAGE_DIR', settings.BASE_DIR / 'media' / 'parquet')
+        return os.path.join(root, f'upload-{upload_id}')
+
+    def parts(self, upload):
+        folder = self.directory(upload.id)
+        if not os.path.isdir(folder):
+            return []
+        return [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith('.parquet')]
+
+    def writer(self, upload, part=0):
+        return ParquetWriter(self.directory(upload.id), part)
+
+    def iter_frames(self, upload, fields, query=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        import pyarrow.parquet as pq
+
+        expression = _arrow_filter(query)
+        needed = list(dict.fromkeys(fields + _filter_fields(query)))
+        for path in self.parts(upload):
+            parquet = pq.ParquetFile(path, memory_map=True)
+            for index in range(parquet.num_row_groups):
+                if query is not None and query.cursor is not None and _max_id(parquet, index) <= query.cursor:
+                    continue  # the whole row group is before the cursor
+                table = parquet.read_row_group(index, columns=needed)
+                if expression is not None:
+                    table = table.filter(expression)
+                table = table.select(fields)
+                for offset in range(0, table.num_rows, chunk_size):
+                    yield table.slice(offset, chunk_size).to_pandas()
+
+    def apply_threshold(self, upload, threshold):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        anomalies = 0
+        for path in self.parts(upload):
+            table = pq.read_table(path)
+            scores = table['anomaly_score']
+            # Rows stored without a score keep their flag
+            flags = pc.if_else(pc.is_null(scores), table['is_anomaly'], pc.greater(scores, threshold))
+            table = table.set_column(table.schema.get_field_index('is_anomaly'), 'is_anomaly', flags)
+            anomalies += pc.sum(flags.cast(pa.int64())).as_py() or 0
+            tmp = f'{path}.tmp'
+            pq.write_table(table, tmp, compression=_compression())
+            os.replace(tmp, path)
+        return anomalies
+
+    def purge(self, upload, batch_size):
+        import pyarrow.parquet as pq
+
+        # The files go in delete(); report the rows they hold, like the ORM
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in self.parts(upload))
+
+    def delete(self, upload_id):
+        shutil.rmtree(self.directory(upload_id), ignore_errors=True)
+
+    def size(self, upload):
+        return sum(os.path.getsize(path) for path in self.parts(upload))
+
+
+class ParquetWriter:
+    """
+    Appends each ingest chunk as a row group of one part file.
+    """
+
+    def __init__(self, folder, part=0):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f'part-{part:05d}.parquet')
+        self.next_id = (part << PART_ID_SHIFT) + 1
+        self._writer = None
+
+    def write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        frame = df[list(CSV_FIELDS)].rename(columns=CSV_FIELDS)
+        frame.insert(0, 'id', np.arange(self.next_id, self.next_id + len(frame), dtype=np.int64))
+        frame = frame.astype({
+            'equipment_name': str, 'equipment_type': str, 'flowrate': 'int64', 'pressure': 'float64',
+            'temperature': 'int64', 'is_anomaly': bool, 'anomaly_score': 'float64',
+        })
+        table = pa.Table.from_pandas(frame, schema=_parquet_schema(), preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path + '.tmp', table.schema, compression=_compression())
+        self._writer.write_table(table)
+        self.next_id += len(frame)
+        return len(frame)
+
+    def close(self):
+        # Parts only appear under their final name once complete
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self.path + '.tmp', self.path)
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        for path in (self.path + '.tmp', self.path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()),
+        ('equipment_name', pa.string()),
+        ('equipment_type', pa.string()),
+        ('flowrate', pa.int64()),
+        ('pressure', pa.float64()),
+        ('temperature', pa.int64()),
+        ('is_anomaly', pa.bool_()),
+        ('anomaly_score', pa.float64()),
+    ])
+
+
+def _compression():
+    return getattr(settings, 'PARQUET_COMPRESSION', 'zstd')
+
+
+def _records(frame):
+    # to_dict turns NumPy scalars into plain Python values for the encoder
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def _filter_fields(query):
+    if query is None:
+        return []
+    fields = ['id'] if query.cursor is not None else []
+    if query.equipment_types:
+        fields.append('equipment_type')
+    if query.is_anomaly is not None:
+        fields.append('is_anomaly')
+    return fields + list(query.ranges)
+
+
+def _arrow_filter(query):
+    if query is None:
+        return None
+    import pyarrow.compute as pc
+
+    terms = []
+    if query.cursor is not None:
+        terms.append(pc.field('id') > query.cursor)
+    if query.equipment_types:
+        terms.append(pc.field('equipment_type').isin(query.equipment_types))
+    if query.is_anomaly is not None:
+        terms.append(pc.field('is_anomaly') == query.is_anomaly)
+    for field, (low, high) in query.ranges.items():
+        if low is not None:
+            terms.append(pc.field(field) >= low)
+        if high is not None:
+            terms.append(pc.field(field) <= high)
+    if not terms:
+        return None
+    expression = terms[0]
+    for term in terms[1:]:
+        expression = expression & term
+    return expression
+
+
+def _max_id(parquet, index):
+    column = parquet.schema_arrow.get_field_index('id')
+    stats = parquet.metadata.row_group(index).column(column).statistics
+    return stats.max if stats is not None and stats.has_min_max else float('inf')
+
+
+BACKENDS = {
+    ORMStorage.name: ORMStorage,
+    ParquetStorage.name: ParquetStorage,
+}
+
+_instances = {}
+
+
+def get_storage(name=None):
+    name = name or getattr(settings, 'UPLOAD_STORAGE_BACKEND', ORMStorage.name)
+    if name not in _instances:
+        try:
+            _instances[name] = BACKENDS[name]()
+        except KeyError:
+            raise ImproperlyConfigured(f"Unknown UPLOAD_STORAGE_BACKEND '{name}'. Choose from: {sorted(BACKENDS)}")
+    return _instances[name]
+
+
+def storage_for(upload):
+    return get_storage(upload.storage or ORMStorage.name)
+
+
+def delete_upload(upload):
+    """
+    Remove an upload and its rows, wherever they are stored.
+    """
+    from .reports import discard_reports
+
+    backend = storage_for(upload)
+    upload_id = upload.id
+    upload.delete()
+    backend.delete(upload_id)
+    discard_reports(upload_id)
+
@@ -0,0 +1,84 @@
+# core/streaming.py
+"""
+Fast JSON output for bulk EquipmentData rows.
+
+Building a ModelSerializer representation per model instance dominates the
+cost of returning large row lists. This path pulls plain tuples with
+values_list().iterator(), encodes a whole chunk per json call and yields the
+bytes to a StreamingHttpResponse, so no model objects are created and the
+response never sits in memory in one piece.
+
+The bytes are identical to what JSONRenderer produces for
+EquipmentDataSerializer(..., many=True) with the default DRF settings
+(compact separators, UTF-8 output, NaN rejected).
+"""
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+DEFAULT_CHUNK_SIZE = 2000
+
+_encoder = json.JSONEncoder(
+    ensure_ascii=not api_settings.UNICODE_JSON,
+    allow_nan=not api_settings.STRICT_JSON,
+    separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+)
+
+
+def iter_json_rows(queryset, fields, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield a JSON array of {field: value} objects, one encoded chunk at a time.
+    """
+    return iter_json_array(_queryset_chunks(queryset, fields, chunk_size))
+
+
+def iter_json_array(chunks):
+    """
+    Yield a JSON array from an iterable of lists of plain dicts.
+    """
+    yield b'['
+    first = True
+    for chunk in chunks:
+        if chunk:
+            yield _encode_chunk(chunk, first)
+            first = False
+    yield b']'
+
+
+def _queryset_chunks(queryset, fields, chunk_size):
+    chunk = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        chunk.append(dict(zip(fields, row)))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_json_document(head, key, rows):
+    """
+    Splice a streamed row array into a regular response body: `head` is
+    rendered with the normal DRF renderer and `rows` becomes its last key.
+    """
+    rendered = JSONRenderer().render(head)
+    if head:
+        yield rendered[:-1] + b',' + _encoder.encode(key).encode() + b':'
+    else:
+        yield b'{' + _encoder.encode(key).encode() + b':'
+    yield from rows
+    yield b'}'
+
+
+def _encode_chunk(chunk, first):
+    # Encode the chunk as one list and drop its brackets
+    body = _encoder.encode(chunk)[1:-1].encode('utf-8')
+    return body if first else b',' + body
+
+
+def streaming_json_response(chunks, status=200):
+    response = StreamingHttpResponse(chunks, content_type='application/json', status=status)
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,246 @@
+# core/summaries.py
+"""
+Per-upload summaries (UploadSummary), computed with pandas/NumPy while the
+rows are ingested. The builder is fed chunk by chunk so it works for the
+streaming ingest path and live streams too: exact counts, sums, min/max and
+per-type tallies are accumulated as it goes, and the percentiles come from
+a QuantileSketch per numeric column. Nothing is kept per row, so the
+builder's size does not grow with the upload.
+"""
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from .models import UploadSummary
+
+# CSV column -> (EquipmentData field, key used in the API payload)
+METRICS = {
+    'Flowrate': ('flowrate', 'avg_flow'),
+    'Pressure': ('pressure', 'avg_pressure'),
+    'Temperature': ('temperature', 'avg_temp'),
+}
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+# Relative error of the summary percentiles
+SKETCH_ACCURACY = 0.001
+# Smaller magnitudes count as zero in the sketch
+SKETCH_MIN_VALUE = 1e-9
+
+# EquipmentData field -> CSV column, for reading stored rows back
+ROW_FIELDS = {
+    'equipment_type': 'Type',
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+    'is_anomaly': 'is_anomaly',
+}
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a relative error bound (DDSketch). Every
+    value is counted in a logarithmic bucket SKETCH_ACCURACY wide, so its
+    size depends on the range of the values, not on how many there were:
+    0.001 to 100 000 takes about 4 000 buckets. Min and max are exact.
+    """
+
+    def __init__(self, accuracy=SKETCH_ACCURACY):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.positive = pd.Series(dtype='int64')
+        self.negative = pd.Series(dtype='int64')
+        self.zeros = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        small = np.abs(values) < SKETCH_MIN_VALUE
+        self.zeros += int(small.sum())
+        self.positive = self._count(self.positive, values[~small & (values > 0)])
+        self.negative = self._count(self.negative, -values[~small & (values < 0)])
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zeros += other.zeros
+        self.positive = self.positive.add(other.positive, fill_value=0).astype('int64').sort_index()
+        self.negative = self.negative.add(other.negative, fill_value=0).astype('int64').sort_index()
+        return self
+
+    def quantiles(self, percentiles):
+        if not self.count:
+            return []
+        # Bucket midpoints from the smallest value to the largest
+        midpoints = np.concatenate([
+            -self._midpoints(self.negative.index.to_numpy()[::-1]),
+            [0.0],
+            self._midpoints(self.positive.index.to_numpy()),
+        ])
+        cumulative = np.cumsum(np.concatenate([self.negative.to_numpy()[::-1], [self.zeros], self.positive.to_numpy()]))
+        result = []
+        for p in percentiles:
+            i = int(np.searchsorted(cumulative, p / 100 * (self.count - 1), side='right'))
+            result.append(min(max(float(midpoints[i]), self.min), self.max))
+        return result
+
+    def _midpoints(self, keys):
+        # Bucket k holds the magnitudes in (gamma^(k-1), gamma^k]
+        return 2 * self.gamma ** keys.astype(np.float64) / (self.gamma + 1)
+
+    def _count(self, buckets, magnitudes):
+        if not len(magnitudes):
+            return buckets
+        keys, counts = np.unique(np.ceil(np.log(magnitudes) / self.log_gamma).astype(np.int64), return_counts=True)
+        return buckets.add(pd.Series(counts, index=keys), fill_value=0).astype('int64').sort_index()
+
+
+class SummaryBuilder:
+
+    def __init__(self):
+        self.total = 0
+        self.anomalies = 0
+        self.sums = dict.fromkeys(METRICS, 0.0)
+        self.sketches = {column: QuantileSketch() for column in METRICS}
+        self.by_type = None
+
+    def add(self, df):
+        """
+        Fold in one chunk with the CSV column names plus `is_anomaly`.
+        """
+        if df.empty:
+            return self
+        self.total += len(df)
+        self.anomalies += int(df['is_anomaly'].sum())
+        grouped = pd.DataFrame({'is_anomaly': df['is_anomaly']})
+        for column in METRICS:
+            series = pd.to_numeric(df[column], errors='coerce')
+            self.sums[column] += float(series.sum())
+            self.sketches[column].add(series.to_numpy(dtype=np.float64))
+            grouped[column] = series.astype('float64')
+            grouped[f'{column}_sq'] = grouped[column] ** 2
+
+        # Per type: row and anomaly counts plus the sums behind each mean and std
+        counts = grouped.groupby(df['Type'].astype(str)).agg(
+            count=('is_anomaly', 'size'),
+            anomalies=('is_anomaly', 'sum'),
+            **{f'{column}_{stat}': (source, how) for column in METRICS for stat, source, how in (
+                ('n', column, 'count'), ('sum', column, 'sum'), ('sq', f'{column}_sq', 'sum'))},
+        )
+        self.by_type = counts if self.by_type is None else self.by_type.add(counts, fill_value=0)
+        return self
+
+    def merge(self, other):
+        """
+        Fold in another builder, e.g. one filled by a batch worker.
+        """
+        self.total += other.total
+        self.anomalies += other.anomalies
+        for column in METRICS:
+            self.sums[column] += other.sums[column]
+            self.sketches[column].merge(other.sketches[column])
+        if other.by_type is not None:
+            self.by_type = other.by_type if self.by_type is None else self.by_type.add(other.by_type, fill_value=0)
+        return self
+
+    def result(self):
+        fields = {'total_count': self.total, 'anomaly_count': self.anomalies, 'metrics': {}}
+        for column, (field, avg_key) in METRICS.items():
+            sketch = self.sketches[column]
+            fields[avg_key] = self.sums[column] / sketch.count if sketch.count else None
+            fields['metrics'][field] = _describe(sketch)
+
+        distribution = []
+        if self.by_type is not None:
+            for eq_type, row in self.by_type.sort_index().iterrows():
+                count, anomalies = int(row['count']), int(row['anomalies'])
+                entry = {
+                    'equipment_type': eq_type,
+                    'count': count,
+                    'anomalies': anomalies,
+                    'anomaly_rate': round(anomalies / count, 4) if count else 0.0,
+                }
+                for column, (field, _) in METRICS.items():
+                    entry[field] = _moments(row[f'{column}_n'], row[f'{column}_sum'], row[f'{column}_sq'])
+                distribution.append(entry)
+        fields['distribution'] = distribution
+        return fields
+
+    def save(self, upload):
+        summary, _ = UploadSummary.objects.update_or_create(upload=upload, defaults=self.result())
+        return summary
+
+
+def _describe(sketch):
+    if not sketch.count:
+        return {}
+    described = {'min': round(sketch.min, 4), 'max': round(sketch.max, 4)}
+    for p, value in zip(PERCENTILES, sketch.quantiles(PERCENTILES)):
+        described[f'p{p}'] = round(float(value), 4)
+    return described
+
+
+def _moments(n, total, squares):
+    if not n:
+        return None
+    mean = total / n
+    return {'mean': round(float(mean), 4), 'std': round(float(np.sqrt(max(squares / n - mean ** 2, 0.0))), 4)}
+
+
+def has_type_stats(summary):
+    """
+    Summaries written before the per-type means and stds were added lack
+    them; build_summary() (or `backfill_summaries --all`) fills them in.
+    """
+    return all('pressure' in entry for entry in summary.distribution)
+
+
+def build_summary(upload, chunk_size=50_000, save=True):
+    """
+    (Re)compute the summary of an already stored upload, reading its rows
+    back in chunks. Used by the backfill command and after re-thresholding.
+    With save=False the summary is returned without being stored.
+    """
+    from .storage import storage_for
+
+    builder = SummaryBuilder()
+    for frame in storage_for(upload).iter_frames(upload, list(ROW_FIELDS), chunk_size=chunk_size):
+        builder.add(frame.rename(columns=ROW_FIELDS))
+    if not save:
+        return UploadSummary(upload=upload, computed_at=timezone.now(), **builder.result())
+    return builder.save(upload)
+
+
+def get_summary(upload):
+    """
+    The stored summary, built on the spot for uploads that predate it.
+    An upload still being written gets a summary of its rows so far that
+    is not stored: retention keeps it as in progress until the ingest
+    saves the real one.
+    """
+    from .retention import in_progress_cutoff
+
+    try:
+        return upload.summary
+    except UploadSummary.DoesNotExist:
+        return build_summary(upload, save=upload.uploaded_at < in_progress_cutoff())
+
+
+def stats_payload(summary):
+    return {
+        'avg_flow': summary.avg_flow,
+        'avg_pressure': summary.avg_pressure,
+        'avg_temp': summary.avg_temp,
+        'total_count': summary.total_count,
+        'anomaly_count': summary.anomaly_count,
+    }
@@ -1,3 +1,1269 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from . import live, reports, retention
+from .batch import is_csv_member
+from .caching import invalidate as invalidate_cache
+from .charts import ChartOptions, lttb
+from .detectors import DETECTORS, GroupedModel, feature_matrix, get_detector
+from .filters import DATA_FIELDS, DEFAULT_FIELDS, DataQuery, int_params, split_list
+from .ingest import FrameHasher, IngestError, ingest_csv_stream, ingest_file, score_chunk, store_frame
+from .live import LiveHub, parse_readings
+from .models import BaselineModel, EquipmentData, FileUpload, UploadSummary
+from .registry import RegistryError, model_folder, resolve, train_baseline, validate_name
+from .retention import expired_uploads, purge_expired
+from .schema import COLUMN_NAMES, RowErrors, SchemaError, iter_frames, read_frame
+from .serializers import EquipmentDataSerializer
+from .storage import ORMWriter, storage_for
+from .streaming import iter_json_rows
+from .summaries import PERCENTILES, QuantileSketch, SummaryBuilder, get_summary
+from .trends import DiffOptions
+from .views import detection_options
+
+
+class BaselineNameTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.registry = os.path.join(self.tmp.name, 'models')
+        settings = override_settings(MODEL_REGISTRY_DIR=self.registry)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_rejects_names_that_are_not_slugs(self):
+        for name in ['../../escaped', '..', '.', 'a/b', 'plant@v2', '', ' ', None, 3]:
+            with self.subTest(name=name), self.assertRaises(RegistryError):
+                validate_name(name)
+
+    def test_model_folder_stays_inside_the_registry(self):
+        self.assertEqual(model_folder('plant-a_1'), os.path.join(os.path.realpath(self.registry), 'plant-a_1'))
+
+    def test_model_folder_refuses_a_symlink_out_of_the_registry(self):
+        os.makedirs(self.registry)
+        os.symlink(self.tmp.name, os.path.join(self.registry, 'linked'))
+        with self.assertRaises(RegistryError):
+            model_folder('linked')
+
+    def test_api_rejects_traversal_without_writing(self):
+        response = self.client.post('/api/models/', {'name': '../../escaped', 'uploads': [1]},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'escaped')))
+
+
+def readings_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Equipment Name': [f'P-{i % 50}' for i in range(rows)],
+        'Type': rng.choice(['Pump', 'Valve', 'Reactor'], rows),
+        'Flowrate': rng.normal(175, 40, rows).round().astype('int64'),
+        'Pressure': rng.normal(5, 1, rows),
+        'Temperature': rng.normal(110, 20, rows).round().astype('int64'),
+        'is_anomaly': rng.random(rows) < 0.05,
+        'anomaly_score': rng.normal(-0.1, 0.05, rows),
+    })
+
+
+def stored_upload(frame, summary=True, **fields):
+    upload = FileUpload.objects.create(file_name=fields.pop('file_name', 'plant.csv'), **fields)
+    ORMWriter(upload).write(frame)
+    if summary:
+        SummaryBuilder().add(frame).save(upload)
+    return upload
+
+
+class QuantileSketchTests(TestCase):
+
+    def test_percentiles_within_the_relative_error(self):
+        rng = np.random.default_rng(1)
+        for values in (rng.normal(5, 1, 20_000), rng.normal(0, 30, 20_000), rng.exponential(2, 20_000)):
+            expected = np.percentile(values, PERCENTILES)
+            sketch = QuantileSketch().add(values)
+            for got, want in zip(sketch.quantiles(PERCENTILES), expected):
+                self.assertAlmostEqual(got, want, delta=abs(want) * 0.005 + 1e-6)
+
+    def test_merge_matches_a_single_sketch(self):
+        values = np.random.default_rng(2).normal(100, 25, 10_000)
+        merged = QuantileSketch().add(values[:3_000]).merge(QuantileSketch().add(values[3_000:]))
+        self.assertEqual(merged.quantiles(PERCENTILES), QuantileSketch().add(values).quantiles(PERCENTILES))
+        self.assertEqual((merged.min, merged.max, merged.count), (values.min(), values.max(), len(values)))
+
+    def test_ignores_nan_and_handles_constants(self):
+        sketch = QuantileSketch().add([7.0, np.nan, 7.0])
+        self.assertEqual(sketch.count, 2)
+        self.assertEqual(sketch.quantiles([5, 50, 95]), [7.0, 7.0, 7.0])
+
+
+class SummaryBuilderTests(TestCase):
+
+    def test_size_does_not_grow_with_the_rows(self):
+        builder = SummaryBuilder().add(readings_frame(20_000, seed=0))
+        buckets = sum(len(s.positive) + len(s.negative) for s in builder.sketches.values())
+        for seed in range(1, 6):
+            builder.add(readings_frame(20_000, seed=seed))
+        grown = sum(len(s.positive) + len(s.negative) for s in builder.sketches.values())
+        self.assertEqual(builder.total, 120_000)
+        self.assertLess(grown, buckets * 1.5)
+
+    def test_result_matches_the_exact_figures(self):
+        frame = readings_frame(5_000, seed=3)
+        result = SummaryBuilder().add(frame[:2_000]).merge(SummaryBuilder().add(frame[2_000:])).result()
+        self.assertEqual(result['total_count'], 5_000)
+        self.assertEqual(result['anomaly_count'], int(frame['is_anomaly'].sum()))
+        self.assertAlmostEqual(result['avg_pressure'], frame['Pressure'].mean())
+        pressure = result['metrics']['pressure']
+        self.assertEqual(pressure['max'], round(frame['Pressure'].max(), 4))
+        self.assertAlmostEqual(pressure['p50'], frame['Pressure'].median(), delta=0.01)
+        self.assertEqual([entry['equipment_type'] for entry in result['distribution']], ['Pump', 'Reactor', 'Valve'])
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_etag_answers_304_until_the_data_changes(self):
+        stored_upload(readings_frame(100))
+        first = self.client.get('/api/summary/')
+        self.assertEqual(first.status_code, 200)
+        again = self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        stored_upload(readings_frame(50, seed=1))
+        changed = self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['stats']['total_count'], 50)
+
+    def test_summary_written_elsewhere_is_picked_up_without_invalidate(self):
+        # Another worker process re-flags an upload: it cannot reach this
+        # process's cache, only the database
+        frame = readings_frame(100)
+        upload = stored_upload(frame)
+        before = self.client.get('/api/history/')
+        frame['is_anomaly'] = True
+        SummaryBuilder().add(frame).save(upload)
+        after = self.client.get('/api/history/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(after.json()[0]['summary']['anomaly_count'], 100)
+
+    def test_partial_summary_is_not_served_once_the_ingest_finishes(self):
+        frame = readings_frame(200)
+        upload = stored_upload(frame[:100], summary=False)
+        partial = self.client.get('/api/summary/')
+        self.assertEqual(partial.json()['stats']['total_count'], 100)
+        # The streamed ingest goes on in another process and saves the summary
+        ORMWriter(upload).write(frame[100:])
+        SummaryBuilder().add(frame).save(upload)
+        self.assertEqual(self.client.get('/api/summary/').json()['stats']['total_count'], 200)
+
+    def test_invalidate_changes_the_etag(self):
+        stored_upload(readings_frame(10))
+        first = self.client.get('/api/summary/')
+        invalidate_cache()
+        self.assertEqual(self.client.get('/api/summary/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+    def test_long_query_strings_get_short_keys(self):
+        names = ','.join(f'P-{i}' for i in range(50))
+        with mock.patch('core.caching.cache.set', wraps=cache.set) as cache_set:
+            self.assertEqual(self.client.get('/api/trends/', {'equipment': names}).status_code, 200)
+        keys = [call.args[0] for call in cache_set.call_args_list if 'trends' in call.args[0]]
+        self.assertEqual(len(keys), 1)
+        self.assertLess(len(keys[0]), 100)
+
+
+class ReportViewTests(TestCase):
+
+    def setUp(self):
+        self.upload = stored_upload(readings_frame(20))
+
+    def test_export_answers_202_when_the_render_takes_longer(self):
+        with override_settings(REPORT_WAIT_TIMEOUT=0.01), \
+                mock.patch.object(reports, 'cached_report', return_value=None), \
+                mock.patch.object(reports, 'submit_report', return_value=Future()):
+            response = self.client.get('/api/export-pdf/')
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['report_url'].endswith(f'/api/uploads/{self.upload.id}/report.pdf'))
+
+    def test_export_reports_a_failed_render(self):
+        failed = Future()
+        failed.set_exception(OSError("disk full"))
+        with mock.patch.object(reports, 'cached_report', return_value=None), \
+                mock.patch.object(reports, 'submit_report', return_value=failed):
+            response = self.client.get('/api/export-pdf/')
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("disk full", response.json()['error'])
+
+    def test_report_poll_reports_the_last_failure_once(self):
+        path = reports.report_path(self.upload)
+        with reports._pending_lock:
+            reports._failed[path] = "disk full"
+        with mock.patch.object(reports, 'submit_report') as submit:
+            first = self.client.get(f'/api/uploads/{self.upload.id}/report.pdf')
+            second = self.client.get(f'/api/uploads/{self.upload.id}/report.pdf')
+        self.assertEqual((first.status_code, second.status_code), (500, 202))
+        self.assertIn("disk full", first.json()['error'])
+        submit.assert_called_once()
+
+
+def live_hub():
+    async def build():
+        hub = LiveHub()
+        hub.task.cancel()
+        return hub
+    return asyncio.run(build())
+
+
+def live_readings(rows, seed=0):
+    frame = readings_frame(rows, seed)
+    return frame[['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']].to_dict('records')
+
+
+class LiveIntakeTests(TestCase):
+
+    def setUp(self):
+        self.hub = live_hub()
+        self.addCleanup(self.hub.executor.shutdown)
+        # The writer thread closes stale connections; the test's is in a transaction
+        patcher = mock.patch.object(live, 'close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bad_readings_are_rejected_one_by_one(self):
+        errors = RowErrors()
+        good = '{"equipment_name": "P-1", "equipment_type": "Pump", "flowrate": 12, "pressure": 5.1, "temperature": 100}'
+        text = '\n'.join([good, good.replace('12', '12.5'), good.replace('"flowrate": 12, ', ''),
+                          good.replace('5.1', 'true'), 'not json', '[1]', good.replace('100', '"100"')])
+        readings, count = parse_readings(text, errors, first=11)
+        self.assertEqual(count, 7)
+        self.assertEqual([r['Temperature'] for r in readings], [100, 100])
+        self.assertEqual(errors.rejected_rows, 5)
+        self.assertEqual([(e['row'], e['column'], e['reason']) for e in errors.report()], [
+            (12, 'Flowrate', 'not a whole number'),
+            (13, 'Flowrate', 'missing value'),
+            (14, 'Pressure', 'not a number'),
+            (15, '', 'not a JSON object'),
+            (16, '', 'not a JSON object'),
+        ])
+
+    def test_a_failing_stream_does_not_drop_the_others(self):
+        score = live.StreamSession.score
+
+        def failing(session, df):
+            if session.name == 'broken':
+                raise ValueError("detector failed")
+            return score(session, df)
+
+        batch = [('good', r) for r in live_readings(30)] + [('broken', r) for r in live_readings(20, seed=1)]
+        with mock.patch.object(live.StreamSession, 'score', failing), self.assertLogs('core.live', 'ERROR'):
+            events = self.hub._process(batch)
+        self.assertEqual([e['stream'] for e in events if e['type'] == 'batch'], ['good'])
+        self.assertEqual((self.hub.totals['rows'], self.hub.totals['failed']), (30, 20))
+        self.assertEqual(EquipmentData.objects.filter(upload__file_name='live:good').count(), 30)
+
+    def test_running_summary_stays_bounded(self):
+        for seed in range(40):
+            self.hub._process([('plant', r) for r in live_readings(500, seed)])
+        session = self.hub.sessions['plant']
+        self.assertEqual(session.summary.total, 20_000)
+        buckets = sum(len(s.positive) + len(s.negative) for s in session.summary.sketches.values())
+        self.assertLess(buckets, 5_000)
+
+    def post_chunks(self, chunks):
+        messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                    for i, chunk in enumerate(chunks)]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'query_string': b'stream=plant', 'headers': []}
+        with mock.patch.object(live, 'get_hub', return_value=self.hub):
+            asyncio.run(live.http_ingest(scope, receive, send))
+        return sent[0]['status'], json.loads(sent[1]['body'])
+
+    @override_settings(LIVE_MAX_LINE_BYTES=200)
+    def test_http_ingest_caps_the_line_length(self):
+        good = b'{"equipment_name": "P-1", "equipment_type": "Pump", "flowrate": 12, "pressure": 5.1, "temperature": 100}'
+        status, body = self.post_chunks([good + b'\n' + good[:50], good[50:] + b'\n', good])
+        self.assertEqual((status, body['accepted'], body['rejected']), (202, 3, 0))
+
+        status, body = self.post_chunks([good + b'\n' + b'x' * 150, b'x' * 150, b'x' * 150, b'\n'])
+        self.assertEqual((status, body['accepted']), (413, 1))
+        self.assertIn('longer than 200 bytes', body['error'])
+        self.assertEqual(self.hub.queue.qsize(), 4)
+
+
+class ParamParsingTests(TestCase):
+
+    def test_split_list(self):
+        self.assertEqual(split_list(' Pump, Valve,,'), ['Pump', 'Valve'])
+        self.assertEqual(split_list(None), [])
+
+    def test_int_params_fills_defaults_and_checks_bounds(self):
+        limits = {'bins': (30, 2, 200), 'points': (150, 10, 5000)}
+        self.assertEqual(int_params({'bins': '5', 'points': ''}, limits), {'bins': 5, 'points': 150})
+        for params, message in [({'bins': '1'}, "between 2 and 200"), ({'bins': 'many'}, "must be an integer")]:
+            with self.subTest(params=params), self.assertRaisesMessage(ValueError, message):
+                int_params(params, limits)
+
+    def test_chart_and_diff_options_share_the_parsing(self):
+        self.assertEqual(ChartOptions.from_params({'include': 'histogram', 'bins': '12'}).key(), 'histogram:12:150:20')
+        self.assertEqual(DiffOptions.from_params({'limit': '7'}).key(), '7:change')
+        with self.assertRaisesMessage(ValueError, "limit must be between 1 and 5000"):
+            DiffOptions.from_params({'limit': '0'})
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.frame = readings_frame(95, seed=4)
+
+    def upload(self, backend):
+        with override_settings(UPLOAD_STORAGE_BACKEND=backend, PARQUET_STORAGE_DIR=self.tmp.name):
+            upload, _ = store_frame(self.frame.copy(), 'plant.csv', {'detector': 'mad', 'contamination': 0.1})
+        return upload
+
+    def pages(self, upload, query):
+        rows, url, seen = [], f'/api/uploads/{upload.id}/data/?{query}', 0
+        while url:
+            with override_settings(PARQUET_STORAGE_DIR=self.tmp.name):
+                page = self.client.get(url).json()
+            rows.extend(page['results'])
+            url, seen = page['next'], seen + 1
+        return rows, seen
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for backend in ['orm', 'parquet']:
+            with self.subTest(backend=backend):
+                upload = self.upload(backend)
+                rows, pages = self.pages(upload, 'limit=10&fields=id,equipment_name')
+                self.assertEqual(pages, 10)
+                ids = [row['id'] for row in rows]
+                self.assertEqual(ids, sorted(set(ids)))
+                self.assertEqual([row['equipment_name'] for row in rows], list(self.frame['Equipment Name']))
+
+    def test_filters_apply_on_every_page(self):
+        expected = self.frame[(self.frame['Type'] == 'Pump') & (self.frame['Pressure'] >= 5)]
+        for backend in ['orm', 'parquet']:
+            with self.subTest(backend=backend):
+                upload = self.upload(backend)
+                query = 'limit=4&equipment_type=Pump&pressure_min=5&fields=equipment_name,pressure'
+                rows, _ = self.pages(upload, query)
+                self.assertEqual([row['equipment_name'] for row in rows], list(expected['Equipment Name']))
+                with override_settings(PARQUET_STORAGE_DIR=self.tmp.name):
+                    streamed = self.client.get(f'/api/uploads/{upload.id}/data/?all=true&{query}')
+                    streamed = json.loads(b''.join(streamed.streaming_content))
+                self.assertEqual(streamed, rows)
+
+    def test_bad_parameters_answer_400(self):
+        upload = self.upload('orm')
+        for query in ['limit=0', 'limit=5001', 'cursor=abc', 'fields=secret', 'is_anomaly=maybe']:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/uploads/{upload.id}/data/?{query}').status_code, 400)
+
+
+def csv_file(frame, name='plant.csv', **options):
+    return SimpleUploadedFile(name, frame.to_csv(index=False, **options).encode(), content_type='text/csv')
+
+
+class DuplicateUploadTests(TestCase):
+
+    def setUp(self):
+        self.frame = readings_frame(60, seed=5)[['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
+        patcher = mock.patch('core.retention.schedule_purge')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, upload, **data):
+        return self.client.post('/api/upload/', {'file': upload, 'detector': 'mad', **data})
+
+    def test_same_bytes_return_the_existing_upload(self):
+        first = self.post(csv_file(self.frame)).json()
+        again = self.post(csv_file(self.frame, name='copy.csv'))
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual((again.json()['duplicate'], again.json()['id']), (True, first['id']))
+        self.assertEqual(again.json()['rows'], 60)
+        self.assertEqual(FileUpload.objects.count(), 1)
+
+    def test_reexport_with_the_same_rows_is_a_duplicate(self):
+        first = self.post(csv_file(self.frame)).json()
+        reordered = self.frame[['Temperature', 'Type', 'Pressure', 'Equipment Name', 'Flowrate']].assign(Notes='x')
+        again = self.post(csv_file(reordered, lineterminator='\r\n')).json()
+        self.assertEqual((again['duplicate'], again['id']), (True, first['id']))
+        self.assertEqual(FileUpload.objects.count(), 1)
+
+    def test_other_rows_options_or_force_make_a_new_upload(self):
+        first = self.post(csv_file(self.frame)).json()
+        changed = self.frame.assign(Flowrate=self.frame['Flowrate'] + 1)
+        cases = [(csv_file(changed), {}), (csv_file(self.frame), {'contamination': '0.2'}),
+                 (csv_file(self.frame), {'force': 'true'})]
+        for upload, data in cases:
+            with self.subTest(data=data):
+                response = self.post(upload, **data).json()
+                self.assertFalse(response['duplicate'])
+                self.assertNotEqual(response['id'], first['id'])
+        self.assertEqual(FileUpload.objects.count(), 4)
+
+
+BAD_ROWS_CSV = (
+    "\ufeff Equipment Name ,Type,Flowrate,Pressure,Temperature,Notes\n"
+    "P-1,Pump,120,5.2,110,ok\n"
+    "P-2,Pump,,5.0,100,missing flowrate\n"
+    "P-3,Valve,12.5,4.1,90,fraction\n"
+    "P-4,Valve,80,high,95,text pressure\n"
+    f"{'X' * 101},Reactor,80,4.0,95,long name\n"
+    "P-6,Reactor,80,900,95,out of range\n"
+    " P-7 , Pump ,130,6.1, 105 ,padded\n"
+)
+
+
+class SchemaValidationTests(TestCase):
+
+    def setUp(self):
+        settings = override_settings(INGEST_VALUE_RANGES={'Pressure': (0, 400)})
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_bad_values_reject_their_row_only(self):
+        for engine in ['pyarrow', 'c']:
+            with self.subTest(engine=engine):
+                errors = RowErrors()
+                df = read_frame(io.BytesIO(BAD_ROWS_CSV.encode()), errors, engine=engine)
+                self.assertEqual(list(df.columns), COLUMN_NAMES)
+                self.assertEqual(list(df['Equipment Name']), ['P-1', 'P-7'])
+                self.assertEqual(list(df['Type']), ['Pump', 'Pump'])
+                self.assertEqual(str(df['Flowrate'].dtype), 'int64')
+                self.assertEqual(errors.rejected_rows, 5)
+                self.assertEqual([(e['row'], e['column'], e['reason'], e['value']) for e in errors.report()], [
+                    (3, 'Flowrate', 'missing value', ''),
+                    (4, 'Flowrate', 'not a whole number', '12.5'),
+                    (5, 'Pressure', 'not a number', 'high'),
+                    (6, 'Equipment Name', 'longer than 100 characters', 'X' * 101),
+                    (7, 'Pressure', 'above the maximum of 400', '900'),
+                ])
+
+    def test_chunks_number_rows_across_the_file(self):
+        for engine in ['pyarrow', 'c']:
+            with self.subTest(engine=engine):
+                errors = RowErrors()
+                frames = list(iter_frames(io.BytesIO(BAD_ROWS_CSV.encode()), 2, errors, engine=engine))
+                self.assertEqual(sum(len(frame) for frame in frames), 2)
+                self.assertEqual([e['row'] for e in errors.report()], [3, 4, 5, 6, 7])
+
+    def test_missing_columns_fail_the_whole_file(self):
+        with self.assertRaisesMessage(SchemaError, "Missing columns: ['Temperature']"):
+            read_frame(io.BytesIO(b"Equipment Name,Type,Flowrate,Pressure\nP-1,Pump,1,2\n"), RowErrors())
+
+    def test_details_are_capped_but_every_row_is_counted(self):
+        errors = RowErrors(limit=2)
+        read_frame(io.BytesIO(BAD_ROWS_CSV.encode()), errors)
+        self.assertEqual((errors.rejected_rows, errors.count, len(errors.details)), (5, 5, 2))
+
+    def test_upload_reports_rejected_rows(self):
+        with mock.patch('core.retention.schedule_purge'):
+            response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('bad.csv', BAD_ROWS_CSV.encode()),
+                                                         'detector': 'mad'})
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual((response.json()['rows'], response.json()['rejected_rows']), (2, 5))
+            self.assertEqual(len(response.json()['row_errors']), 5)
+
+            only_bad = BAD_ROWS_CSV.split('P-1,')[0] + "P-2,Pump,,5.0,100,x\n"
+            response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('worse.csv', only_bad.encode())})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("row 2 Flowrate: missing value", response.json()['error'])
+
+
+class RetentionTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.now = timezone.now()
+        settings = override_settings(RETENTION_MAX_UPLOADS=None, RETENTION_MAX_AGE_DAYS=None, RETENTION_MAX_ROWS=None,
+                                     INGEST_SPOOL_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def upload(self, rows=10, hours_ago=0, summary=True):
+        upload = stored_upload(readings_frame(rows), summary=summary)
+        FileUpload.objects.filter(pk=upload.pk).update(uploaded_at=self.now - timedelta(hours=hours_ago))
+        return upload.id
+
+    def expired(self, keep_ids=(), **limits):
+        with override_settings(**{f'RETENTION_{name.upper()}': value for name, value in limits.items()}):
+            return expired_uploads(keep_ids, now=self.now)
+
+    def test_count_limit_expires_the_oldest_first(self):
+        ids = [self.upload(hours_ago=hours) for hours in (40, 30, 20, 10)]
+        self.assertEqual(self.expired(max_uploads=2), ids[:2])
+        self.assertEqual(self.expired(max_uploads=2, keep_ids=[ids[0]]), ids[1:2])
+        self.assertEqual(self.expired(), [])
+
+    def test_age_and_row_limits(self):
+        ids = [self.upload(rows=rows, hours_ago=days * 24) for rows, days in ((30, 9), (30, 5), (30, 1))]
+        self.assertEqual(self.expired(max_age_days=7), ids[:1])
+        self.assertEqual(self.expired(max_rows=60), ids[:1])
+        self.assertEqual(self.expired(max_rows=10), ids[:2])
+
+    def test_newest_upload_is_always_kept(self):
+        newest = self.upload(rows=500, hours_ago=24 * 30)
+        self.assertNotIn(newest, self.expired(max_uploads=0, max_age_days=1, max_rows=1))
+
+    def test_uploads_still_being_written_are_skipped(self):
+        old = self.upload(hours_ago=50)
+        stale = self.upload(hours_ago=40, summary=False)
+        writing = self.upload(hours_ago=1, summary=False)
+        self.upload(hours_ago=0)
+        # The in-progress upload is never expired and does not use up a slot
+        self.assertEqual(self.expired(max_uploads=3), [])
+        self.assertEqual(self.expired(max_uploads=2), [old])
+        self.assertEqual(self.expired(max_uploads=1), [old, stale])
+        self.assertNotIn(writing, self.expired(max_uploads=0, max_age_days=0))
+
+    def test_newest_finished_upload_is_kept_behind_one_in_progress(self):
+        old = self.upload(hours_ago=10)
+        finished = self.upload(rows=500, hours_ago=5)
+        writing = self.upload(hours_ago=0, summary=False)
+        self.assertEqual(self.expired(max_uploads=1), [old])
+        self.assertEqual(self.expired(max_uploads=0, max_age_days=0, max_rows=1), [old])
+        self.assertNotIn(finished, self.expired(max_uploads=0))
+        self.assertNotIn(writing, self.expired(max_uploads=0))
+
+    def test_history_lists_what_retention_keeps(self):
+        ids = [self.upload(hours_ago=hours) for hours in (30, 20, 10, 0)]
+        for limit, expected in [(3, ids[:0:-1]), (None, ids[::-1])]:
+            with self.subTest(limit=limit), override_settings(RETENTION_MAX_UPLOADS=limit):
+                cache.clear()
+                history = self.client.get('/api/history/').json()
+                self.assertEqual([entry['id'] for entry in history], expected)
+
+    def test_reading_an_upload_in_progress_does_not_finish_it(self):
+        self.upload(hours_ago=20)
+        writing = FileUpload.objects.get(pk=self.upload(hours_ago=1, summary=False))
+        self.upload(hours_ago=0)
+        self.assertEqual(get_summary(writing).total_count, 10)
+        self.assertFalse(UploadSummary.objects.filter(upload=writing).exists())
+        self.assertNotIn(writing.id, self.expired(max_uploads=1))
+
+        legacy = FileUpload.objects.get(pk=self.upload(hours_ago=30, summary=False))
+        get_summary(legacy)
+        self.assertTrue(UploadSummary.objects.filter(upload=legacy).exists())
+
+    def test_purge_archives_then_deletes(self):
+        old, new = self.upload(rows=25, hours_ago=5), self.upload(rows=5)
+        archive = os.path.join(self.tmp.name, 'archive')
+        with override_settings(RETENTION_MAX_UPLOADS=1, RETENTION_ARCHIVE_DIR=archive), \
+                mock.patch('core.retention.close_old_connections'):
+            self.assertEqual([entry['id'] for entry in purge_expired(dry_run=True)], [old])
+            self.assertTrue(FileUpload.objects.filter(pk=old).exists())
+            purged = purge_expired()
+        self.assertEqual((purged[0]['id'], purged[0]['rows']), (old, 25))
+        self.assertEqual(list(FileUpload.objects.values_list('id', flat=True)), [new])
+        self.assertFalse(EquipmentData.objects.filter(upload_id=old).exists())
+        with gzip.open(purged[0]['archive'], 'rt') as archived:
+            self.assertEqual(len(archived.read().splitlines()), 26)
+
+
+class StoreFrameTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.frame = readings_frame(40, seed=6)
+        self.fields = {'detector': 'mad', 'contamination': 0.1}
+
+    def test_a_failed_store_leaves_nothing_behind(self):
+        for backend in ['orm', 'parquet']:
+            with self.subTest(backend=backend), \
+                    override_settings(UPLOAD_STORAGE_BACKEND=backend, PARQUET_STORAGE_DIR=self.tmp.name), \
+                    mock.patch.object(SummaryBuilder, 'save', side_effect=RuntimeError("disk full")):
+                with self.assertRaises(RuntimeError):
+                    store_frame(self.frame.copy(), 'plant.csv', self.fields)
+                self.assertEqual((FileUpload.objects.count(), EquipmentData.objects.count()), (0, 0))
+                self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_duplicate_found_inside_the_transaction_is_returned(self):
+        dedup = {'detector': 'mad', 'contamination': 0.1, 'baseline': None}
+        first, rows = store_frame(self.frame.copy(), 'plant.csv', self.fields, content_hash='a' * 64, dedup=dedup)
+        self.assertEqual(rows, 40)
+        again, rows = store_frame(self.frame.copy(), 'copy.csv', self.fields, content_hash='a' * 64, dedup=dedup)
+        self.assertEqual((again, rows), (first, None))
+        self.assertEqual(EquipmentData.objects.count(), 40)
+
+
+class StoreFrameLockRetryTests(TransactionTestCase):
+
+    def test_retry_sees_the_upload_stored_while_it_waited(self):
+        frame = readings_frame(30, seed=7)
+        fields = {'detector': 'mad', 'contamination': 0.1}
+        dedup = dict(fields, baseline=None)
+        write = ORMWriter.write
+        calls = []
+
+        def locked_once(writer, df):
+            calls.append(writer.upload.id)
+            if len(calls) == 1:
+                raise OperationalError("database is locked")
+            return write(writer, df)
+
+        def other_writer_commits(seconds):
+            # The identical upload from another worker lands during the backoff
+            store_frame(frame.copy(), 'other.csv', fields, frame_hash='f' * 64)
+
+        with mock.patch.object(ORMWriter, 'write', locked_once), \
+                mock.patch('core.concurrency.time.sleep', other_writer_commits), self.assertLogs('core.concurrency'):
+            upload, rows = store_frame(frame.copy(), 'plant.csv', fields, frame_hash='f' * 64, dedup=dedup)
+        self.assertEqual(len(calls), 2) # the locked attempt and the other writer's
+        self.assertIsNone(rows)
+        self.assertEqual(upload.file_name, 'other.csv')
+        self.assertEqual(FileUpload.objects.count(), 1)
+        self.assertEqual(EquipmentData.objects.count(), 30)
+
+
+class ChunkedIngestTests(TestCase):
+
+    def setUp(self):
+        self.frame = readings_frame(2_500, seed=8)[['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
+        self.csv = self.frame.to_csv(index=False).encode()
+        settings = override_settings(INGEST_CSV_ENGINE='c')
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def stored(self, upload):
+        rows = EquipmentData.objects.filter(upload=upload).order_by('id')
+        return pd.DataFrame(list(rows.values_list('equipment_name', 'equipment_type', 'flowrate', 'pressure',
+                                                  'temperature')), columns=COLUMN_NAMES)
+
+    def test_chunked_ingest_stores_the_same_rows_as_one_shot(self):
+        streamed = ingest_csv_stream(io.BytesIO(self.csv), 'big.csv', size=1_000, detector='mad')
+        self.assertEqual((streamed['rows'], streamed['chunks']), (2_500, 3))
+        whole = read_frame(io.BytesIO(self.csv), RowErrors())
+        pd.testing.assert_frame_equal(self.stored(streamed['upload']), whole)
+        upload = FileUpload.objects.get(pk=streamed['upload'].pk)
+        self.assertEqual(upload.summary.total_count, 2_500)
+        self.assertEqual(upload.frame_hash, FrameHasher().add(whole).hexdigest())
+
+    def test_failure_partway_leaves_no_rows(self):
+        calls = []
+
+        def failing(model, df):
+            calls.append(len(df))
+            if len(calls) == 2:
+                raise MemoryError("out of memory")
+            return score_chunk(model, df)
+
+        with mock.patch('core.ingest.score_chunk', failing), self.assertRaises(IngestError):
+            ingest_csv_stream(io.BytesIO(self.csv), 'big.csv', size=1_000, detector='mad')
+        self.assertEqual(calls, [1_000, 1_000])
+        self.assertEqual((FileUpload.objects.count(), EquipmentData.objects.count()), (0, 0))
+
+
+class InlineExecutor:
+    """
+    Runs submitted tasks on the spot, in place of the process pool.
+    """
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class AsyncIngestTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(INGEST_SPOOL_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # The job would close this test's connection, which holds its transaction
+        patchers = [mock.patch('core.jobs.get_executor', return_value=InlineExecutor())] + [
+            mock.patch(target) for target in ['core.jobs.close_old_connections', 'core.jobs.connections',
+                                              'core.retention.schedule_purge']]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, content):
+        response = self.client.post('/api/upload/', {'file': SimpleUploadedFile('plant.csv', content),
+                                                     'async': 'true', 'detector': 'mad'})
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(response.json()['status_url']).json()
+
+    def test_job_runs_to_done(self):
+        frame = readings_frame(80, seed=9)[COLUMN_NAMES]
+        job = self.submit(frame.to_csv(index=False).encode())
+        self.assertEqual((job['status'], job['stage'], job['progress']), ('done', 'done', 1.0))
+        self.assertEqual(job['result']['rows'], 80)
+        self.assertEqual(EquipmentData.objects.filter(upload_id=job['result']['id']).count(), 80)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_bad_file_fails_the_job(self):
+        job = self.submit(b"Equipment Name,Type\nP-1,Pump\n")
+        self.assertEqual((job['status'], job['stage']), ('failed', 'failed'))
+        self.assertIn("Missing columns", job['error'])
+        self.assertEqual(FileUpload.objects.count(), 0)
+
+    def test_crash_in_the_worker_fails_the_job(self):
+        with mock.patch('core.ingest.ingest_file', side_effect=RuntimeError("worker died")), \
+                self.assertLogs('core.jobs', 'ERROR'):
+            job = self.submit(b"Equipment Name,Type,Flowrate,Pressure,Temperature\nP-1,Pump,1,2.0,3\n")
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], "worker died")
+
+
+class DetectorTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_flags_stay_within_the_contamination_rate(self):
+        # Integer readings: robust z-scores take only a few distinct values
+        frame = readings_frame(3_000, seed=10).assign(Pressure=lambda f: f['Pressure'].round())
+        X = feature_matrix(frame)
+        for name in DETECTORS:
+            with self.subTest(detector=name):
+                detector = get_detector(name, 0.1).fit(X)
+                flagged = int(detector.predict(X).sum())
+                self.assertGreater(flagged, 0)
+                self.assertLessEqual(flagged, 300)
+
+    def test_ties_at_the_threshold_are_not_flagged(self):
+        X = np.array([[0.0, 0.0, 0.0]] * 90 + [[1.0, 0.0, 0.0]] * 9 + [[5.0, 0.0, 0.0]])
+        detector = get_detector('mad', 0.05).fit(X)
+        self.assertEqual(int(detector.predict(X).sum()), 1)
+
+    def test_grouped_model_fits_each_big_type(self):
+        frame = readings_frame(400, seed=11)
+        frame.loc[:9, 'Type'] = 'Compressor' # too few rows for a model of its own
+        model = GroupedModel('mad', 0.1).fit(frame)
+        self.assertEqual(sorted(model.groups), ['Pump', 'Reactor', 'Valve'])
+        scores, flags = model.score(frame.assign(Type=frame['Type'].replace('Valve', 'Unseen')))
+        np.testing.assert_array_equal(flags, scores > 0)
+        unseen = (frame['Type'] == 'Valve').to_numpy()
+        fallback = model.fallback
+        X = feature_matrix(frame)
+        np.testing.assert_allclose(scores[unseen], fallback.score(X[unseen]) - fallback.threshold_)
+        pumps = (frame['Type'] == 'Pump').to_numpy()
+        pump = model.groups['Pump']
+        np.testing.assert_allclose(scores[pumps], pump.score(X[pumps]) - pump.threshold_)
+
+    def test_stored_scores_and_rethresholding(self):
+        frame = readings_frame(500, seed=12)[COLUMN_NAMES]
+        for backend in ['orm', 'parquet']:
+            with self.subTest(backend=backend), \
+                    override_settings(UPLOAD_STORAGE_BACKEND=backend, PARQUET_STORAGE_DIR=self.tmp.name), \
+                    mock.patch('core.retention.schedule_purge'):
+                result = ingest_file(io.BytesIO(frame.to_csv(index=False).encode()), 'plant.csv', detector='mad',
+                                     contamination=0.1, force=True)
+                upload = result['upload']
+                stored = storage_for(upload).frame(upload, ['anomaly_score', 'is_anomaly'])
+                self.assertEqual(len(stored), 500)
+                np.testing.assert_array_equal(stored['is_anomaly'], stored['anomaly_score'] > 0)
+                self.assertEqual(int(stored['is_anomaly'].sum()), result['anomalies'])
+
+                url = f'/api/uploads/{upload.id}/threshold/'
+                self.assertEqual(self.client.post(url, {'threshold': 0}).json()['anomalies'], result['anomalies'])
+                self.assertEqual(self.client.post(url, {'threshold': 1e9}).json()['anomalies'], 0)
+                self.assertEqual(FileUpload.objects.get(pk=upload.pk).summary.anomaly_count, 0)
+                anomalies = self.client.post(url, {'contamination': 0.05}).json()['anomalies']
+                self.assertTrue(0 < anomalies <= 25)
+                self.assertEqual(self.client.post(url, {}).status_code, 400)
+
+
+class BaselineTrainingTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(MODEL_REGISTRY_DIR=self.tmp.name, INGEST_SPOOL_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.uploads = [stored_upload(readings_frame(60, seed=seed)).id for seed in (13, 14)]
+
+    def test_form_post_keeps_every_upload_id(self):
+        response = self.client.post('/api/models/', {'name': 'plant', 'uploads': self.uploads, 'detector': 'mad'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['version'], response.json()['trained_on']), (1, self.uploads))
+
+        again = self.client.post('/api/models/', {'name': 'plant', 'uploads': self.uploads[:1], 'detector': 'mad'},
+                                 content_type='application/json').json()
+        self.assertEqual((again['version'], again['trained_on']), (2, self.uploads[:1]))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp.name, 'plant'))), ['v1.joblib', 'v2.joblib'])
+
+    def test_rejects_upload_ids_that_are_not_integers(self):
+        for uploads in [['x'], [True], [{'id': 1}], [1.5], '3;4', []]:
+            with self.subTest(uploads=uploads):
+                response = self.client.post('/api/models/', {'name': 'plant', 'uploads': uploads},
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/models/', {'name': 'plant', 'uploads': ['3', 'abc']})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BaselineModel.objects.exists())
+
+    def test_failed_registration_removes_the_model_file(self):
+        with mock.patch.object(BaselineModel.objects, 'create', side_effect=IntegrityError("duplicate")), \
+                self.assertRaises(IntegrityError):
+            train_baseline('plant', self.uploads, 'mad', 0.1)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, 'plant')), [])
+
+    def test_resolve_rejects_references_that_are_not_text(self):
+        for reference in [5, None, ['plant'], {'name': 'plant'}]:
+            with self.subTest(reference=reference), self.assertRaises(RegistryError):
+                resolve(reference)
+        with self.assertRaises(ValueError):
+            detection_options({'baseline': 5})
+
+
+class StreamedJsonTests(TestCase):
+
+    def setUp(self):
+        upload = FileUpload.objects.create(file_name='plant.csv')
+        EquipmentData.objects.bulk_create([
+            EquipmentData(upload=upload, equipment_name=name, equipment_type=kind, flowrate=flow, pressure=pressure,
+                          temperature=temperature, is_anomaly=flag, anomaly_score=score)
+            for name, kind, flow, pressure, temperature, flag, score in [
+                ('P-1', 'Pump', 120, 5.2, 110, False, None),
+                ('Kühler ß-2', 'Wärmetauscher', -3, 0.1 + 0.2, 0, True, 1e-07),
+                ('泵 3 "quoted" \\ tab\t', 'Valve', 2_147_483_647, 1e16, -40, False, -0.0),
+                ('Ventil 😀', 'Valve', 0, -123.456789012345, 99, True, 12345.678),
+                ('', 'Reactor', 1, 5.0, 1, False, None),
+            ]
+        ])
+        self.rows = EquipmentData.objects.filter(upload=upload).order_by('id')
+
+    def test_bytes_match_the_serializer(self):
+        expected = JSONRenderer().render(EquipmentDataSerializer(self.rows, many=True).data)
+        for chunk_size in (1, 2, 2000):
+            with self.subTest(chunk_size=chunk_size):
+                streamed = b''.join(iter_json_rows(self.rows, DEFAULT_FIELDS, chunk_size=chunk_size))
+                self.assertEqual(streamed, expected)
+
+    def test_bytes_match_with_ids_and_null_scores(self):
+        class AllFields(serializers.ModelSerializer):
+            class Meta:
+                model = EquipmentData
+                fields = DATA_FIELDS
+
+        expected = JSONRenderer().render(AllFields(self.rows, many=True).data)
+        self.assertIn(b'"anomaly_score":null', expected)
+        self.assertEqual(b''.join(iter_json_rows(self.rows, DATA_FIELDS, chunk_size=3)), expected)
+
+    def test_empty_queryset(self):
+        none = self.rows.none()
+        self.assertEqual(b''.join(iter_json_rows(none, DEFAULT_FIELDS)),
+                         JSONRenderer().render(EquipmentDataSerializer(none, many=True).data))
+
+
+class StorageParityTests(TestCase):
+    """
+    The same upload stored by each backend reads back the same.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(PARQUET_STORAGE_DIR=self.tmp.name, INGEST_SPOOL_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        frame = readings_frame(1_200, seed=15)
+        frame.loc[::7, 'anomaly_score'] = np.nan # uploads scored before scores were stored
+        self.uploads = {}
+        for backend in ['orm', 'parquet']:
+            with override_settings(UPLOAD_STORAGE_BACKEND=backend):
+                self.uploads[backend], _ = store_frame(frame.copy(), f'{backend}.csv', {'detector': 'mad'})
+
+    def both(self, read):
+        results = [read(storage_for(upload), upload) for upload in self.uploads.values()]
+        return [result.reset_index(drop=True) if isinstance(result, pd.DataFrame) else result for result in results]
+
+    def assertSameFrames(self, orm, parquet):
+        self.assertGreater(len(orm), 0)
+        # The ORM gives None for a missing score, pyarrow NaN
+        scores = {'anomaly_score': float} if 'anomaly_score' in orm else {}
+        pd.testing.assert_frame_equal(orm.astype(scores), parquet.astype(scores), check_dtype=False)
+
+    def test_iter_frames_with_and_without_filters(self):
+        fields = [field for field in DATA_FIELDS if field != 'id']
+        queries = [None, DataQuery.from_params({'equipment_type': 'Pump,Valve', 'is_anomaly': 'false',
+                                                'pressure_min': '4.5', 'temperature_max': '120'})]
+        for query in queries:
+            with self.subTest(query=query and 'filtered'):
+                orm, parquet = self.both(lambda backend, upload: pd.concat(
+                    backend.iter_frames(upload, fields, query, chunk_size=100), ignore_index=True))
+                self.assertSameFrames(orm, parquet)
+
+    def test_pages_follow_the_same_rows(self):
+        def pages(backend, upload):
+            rows, cursor = [], None
+            while True:
+                params = {'limit': '250', 'equipment_type': 'Reactor', 'fields': 'equipment_name,pressure,is_anomaly'}
+                if cursor is not None:
+                    params['cursor'] = str(cursor)
+                page, cursor = backend.page(upload, DataQuery.from_params(params))
+                rows.extend(page)
+                if cursor is None:
+                    return rows
+
+        orm, parquet = self.both(pages)
+        self.assertEqual(orm, parquet)
+        self.assertGreater(len(orm), 250)
+
+    def test_apply_threshold(self):
+        for threshold in (0.0, 0.5, -1.0):
+            with self.subTest(threshold=threshold):
+                orm, parquet = self.both(lambda backend, upload: backend.apply_threshold(upload, threshold))
+                self.assertEqual(orm, parquet)
+                orm, parquet = self.both(lambda backend, upload: backend.frame(upload, ['is_anomaly']))
+                self.assertSameFrames(orm, parquet)
+
+    def test_purge(self):
+        for backend, upload in self.uploads.items():
+            with self.subTest(backend=backend):
+                self.assertEqual(retention._purge(upload), 1_200)
+                self.assertFalse(FileUpload.objects.filter(pk=upload.pk).exists())
+        self.assertEqual(EquipmentData.objects.count(), 0)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+class ReportRenderTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.frame = readings_frame(300, seed=16)
+        self.upload = stored_upload(self.frame)
+        patcher = mock.patch('core.reports.close_old_connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def render(self):
+        blocks = []
+        draw = reports._draw_row_block
+
+        def recording(page, frame):
+            blocks.append(frame)
+            draw(page, frame)
+
+        with mock.patch.object(reports, '_draw_row_block', recording):
+            path = reports.render_report(self.upload.id, os.path.join(self.tmp.name, 'report.pdf'))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(5), b'%PDF-')
+        # The first block is the top anomalies table
+        return pd.concat(blocks[1:], ignore_index=True)
+
+    def test_lists_every_row_under_the_cap(self):
+        with override_settings(REPORT_MAX_ROWS=300, REPORT_CHUNK_SIZE=70):
+            rows = self.render()
+        self.assertEqual(list(rows['equipment_name']), list(self.frame['Equipment Name']))
+
+    def test_lists_only_flagged_rows_over_the_cap(self):
+        flagged = self.frame[self.frame['is_anomaly']]
+        with override_settings(REPORT_MAX_ROWS=10, REPORT_CHUNK_SIZE=4):
+            rows = self.render()
+        self.assertEqual(list(rows['equipment_name']), list(flagged['Equipment Name'][:10]))
+        self.assertTrue(rows['is_anomaly'].all())
+
+    def test_version_changes_within_a_second(self):
+        summary = self.upload.summary
+        summary.computed_at = summary.computed_at.replace(microsecond=100_000)
+        UploadSummary.objects.filter(pk=summary.pk).update(computed_at=summary.computed_at)
+        before = reports.report_version(FileUpload.objects.get(pk=self.upload.pk))
+        UploadSummary.objects.filter(pk=summary.pk).update(computed_at=summary.computed_at + timedelta(milliseconds=300))
+        self.assertNotEqual(reports.report_version(FileUpload.objects.get(pk=self.upload.pk)), before)
+
+
+class ChartTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.frame = readings_frame(1_000, seed=20)
+        self.upload = stored_upload(self.frame)
+        self.url = f'/api/uploads/{self.upload.id}/chart/'
+
+    def test_payload_shape_and_bounds(self):
+        response = self.client.get(self.url, {'bins': 12, 'points': 50, 'grid': 8})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload['rows'], 1_000)
+        flagged = int(self.frame['is_anomaly'].sum())
+
+        for variable in ['flowrate', 'pressure', 'temperature']:
+            histogram = payload['histogram'][variable]
+            self.assertEqual(len(histogram['edges']), 13)
+            self.assertEqual(sum(histogram['counts']), 1_000)
+            self.assertEqual(sum(histogram['anomalies']), flagged)
+
+            series = payload['series'][variable]
+            self.assertEqual(len(series['x']), 50)
+            self.assertEqual((series['x'][0], series['x'][-1]), (0, 999))
+            self.assertEqual(series['x'], sorted(series['x']))
+            expected = [i for i, row in enumerate(series['x']) if self.frame['is_anomaly'].iloc[row]]
+            self.assertEqual(series['anomalies'], expected)
+
+        self.assertEqual(sorted(payload['box']), ['Pump', 'Reactor', 'Valve'])
+        self.assertEqual(sum(stats['count'] for stats in payload['box'].values()), 1_000)
+        for stats in payload['box'].values():
+            box = stats['pressure']
+            self.assertEqual([box[k] for k in ['whisker_low', 'q1', 'median', 'q3', 'whisker_high']],
+                             sorted(box[k] for k in ['whisker_low', 'q1', 'median', 'q3', 'whisker_high']))
+
+        density = payload['density']
+        self.assertEqual(np.array(density['counts']).shape, (8, 8))
+        self.assertEqual(int(np.sum(density['counts'])), 1_000)
+        self.assertEqual(int(np.sum(density['anomalies'])), flagged)
+
+        again = self.client.get(self.url, {'bins': 12, 'points': 50, 'grid': 8},
+                                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_include_picks_sections(self):
+        payload = self.client.get(self.url, {'include': 'series,density'}).json()
+        self.assertEqual(sorted(payload), ['density', 'id', 'rows', 'series'])
+        self.assertEqual(len(payload['series']['pressure']['x']), 150)
+
+    def test_bad_params_are_rejected(self):
+        for params in [{'bins': 1}, {'bins': 'ten'}, {'points': 5001}, {'grid': 0}, {'include': 'pie'}]:
+            with self.subTest(params=params):
+                with self.assertRaises(ValueError):
+                    ChartOptions.from_params(params)
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.client.get(f'/api/uploads/{self.upload.id + 1}/chart/').status_code, 404)
+
+    def test_lttb_keeps_the_ends_and_returns_threshold_points(self):
+        rng = np.random.default_rng(21)
+        x = np.arange(1_000, dtype=float)
+        y = rng.normal(size=1_000)
+        y[500] = 50.0
+        for threshold in [3, 10, 150, 999]:
+            with self.subTest(threshold=threshold):
+                keep = lttb(x, y, threshold)
+                self.assertEqual(len(keep), threshold)
+                self.assertEqual((keep[0], keep[-1]), (0, 999))
+                self.assertTrue((np.diff(keep) > 0).all())
+                self.assertIn(500, keep)
+        np.testing.assert_array_equal(lttb(x, y, 1_000), np.arange(1_000))
+        np.testing.assert_array_equal(lttb(x[:5], y[:5], 2), np.arange(5))
+
+
+def zip_file(members, name='plants.zip'):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for member, content in members.items():
+            archive.writestr(member, content)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='application/zip')
+
+
+class BatchUploadTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings = override_settings(INGEST_SPOOL_DIR=self.tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patchers = [mock.patch('core.jobs.get_executor', return_value=InlineExecutor())] + [
+            mock.patch(target) for target in ['core.batch.close_old_connections', 'core.batch.schedule_purge']]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.frames = [readings_frame(200, seed=30 + i)[COLUMN_NAMES] for i in range(3)]
+
+    def post(self, files, **fields):
+        return self.client.post('/api/upload/batch/', dict(fields, files=files, detector='mad'))
+
+    def test_a_bad_file_fails_alone(self):
+        files = [csv_file(self.frames[0], 'a.csv'), csv_file(self.frames[1].drop(columns='Pressure'), 'b.csv'),
+                 zip_file({'c.csv': self.frames[2].to_csv(index=False)})]
+        response = self.post(files)
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual((body['processed'], body['failed']), (2, 1))
+        results = {f['file']: f for f in body['files']}
+        self.assertIn('Missing columns', results['b.csv']['error'])
+        for name in ['a.csv', 'c.csv']:
+            upload = FileUpload.objects.get(pk=results[name]['id'])
+            self.assertEqual((upload.file_name, upload.summary.total_count), (name, 200))
+        self.assertEqual((FileUpload.objects.count(), EquipmentData.objects.count()), (2, 400))
+        self.assertFalse(os.listdir(self.tmp.name))
+
+        response = self.post([csv_file(self.frames[1].drop(columns='Pressure'), 'b.csv')])
+        self.assertEqual(response.status_code, 400)
+
+    def test_combine_stores_one_upload(self):
+        def files():
+            return [csv_file(frame, f'{i}.csv') for i, frame in enumerate(self.frames)]
+
+        response = self.post(files(), combine='true', name='week 12')
+        self.assertEqual(response.status_code, 201)
+        combined = response.json()['combined']
+        self.assertEqual(combined['rows'], 600)
+        upload = FileUpload.objects.get()
+        self.assertEqual((upload.file_name, upload.summary.total_count), ('week 12', 600))
+        self.assertEqual(upload.summary.anomaly_count, combined['anomalies'])
+        stored = storage_for(upload).frame(upload, ['equipment_name', 'pressure'])
+        np.testing.assert_allclose(stored['pressure'], pd.concat(self.frames)['Pressure'])
+
+        again = self.post(files(), combine='true')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['combined']['id'], upload.id)
+        self.assertEqual(FileUpload.objects.count(), 1)
+
+    def test_only_safe_csv_members_are_read(self):
+        content = self.frames[0].to_csv(index=False)
+        archive = zip_file({'data/good.csv': content, '../escape.csv': content, '/root.csv': content,
+                            'notes.txt': 'not a csv', '__MACOSX/data/._good.csv': content, 'data/.hidden.csv': content})
+        response = self.post([archive])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([f['file'] for f in response.json()['files']], ['data/good.csv'])
+
+        response = self.post([zip_file({'../escape.csv': content, 'notes.txt': 'x'})])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('contains no CSV files', response.json()['error'])
+        self.assertEqual(FileUpload.objects.count(), 1)
+        self.assertFalse(os.listdir(self.tmp.name))
+
+        encrypted = zipfile.ZipInfo('locked.csv')
+        encrypted.flag_bits |= 0x1
+        self.assertFalse(is_csv_member(encrypted))
+
+
+def units_frame(units):
+    """
+    One row per (name, type, flowrate, pressure, temperature, is_anomaly, score).
+    """
+    return pd.DataFrame(units, columns=['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature',
+                                        'is_anomaly', 'anomaly_score'])
+
+
+class TrendsAndDiffTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.a = stored_upload(units_frame([
+            ('P-1', 'Pump', 100, 5.0, 100, False, -0.1),
+            ('P-1', 'Pump', 110, 5.0, 100, False, -0.2),
+            ('P-2', 'Pump', 200, 6.0, 90, True, 0.3),
+            ('V-1', 'Valve', 50, 2.0, 60, False, -0.2),
+            ('R-1', 'Reactor', 10, 9.0, 300, False, -0.3),
+        ]), file_name='a.csv')
+        self.b = stored_upload(units_frame([
+            ('P-1', 'Pump', 130, 5.5, 100, True, 0.4),
+            ('P-2', 'Pump', 200, 6.0, 90, False, -0.05),
+            ('V-1', 'Valve', 50, 2.0, 60, False, -0.2),
+            ('C-1', 'Compressor', 20, 8.0, 40, True, 0.2),
+        ]), file_name='b.csv')
+
+    def diff(self, params=None, **headers):
+        return self.client.get(f'/api/uploads/{self.a.id}/diff/{self.b.id}/', params, **headers)
+
+    def test_diff_of_two_known_uploads(self):
+        response = self.diff()
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual((payload['a']['id'], payload['b']['id']), (self.a.id, self.b.id))
+        self.assertEqual(payload['equipment'], {'common': 3, 'added': 1, 'removed': 1, 'newly_anomalous': 1,
+                                                'resolved': 1, 'added_anomalous': 1})
+
+        [newly] = payload['newly_anomalous']
+        self.assertEqual((newly['equipment_name'], newly['status']), ('P-1', 'new_anomaly'))
+        self.assertEqual(newly['flowrate'], {'a': 105.0, 'b': 130.0, 'delta': 25.0})
+        self.assertEqual(newly['pressure'], {'a': 5.0, 'b': 5.5, 'delta': 0.5})
+        self.assertEqual(newly['anomalies'], {'a': 0, 'b': 1})
+        self.assertEqual(newly['anomaly_score'], {'a': -0.1, 'b': 0.4, 'delta': 0.5})
+        # Largest shift in standard deviations of the type in `a`
+        pump = {e['equipment_type']: e for e in FileUpload.objects.get(pk=self.a.pk).summary.distribution}['Pump']
+        expected = max(25 / pump['flowrate']['std'], 0.5 / pump['pressure']['std'])
+        self.assertAlmostEqual(newly['change'], expected, places=4)
+
+        [resolved] = payload['resolved']
+        self.assertEqual((resolved['equipment_name'], resolved['status'], resolved['change']), ('P-2', 'resolved', 0.0))
+        self.assertEqual(payload['added'], [{'equipment_name': 'C-1', 'equipment_type': 'Compressor', 'anomalies': 1}])
+        self.assertEqual(payload['removed'], [{'equipment_name': 'R-1', 'equipment_type': 'Reactor', 'anomalies': 0}])
+        self.assertEqual([row['equipment_name'] for row in payload['changes']], ['P-1', 'P-2', 'V-1'])
+
+        drift = payload['drift']
+        self.assertEqual(sorted(drift), ['Compressor', 'Pump', 'Reactor', 'Valve'])
+        self.assertEqual(drift['Pump']['count'], {'a': 3, 'b': 2})
+        self.assertEqual(drift['Pump']['paired_units'], 2)
+        self.assertAlmostEqual(drift['Pump']['flowrate']['mean_a'], 410 / 3, places=4)
+        self.assertAlmostEqual(drift['Pump']['flowrate']['delta'], 165 - 410 / 3, places=4)
+        self.assertEqual(drift['Pump']['flowrate']['paired_delta'], 12.5)
+        self.assertEqual(drift['Pump']['anomaly_rate']['delta'], round(0.5 - 1 / 3, 4))
+        self.assertEqual(drift['Compressor']['count'], {'a': 0, 'b': 1})
+        self.assertIsNone(drift['Compressor']['flowrate']['delta'])
+
+        self.assertEqual(self.diff(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_diff_sort_and_limit(self):
+        rows = self.diff({'sort': 'anomaly_score', 'limit': 2}).json()['changes']
+        self.assertEqual([row['equipment_name'] for row in rows], ['P-1', 'P-2'])
+        self.assertEqual(rows[1]['anomaly_score']['delta'], -0.35)
+
+    def test_trends_over_both_uploads(self):
+        response = self.client.get('/api/trends/', {'equipment': 'P-1,R-1,X-9', 'type': 'Pump,Compressor'})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual([u['id'] for u in payload['uploads']], [self.a.id, self.b.id])
+        self.assertEqual(sorted(payload['types']), ['Compressor', 'Pump'])
+        pump = payload['types']['Pump']
+        self.assertEqual(pump['count'], [3, 2])
+        self.assertEqual(pump['drift']['flowrate']['delta'], round(165 - 410 / 3, 4))
+        self.assertEqual(payload['types']['Compressor']['count'], [0, 1])
+        self.assertEqual(payload['types']['Compressor']['anomaly_rate'], [None, 1.0])
+
+        units = payload['equipment']
+        self.assertEqual(units['P-1']['flowrate'], [105.0, 130.0])
+        self.assertEqual(units['P-1']['is_anomaly'], [False, True])
+        self.assertEqual(units['R-1']['anomalies'], [0, None])
+        self.assertEqual((units['X-9']['uploads'], units['X-9']['equipment_type']), (0, None))
+
+        latest = self.client.get('/api/trends/', {'uploads': 1}).json()
+        self.assertEqual([u['id'] for u in latest['uploads']], [self.b.id])
+
+    def test_bad_params_are_rejected(self):
+        for params in [{'sort': 'colour'}, {'limit': 0}, {'limit': 'all'}, {'limit': 5001}]:
+            with self.subTest(params=params):
+                response = self.diff(params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        self.assertEqual(self.client.get(f'/api/uploads/{self.a.id}/diff/{self.b.id + 1}/').status_code, 404)
+
+        too_many = ','.join(f'P-{i}' for i in range(51))
+        for params in [{'uploads': 0}, {'uploads': 'few'}, {'equipment': too_many}]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/trends/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
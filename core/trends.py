@@ -0,0 +1,521 @@
+# core/trends.py
+"""
+Cross-upload comparisons for /api/trends/ and /api/uploads/<a>/diff/<b>/.
+
+Uploads are joined on equipment_name. Two precomputed inputs keep both
+endpoints cheap however many uploads are retained:
+
+  * per-type statistics (count, anomalies, mean and std of each variable)
+    are part of UploadSummary.distribution, written at ingest time, so
+    per-type trends over hundreds of uploads are a single query;
+  * an equipment profile per upload (per unit: type, readings averaged
+    over its rows, anomalous rows and highest anomaly score) is built once
+    from the stored rows and cached like the charts, keyed on the upload's
+    summary version. Profiles are NumPy arrays sorted by name, so joining
+    two uploads or looking units up across all of them is
+    np.intersect1d / np.searchsorted instead of a DataFrame merge.
+
+Diffs are cached per upload pair and options; trends go through the
+response cache of core/caching.py. With hundreds of large uploads, give
+the cache room for a profile per upload (MAX_ENTRIES, or the file backend
+shared by all workers).
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+from django.core.cache import cache
+
+from .filters import int_params, split_list
+from .metrics import stage
+from .storage import storage_for
+from .summaries import build_summary, get_summary, has_type_stats
+
+VARIABLES = ['flowrate', 'pressure', 'temperature']
+PROFILE_FIELDS = ['equipment_name', 'equipment_type'] + VARIABLES + ['is_anomaly', 'anomaly_score']
+SORT_KEYS = ['change'] + VARIABLES + ['anomaly_score']
+
+# parameter -> (default, min, max)
+DIFF_LIMITS = {'limit': (100, 1, 5000)}
+MAX_TREND_EQUIPMENT = 50
+
+
+class DiffOptions:
+
+    def __init__(self, limit=100, sort='change'):
+        self.limit = limit
+        self.sort = sort
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Raises ValueError with a message fit for a 400 response.
+        """
+        sort = params.get('sort') or 'change'
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort '{sort}'. Choose from: {SORT_KEYS}")
+        return cls(sort=sort, **int_params(params, DIFF_LIMITS))
+
+    def key(self):
+        return f"{self.limit}:{self.sort}"
+
+
+class TrendOptions:
+
+    def __init__(self, uploads=None, equipment=None, types=None):
+        self.uploads = uploads # the last N uploads; None for all retained
+        self.equipment = equipment or []
+        self.types = types or []
+
+    @classmethod
+    def from_params(cls, params):
+        """
+        Raises ValueError with a message fit for a 400 response.
+        """
+        uploads = params.get('uploads')
+        if uploads not in (None, ''):
+            try:
+                uploads = int(uploads)
+            except ValueError:
+                raise ValueError("uploads must be an integer")
+            if uploads < 1:
+                raise ValueError("uploads must be at least 1")
+        else:
+            uploads = None
+        equipment = split_list(params.get('equipment'))
+        if len(equipment) > MAX_TREND_EQUIPMENT:
+            raise ValueError(f"At most {MAX_TREND_EQUIPMENT} equipment names per request")
+        return cls(uploads=uploads, equipment=equipment, types=split_list(params.get('type')))
+
+
+def type_summary(upload):
+    """
+    The upload's summary, rebuilt once if it predates the per-type stats.
+    """
+    summary = get_summary(upload)
+    if not has_type_stats(summary):
+        summary = build_summary(upload)
+    return summary
+
+
+def summary_version(upload):
+    return int(type_summary(upload).computed_at.timestamp() * 1000)
+
+
+# Equipment profiles
+
+def profile_cache_key(upload):
+    return f"trends:profile:{upload.id}:{summary_version(upload)}"
+
+
+def get_profiles(uploads):
+    """
+    {upload id: profile} for `uploads`, built for the ones not cached yet.
+    """
+    keys = {upload.id: profile_cache_key(upload) for upload in uploads}
+    cached = cache.get_many(list(keys.values()))
+    profiles, built = {}, {}
+    for upload in uploads:
+        profile = cached.get(keys[upload.id])
+        if profile is None:
+            profile = built[keys[upload.id]] = build_profile(upload)
+        profiles[upload.id] = profile
+    if built:
+        cache.set_many(built, None)
+    return profiles
+
+
+@stage('profile')
+def build_profile(upload):
+    """
+    Per unit of one upload, sorted by name: type, row count, mean of each
+    variable, anomalous rows and the highest anomaly score (NaN if the
+    upload was not scored). Chunks are reduced to partial sums as they are
+    read, so memory follows the number of units, not rows.
+    """
+    partials = []
+    for frame in storage_for(upload).iter_frames(upload, PROFILE_FIELDS):
+        values = frame[VARIABLES].apply(pd.to_numeric, errors='coerce').astype('float64')
+        values['is_anomaly'] = frame['is_anomaly'].astype(bool)
+        values['anomaly_score'] = pd.to_numeric(frame['anomaly_score'], errors='coerce').astype('float64')
+        values['equipment_type'] = frame['equipment_type'].astype(str)
+        grouped = values.groupby(frame['equipment_name'].astype(str), sort=False)
+        partials.append(grouped.agg(
+            equipment_type=('equipment_type', 'last'),
+            rows=('is_anomaly', 'size'),
+            anomalies=('is_anomaly', 'sum'),
+            score=('anomaly_score', 'max'),
+            **{f'{v}_sum': (v, 'sum') for v in VARIABLES},
+            **{f'{v}_n': (v, 'count') for v in VARIABLES},
+        ))
+    if not partials:
+        return _empty_profile()
+
+    grouped = pd.concat(partials).groupby(level=0, sort=False)
+    totals = grouped.sum(numeric_only=True)
+    totals['score'] = grouped['score'].max()
+    totals['equipment_type'] = grouped['equipment_type'].last()
+
+    names = totals.index.to_numpy(dtype=str)
+    order = np.argsort(names, kind='stable')
+    profile = {
+        # Fixed-width unicode arrays: sortable, searchable and cheap to pickle
+        'names': names[order],
+        'types': totals['equipment_type'].to_numpy(dtype=str)[order],
+        'rows': totals['rows'].to_numpy(dtype=np.int64)[order],
+        'anomalies': totals['anomalies'].to_numpy(dtype=np.int64)[order],
+        'score': totals['score'].to_numpy(dtype=np.float64)[order],
+    }
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for v in VARIABLES:
+            profile[v] = (totals[f'{v}_sum'].to_numpy(dtype=np.float64)
+                          / totals[f'{v}_n'].to_numpy(dtype=np.float64))[order]
+    return profile
+
+
+def _empty_profile():
+    profile = {'names': np.empty(0, dtype=str), 'types': np.empty(0, dtype=str),
+               'rows': np.empty(0, np.int64), 'anomalies': np.empty(0, np.int64), 'score': np.empty(0)}
+    profile.update({v: np.empty(0) for v in VARIABLES})
+    return profile
+
+
+# Diff of two uploads
+
+def diff_cache_key(a, b, options):
+    raw = f"diff:{a.id}:{summary_version(a)}:{b.id}:{summary_version(b)}:{options.key()}"
+    return 'diff:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_diff(a, b, options):
+    """
+    Returns (payload, cache key); the key doubles as the ETag.
+    """
+    key = diff_cache_key(a, b, options)
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_diff(a, b, options)
+        cache.set(key, payload, None)
+    return payload, key
+
+
+@stage('diff')
+def build_diff(a, b, options):
+    """
+    What changed from upload `a` to upload `b`: per-unit deltas of the units
+    in both, units that turned anomalous or recovered, units that appeared
+    or disappeared, and per-type drift.
+    """
+    profiles = get_profiles([a, b])
+    pa, pb = profiles[a.id], profiles[b.id]
+    _, ia, ib = np.intersect1d(pa['names'], pb['names'], assume_unique=True, return_indices=True)
+    only_a = np.ones(len(pa['names']), dtype=bool)
+    only_a[ia] = False
+    only_b = np.ones(len(pb['names']), dtype=bool)
+    only_b[ib] = False
+
+    was, now = pa['anomalies'][ia] > 0, pb['anomalies'][ib] > 0
+    deltas = {v: pb[v][ib] - pa[v][ia] for v in VARIABLES}
+    dist_a = _by_type(type_summary(a).distribution)
+    dist_b = _by_type(type_summary(b).distribution)
+    types = pb['types'][ib]
+    change = _change_scores(types, deltas, dist_a, dist_b)
+
+    newly = np.flatnonzero(~was & now)
+    resolved = np.flatnonzero(was & ~now)
+    added = np.flatnonzero(only_b)
+    removed = np.flatnonzero(only_a)
+
+    def rows(index):
+        return _unit_rows(pa, pb, ia[index], ib[index], change[index], was[index], now[index])
+
+    return {
+        'a': _upload_info(a),
+        'b': _upload_info(b),
+        'equipment': {
+            'common': int(len(ia)),
+            'added': int(len(added)),
+            'removed': int(len(removed)),
+            'newly_anomalous': int(len(newly)),
+            'resolved': int(len(resolved)),
+            'added_anomalous': int((pb['anomalies'][added] > 0).sum()),
+        },
+        'changes': rows(_top(_sort_key(options.sort, deltas, change, pa['score'][ia], pb['score'][ib]), options.limit)),
+        # Most changed first within each list
+        'newly_anomalous': rows(newly[_top(change[newly], options.limit)]),
+        'resolved': rows(resolved[_top(change[resolved], options.limit)]),
+        'added': _names(pb, added, options.limit),
+        'removed': _names(pa, removed, options.limit),
+        'drift': type_drift(dist_a, dist_b, types, deltas),
+    }
+
+
+def _change_scores(types, deltas, dist_a, dist_b):
+    """
+    Largest change of a unit across the variables, in standard deviations
+    of its type (in `a`, or `b` for a type new in `b`). NaN-free: units
+    without a usable std score 0.
+    """
+    names, codes = np.unique(types, return_inverse=True)
+    scores = np.zeros(len(types))
+    for v in VARIABLES:
+        stds = np.array([_std(dist_a.get(t, {}), v) or _std(dist_b.get(t, {}), v) or np.nan for t in names])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scaled = np.abs(deltas[v]) / stds[codes] if len(names) else np.empty(0)
+        scores = np.fmax(scores, np.nan_to_num(scaled, nan=0.0, posinf=0.0))
+    return scores
+
+
+def _sort_key(sort, deltas, change, score_a, score_b):
+    if sort == 'change':
+        return change
+    if sort == 'anomaly_score':
+        return np.nan_to_num(np.abs(score_b - score_a), nan=0.0)
+    return np.nan_to_num(np.abs(deltas[sort]), nan=0.0)
+
+
+def _top(key, limit):
+    """
+    Indices of the `limit` largest values of `key`, largest first.
+    """
+    if len(key) > limit:
+        head = np.argpartition(-key, limit - 1)[:limit]
+        return head[np.argsort(-key[head], kind='stable')]
+    return np.argsort(-key, kind='stable')
+
+
+def _unit_rows(pa, pb, ia, ib, change, was, now):
+    status = np.where(now, np.where(was, 'anomalous', 'new_anomaly'), np.where(was, 'resolved', 'normal'))
+    columns = {
+        'equipment_name': pb['names'][ib].tolist(),
+        'equipment_type': pb['types'][ib].tolist(),
+        'status': status.tolist(),
+        'change': _round(change),
+    }
+    for v in VARIABLES + ['score']:
+        before, after = pa[v][ia], pb[v][ib]
+        columns[v] = list(zip(_round(before), _round(after), _round(after - before)))
+    columns['anomalies'] = list(zip(pa['anomalies'][ia].tolist(), pb['anomalies'][ib].tolist()))
+
+    result = []
+    for i in range(len(ib)):
+        row = {key: columns[key][i] for key in ('equipment_name', 'equipment_type', 'status', 'change')}
+        for v in VARIABLES:
+            row[v] = dict(zip(('a', 'b', 'delta'), columns[v][i]))
+        row['anomaly_score'] = dict(zip(('a', 'b', 'delta'), columns['score'][i]))
+        row['anomalies'] = dict(zip(('a', 'b'), columns['anomalies'][i]))
+        result.append(row)
+    return result
+
+
+def _names(profile, index, limit):
+    index = index[:limit]
+    return [
+        {'equipment_name': name, 'equipment_type': eq_type, 'anomalies': anomalies}
+        for name, eq_type, anomalies in zip(profile['names'][index].tolist(), profile['types'][index].tolist(),
+                                            profile['anomalies'][index].tolist())
+    ]
+
+
+def type_drift(dist_a, dist_b, paired_types, deltas):
+    """
+    Per type: count and anomaly rate in both uploads and, per variable, the
+    shift of the mean (absolute, relative, and as an effect size over the
+    pooled std) plus the mean per-unit delta over the units in both.
+    """
+    names, codes = np.unique(paired_types, return_inverse=True)
+    paired = {}
+    for v in VARIABLES:
+        valid = ~np.isnan(deltas[v])
+        sums = np.bincount(codes[valid], weights=deltas[v][valid], minlength=len(names))
+        counts = np.bincount(codes[valid], minlength=len(names))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            paired[v] = dict(zip(names.tolist(), sums / counts))
+    units = dict(zip(names.tolist(), np.bincount(codes, minlength=len(names)).tolist()))
+
+    drift = {}
+    for eq_type in sorted(set(dist_a) | set(dist_b)):
+        ea, eb = dist_a.get(eq_type, {}), dist_b.get(eq_type, {})
+        rate_a, rate_b = ea.get('anomaly_rate'), eb.get('anomaly_rate')
+        entry = {
+            'count': {'a': ea.get('count', 0), 'b': eb.get('count', 0)},
+            'paired_units': units.get(eq_type, 0),
+            'anomaly_rate': {'a': rate_a, 'b': rate_b, 'delta': _delta(rate_a, rate_b)},
+        }
+        for v in VARIABLES:
+            mean_a, mean_b = _mean(ea, v), _mean(eb, v)
+            std_a, std_b = _std(ea, v), _std(eb, v)
+            delta = _delta(mean_a, mean_b)
+            pooled = np.sqrt((std_a ** 2 + std_b ** 2) / 2) if std_a is not None and std_b is not None else 0
+            entry[v] = {
+                'mean_a': mean_a,
+                'mean_b': mean_b,
+                'delta': delta,
+                'relative': round(delta / mean_a, 4) if delta is not None and mean_a else None,
+                'effect_size': round(delta / pooled, 4) if delta is not None and pooled else None,
+                'paired_delta': _value(paired[v].get(eq_type, np.nan)),
+            }
+        drift[eq_type] = entry
+    return drift
+
+
+# Trends over all retained uploads
+
+@stage('trends')
+def build_trends(uploads, options):
+    """
+    Per-type series over `uploads` (oldest first) with drift statistics,
+    and per-unit series for the equipment named in the options. Every
+    series has one value per upload, null where the type or unit is absent.
+    """
+    summaries = [type_summary(upload) for upload in uploads]
+    payload = {
+        'uploads': [_upload_info(upload, summary) for upload, summary in zip(uploads, summaries)],
+        'types': {},
+        'equipment': {},
+    }
+    if not uploads:
+        return payload
+    dists = [_by_type(summary.distribution) for summary in summaries]
+    type_names = sorted(set().union(*dists))
+    if options.types:
+        type_names = [t for t in type_names if t in options.types]
+
+    shape = (len(type_names), len(uploads))
+    count = np.zeros(shape, dtype=np.int64)
+    series = {name: np.full(shape, np.nan) for name in ['anomaly_rate'] + VARIABLES + [f'{v}_std' for v in VARIABLES]}
+    for u, dist in enumerate(dists):
+        for i, eq_type in enumerate(type_names):
+            entry = dist.get(eq_type)
+            if entry is None:
+                continue
+            count[i, u] = entry['count']
+            series['anomaly_rate'][i, u] = entry['anomaly_rate']
+            for v in VARIABLES:
+                series[v][i, u] = _mean(entry, v) if entry.get(v) else np.nan
+                series[f'{v}_std'][i, u] = _std(entry, v) if entry.get(v) else np.nan
+
+    drift = {name: drift_stats(series[name]) for name in ['anomaly_rate'] + VARIABLES}
+    for i, eq_type in enumerate(type_names):
+        entry = {'count': count[i].tolist(), 'anomaly_rate': _round(series['anomaly_rate'][i])}
+        for v in VARIABLES:
+            entry[v] = {'mean': _round(series[v][i]), 'std': _round(series[f'{v}_std'][i])}
+        entry['drift'] = {name: {stat: _value(values[i]) for stat, values in drift[name].items()} for name in drift}
+        payload['types'][eq_type] = entry
+
+    if options.equipment:
+        payload['equipment'] = equipment_series(uploads, options.equipment)
+    return payload
+
+
+def drift_stats(matrix):
+    """
+    Row-wise over a (types x uploads) matrix with NaN gaps, at least one
+    upload wide: first and last value, their difference, the least-squares
+    slope per upload and the z-score of the last value against the earlier
+    ones.
+    """
+    rows, width = matrix.shape
+    present = ~np.isnan(matrix)
+    n = present.sum(axis=1)
+    index = np.arange(rows)
+    first_col = present.argmax(axis=1)
+    last_col = width - 1 - present[:, ::-1].argmax(axis=1)
+    first = np.where(n > 0, matrix[index, first_col], np.nan)
+    last = np.where(n > 0, matrix[index, last_col], np.nan)
+
+    values = np.where(present, matrix, 0.0)
+    x = np.where(present, np.arange(width), 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x, mean_y = x.sum(axis=1) / n, values.sum(axis=1) / n
+        dx = np.where(present, x - mean_x[:, None], 0.0)
+        dy = np.where(present, values - mean_y[:, None], 0.0)
+        slope = (dx * dy).sum(axis=1) / (dx ** 2).sum(axis=1)
+
+        # Everything before the last value
+        before = present.copy()
+        before[index, last_col] = False
+        m = before.sum(axis=1)
+        prior = np.where(before, matrix, 0.0)
+        prior_mean = prior.sum(axis=1) / m
+        prior_std = np.sqrt(np.where(before, (matrix - prior_mean[:, None]) ** 2, 0.0).sum(axis=1) / m)
+        z_last = np.where((m > 1) & (prior_std > 0), (last - prior_mean) / prior_std, np.nan)
+    return {'first': first, 'last': last, 'delta': last - first, 'slope': slope, 'z_last': z_last}
+
+
+def equipment_series(uploads, names):
+    """
+    Per named unit, one value per upload for each variable, its anomalous
+    rows and anomaly score; looked up in the upload profiles with
+    searchsorted.
+    """
+    wanted = np.array(sorted(set(names)), dtype=str)
+    profiles = get_profiles(uploads)
+    shape = (len(wanted), len(uploads))
+    values = {name: np.full(shape, np.nan) for name in VARIABLES + ['score', 'anomalies']}
+    types = np.full(len(wanted), '', dtype=object)
+    for u, upload in enumerate(uploads):
+        profile = profiles[upload.id]
+        position = np.searchsorted(profile['names'], wanted)
+        position = np.minimum(position, max(len(profile['names']) - 1, 0))
+        found = (profile['names'][position] == wanted) if len(profile['names']) else np.zeros(len(wanted), bool)
+        hit = position[found]
+        for name in VARIABLES + ['score', 'anomalies']:
+            values[name][found, u] = profile[name][hit]
+        types[found] = profile['types'][hit]
+
+    result = {}
+    for i, name in enumerate(wanted.tolist()):
+        present = ~np.isnan(values['anomalies'][i])
+        anomalies = values['anomalies'][i]
+        result[name] = {
+            'equipment_type': types[i] or None,
+            'uploads': int(present.sum()),
+            'anomalies': [int(a) if p else None for a, p in zip(anomalies.tolist(), present.tolist())],
+            'is_anomaly': [bool(a > 0) if p else None for a, p in zip(anomalies.tolist(), present.tolist())],
+            'anomaly_score': _round(values['score'][i]),
+            **{v: _round(values[v][i]) for v in VARIABLES},
+        }
+    return result
+
+
+# Helpers
+
+def _upload_info(upload, summary=None):
+    summary = summary or type_summary(upload)
+    return {
+        'id': upload.id,
+        'file_name': upload.file_name,
+        'uploaded_at': upload.uploaded_at,
+        'rows': summary.total_count,
+        'anomalies': summary.anomaly_count,
+    }
+
+
+def _by_type(distribution):
+    return {entry['equipment_type']: entry for entry in distribution}
+
+
+def _mean(entry, variable):
+    stats = entry.get(variable)
+    return stats['mean'] if stats else None
+
+
+def _std(entry, variable):
+    stats = entry.get(variable)
+    return stats['std'] if stats else None
+
+
+def _delta(before, after):
+    if before is None or after is None:
+        return None
+    return round(after - before, 4)
+
+
+def _value(value):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else round(value, 4) + 0.0 # no -0.0
+
+
+def _round(values):
+    return [_value(v) for v in np.asarray(values, dtype=np.float64)]
@@ -1,9 +1,20 @@
 from django.urls import path
-from .views import UploadCSVView, DashboardDataView, HistoryView ,ExportPDFView
+from .views import UploadCSVView, BatchUploadView, DashboardDataView, HistoryView ,ExportPDFView, IngestJobView, AnomalyThresholdView, BaselineModelView, UploadDataView, CacheStatsView, UploadReportView, UploadChartView, UploadDiffView, TrendsView, metrics
 
 urlpatterns = [
     path('upload/', UploadCSVView.as_view(), name='upload-csv'),
+    path('upload/batch/', BatchUploadView.as_view(), name='upload-batch'),
     path('summary/', DashboardDataView.as_view(), name='dashboard-summary'),
     path('history/', HistoryView.as_view(), name='upload-history'),
     path('export-pdf/', ExportPDFView.as_view(), name='export-pdf'),
+    path('uploads/<int:upload_id>/data/', UploadDataView.as_view(), name='upload-data'),
+    path('uploads/<int:upload_id>/chart/', UploadChartView.as_view(), name='upload-chart'),
+    path('uploads/<int:upload_id>/diff/<int:other_id>/', UploadDiffView.as_view(), name='upload-diff'),
+    path('uploads/<int:upload_id>/report.pdf', UploadReportView.as_view(), name='upload-report'),
+    path('uploads/<int:upload_id>/threshold/', AnomalyThresholdView.as_view(), name='anomaly-threshold'),
+    path('trends/', TrendsView.as_view(), name='trends'),
+    path('models/', BaselineModelView.as_view(), name='baseline-models'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('metrics/', metrics, name='metrics'),
+    path('jobs/<int:job_id>/', IngestJobView.as_view(), name='ingest-job'),
 ]
@@ -1,182 +1,482 @@
-from django.shortcuts import render
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-import datetime
-
-import pandas as pd
-from sklearn.ensemble import IsolationForest
+import logging
+
+from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, QueryDict
+from concurrent.futures import TimeoutError as FuturesTimeout
+
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.views import APIView
 from rest_framework import status
-from django.db.models import Avg, Count
-from .models import FileUpload, EquipmentData
-from .serializers import FileUploadSerializer, EquipmentDataSerializer
+from .models import FileUpload, IngestJob, BaselineModel
+from .serializers import FileUploadSerializer, IngestJobSerializer, BaselineModelSerializer
+from .caching import cached_api, invalidate as invalidate_cache, not_modified, stats as cache_stats
+from .filters import DataQuery
+from .streaming import iter_json_document, streaming_json_response
+from .jobs import submit_ingest
+# Heavy modules (pandas, scikit-learn, pyarrow) load on first use, see core/engines.py
+from .engines import batch, charts, detectors, ingest, registry, reports, retention, storage, summaries, trends
+from .metrics import enabled as metrics_enabled, render as render_metrics, stage
+
+logger = logging.getLogger(__name__)
 
 class UploadCSVView(APIView):
     def post(self, request):
-        print("🚨 UPLOAD ENDPOINT HIT! If you see this, the correct view is running.")
         file_obj = request.FILES.get('file')
         if not file_obj:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Keep only the last 5 uploads
-        if FileUpload.objects.count() >= 5:
-            oldest = FileUpload.objects.order_by('uploaded_at').first()
-            if oldest:
-                oldest.delete()
-
+        # Detector and contamination can be picked per upload
         try:
-            df = pd.read_csv(file_obj)
-            df.columns = df.columns.str.strip()
-            
-            # 1. Check columns FIRST before doing any AI math
-            required_cols = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-            missing = [col for col in required_cols if col not in df.columns]
-            
-            if missing:
-                return Response(
-                    {"error": f"Missing columns: {missing}. Found: {list(df.columns)}"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            # 2. Run the AI Model on the validated dataframe
-            features = df[['Pressure']]
-            model = IsolationForest(contamination=0.15, random_state=42)
-            
-            # Generate the numpy boolean array
-            predictions = model.fit_predict(features) == -1
-            
-            # Attach it back to the dataframe
-            df['is_anomaly'] = predictions
-
-            print(f"✅ DEBUG: AI found {sum(df['is_anomaly'])} anomalies!")
-
-        except Exception as e:
-            return Response({"error": f"Failed to read CSV or run AI model: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
-
-        # 3. Create the Database Instances
-        upload_instance = FileUpload.objects.create(file_name=file_obj.name)
-        
-        data_instances = []
-        for _, row in df.iterrows():
-            # Force the numpy boolean to a standard Python boolean
-            # If row['is_anomaly'] is True, python_bool will be True.
-            python_bool = bool(row['is_anomaly'])
-            
-            data_instances.append(
-                EquipmentData(
-                    upload=upload_instance,
-                    equipment_name=row['Equipment Name'],
-                    equipment_type=row['Type'],
-                    flowrate=row['Flowrate'],
-                    pressure=row['Pressure'],
-                    temperature=row['Temperature'],
-                    is_anomaly=python_bool # Using the safe boolean!
-                )
+            options = detection_options(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The same export uploaded again is answered with the upload we
+        # already have, before it can push anything out of the history.
+        # force=true re-processes it anyway.
+        force = str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+        with stage('hash'):
+            content_hash = ingest.file_hash(file_obj)
+        if not force:
+            try:
+                duplicate = ingest.find_duplicate(ingest.resolve_options(**options), content_hash=content_hash)
+            except ingest.IngestError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if duplicate is not None:
+                return upload_response(ingest.duplicate_result(duplicate), status.HTTP_200_OK)
+        options.update(content_hash=content_hash, force=force)
+
+        # Large exports are read and inserted chunk by chunk so the worker's
+        # memory stays flat; everything else goes through the one-shot path.
+        stream = ingest.should_stream(file_obj, request.data.get('stream'))
+
+        # async=true hands the file to the background worker pool and returns
+        # right away; the client polls /api/jobs/<id>/ for the outcome.
+        if is_async(request.data.get('async')):
+            job = submit_ingest(file_obj, stream=stream, **options)
+            return Response(
+                {
+                    "message": "File accepted for processing",
+                    "job_id": job.id,
+                    "status": job.status,
+                    "status_url": reverse('ingest-job', args=[job.id]),
+                },
+                status=status.HTTP_202_ACCEPTED
             )
-        
-        EquipmentData.objects.bulk_create(data_instances)
 
-        # 4. Return success ONLY after everything is saved
+        try:
+            result = ingest.ingest_file(file_obj, file_obj.name, stream=stream, **options)
+        except ingest.IngestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result['duplicate']:
+            # Same rows as an earlier upload (frame hash), caught after parsing
+            return upload_response(result, status.HTTP_200_OK)
+
+        invalidate_cache()
+        # Older uploads past the retention limits are deleted in the background
+        retention.schedule_purge()
+        logger.info("Upload %s: %s anomalies in %s rows (%s rows/s)", result['upload'].id, result['anomalies'],
+                    result['rows'], result['rows_per_sec'])
+
+        # Return success ONLY after everything is saved
+        return upload_response(result, status.HTTP_201_CREATED)
+
+def upload_response(result, code):
+    return Response(upload_payload(result), status=code)
+
+def upload_payload(result):
+    upload = result['upload']
+    return {
+        "message": ("File already uploaded, returning the existing analysis" if result['duplicate']
+                    else "File uploaded, AI analyzed, and processed successfully"),
+        "id": upload.id,
+        "duplicate": result['duplicate'],
+        "detector": upload.detector,
+        "contamination": upload.contamination,
+        "model_version": upload.model_version,
+        "rows": result['rows'],
+        "anomalies": result['anomalies'],
+        "chunks": result['chunks'],
+        "seconds": result['seconds'],
+        "rows_per_sec": result['rows_per_sec'],
+        # Rows dropped by schema validation: (row, column, reason, value)
+        "rejected_rows": result['rejected_rows'],
+        "row_errors": result['row_errors'],
+    }
+
+class BatchUploadView(APIView):
+    """
+    Several CSVs and/or ZIP archives of CSVs (form field `files`, repeated)
+    in one request, ingested in parallel by the worker pool. Every file gets
+    its own result; combine=true stores the whole batch as one upload.
+    """
+    def post(self, request):
+        files = request.FILES.getlist('files') + request.FILES.getlist('file')
+        if not files:
+            return Response({"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            options = detection_options(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        force = str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+        combine = str(request.data.get('combine', '')).lower() in ('1', 'true', 'yes')
+
+        try:
+            items, paths = batch.collect_items(files)
+        except ingest.IngestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = batch.ingest_batch(items, force=force, combine=combine, name=request.data.get('name'), **options)
+        except ingest.IngestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            batch.remove_spooled(paths)
+
+        files, combined = result['files'], result['combined']
+        failed = sum('error' in f for f in files)
+        logger.info("Batch of %s files: %s failed, %s s", len(items), failed, result['seconds'])
+        if combined is not None:
+            code = status.HTTP_200_OK if combined['duplicate'] else status.HTTP_201_CREATED
+        elif failed == len(files):
+            code = status.HTTP_400_BAD_REQUEST
+        elif all(f.get('duplicate', True) for f in files):
+            code = status.HTTP_200_OK
+        else:
+            code = status.HTTP_201_CREATED
         return Response(
-            {"message": "File uploaded, AI analyzed, and processed successfully", "id": upload_instance.id}, 
-            status=status.HTTP_201_CREATED
+            {
+                "files": files,
+                "processed": len(files) - failed,
+                "failed": failed,
+                "combined": upload_payload(combined) if combined is not None else None,
+                "seconds": result['seconds'],
+            },
+            status=code
         )
 
+def detection_options(data):
+    options = {}
+    detector = data.get('detector')
+    if detector:
+        if detector not in detectors.DETECTORS:
+            raise ValueError(f"Unknown detector '{detector}'. Choose from: {sorted(detectors.DETECTORS)}")
+        options['detector'] = detector
+    contamination = data.get('contamination')
+    if contamination not in (None, ''):
+        options['contamination'] = parse_contamination(contamination)
+    # Score against a registered baseline ("name" or "name@v3") instead of fitting
+    baseline = data.get('baseline')
+    if baseline:
+        try:
+            options['baseline'] = registry.resolve(baseline).label
+        except registry.RegistryError as e:
+            raise ValueError(str(e))
+    return options
+
+def parse_upload_ids(data):
+    # A form post repeats the field (uploads=3&uploads=4), JSON sends a list
+    if isinstance(data, QueryDict):
+        values = data.getlist('uploads')
+    else:
+        values = data.get('uploads') or []
+        values = values if isinstance(values, list) else [values]
+    ids = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+            raise ValueError("uploads must be a list of upload ids")
+        ids.append(int(value))
+    return ids
+
+def parse_contamination(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("contamination must be a number")
+    if not 0 < value <= 0.5:
+        raise ValueError("contamination must be in (0, 0.5]")
+    return value
+
+def is_async(requested):
+    if requested is None:
+        return getattr(settings, 'INGEST_ASYNC_DEFAULT', False)
+    return str(requested).lower() in ('1', 'true', 'yes')
+
+class IngestJobView(APIView):
+    """
+    Returns stage, progress and errors of a background ingest job.
+    """
+    def get(self, request, job_id):
+        job = get_object_or_404(IngestJob, pk=job_id)
+        return Response(IngestJobSerializer(job).data)
+
+class AnomalyThresholdView(APIView):
+    """
+    Re-applies an anomaly cut-off to an upload from its stored scores.
+    Send either `threshold` (0 is the fitted cut-off) or `contamination`.
+    """
+    def post(self, request, upload_id):
+        upload = get_object_or_404(FileUpload, pk=upload_id)
+        threshold = request.data.get('threshold')
+        contamination = request.data.get('contamination')
+        try:
+            if threshold not in (None, ''):
+                anomalies = detectors.apply_threshold(upload, threshold=float(threshold))
+            elif contamination not in (None, ''):
+                anomalies = detectors.apply_threshold(upload, contamination=parse_contamination(contamination))
+            else:
+                raise ValueError("Provide either threshold or contamination")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # Anomaly counts changed, so the stored summary has to follow
+        with stage('summary'):
+            summaries.build_summary(upload)
+        invalidate_cache()
+        return Response({"id": upload.id, "anomalies": anomalies})
+
+class BaselineModelView(APIView):
+    """
+    GET lists the registered baseline models, POST trains a new version from
+    a set of historical uploads: {"name", "uploads": [ids], "detector", "contamination"}.
+    """
+    def get(self, request):
+        baselines = BaselineModel.objects.order_by('name', '-version')
+        return Response(BaselineModelSerializer(baselines, many=True).data)
+
+    def post(self, request):
+        name = request.data.get('name')
+        try:
+            upload_ids = parse_upload_ids(request.data)
+            if not name or not upload_ids:
+                raise ValueError("Provide a name and a list of upload ids")
+            registry.validate_name(name)
+            options = detection_options(request.data)
+            detector, contamination = ingest.detection_defaults()
+            baseline = registry.train_baseline(
+                name,
+                upload_ids,
+                options.get('detector', detector),
+                options.get('contamination', contamination),
+            )
+        except (ValueError, registry.RegistryError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(BaselineModelSerializer(baseline).data, status=status.HTTP_201_CREATED)
+
 class DashboardDataView(APIView):
     """
     Returns data for the latest upload to display on the dashboard.
     """
+    @cached_api('summary')
     def get(self, request):
-        # Get the most recent upload
-        latest_upload = FileUpload.objects.order_by('-uploaded_at').first()
+        # Get the most recent upload together with its precomputed summary
+        latest_upload = FileUpload.objects.select_related('summary').order_by('-uploaded_at').first()
         
         if not latest_upload:
             return Response({"message": "No data available"}, status=status.HTTP_204_NO_CONTENT)
 
-        data_points = latest_upload.data_points.all()
+        summary = summaries.get_summary(latest_upload)
 
-        stats = data_points.aggregate(
-            avg_flow=Avg('flowrate'),
-            avg_pressure=Avg('pressure'),
-            avg_temp=Avg('temperature'),
-            total_count=Count('id')
-        )
+        # Rows are no longer inlined here; page through them with data_url.
+        # ?include=data still returns them all, streamed without serializers.
+        payload = {
+            "id": latest_upload.id,
+            "filename": latest_upload.file_name,
+            "uploaded_at": latest_upload.uploaded_at,
+            "detector": latest_upload.detector,
+            "model_version": latest_upload.model_version,
+            "stats": summaries.stats_payload(summary),
+            "metrics": summary.metrics,
+            "distribution": summary.distribution,
+            "data_url": reverse('upload-data', args=[latest_upload.id]),
+        }
+        if 'data' in request.query_params.get('include', '').split(','):
+            rows = storage.storage_for(latest_upload).iter_json(latest_upload, DataQuery())
+            return streaming_json_response(iter_json_document(payload, "data", rows))
+        return Response(payload)
 
-        type_dist = data_points.values('equipment_type').annotate(count=Count('id'))
+class UploadDataView(APIView):
+    """
+    Keyset-paginated rows of one upload, with field projection and filters.
+    See core/filters.py for the query parameters. ?all=true streams every
+    matching row as one JSON array instead of a page.
+    """
+    def get(self, request, upload_id):
+        upload = get_object_or_404(FileUpload, pk=upload_id)
+        try:
+            query = DataQuery.from_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = EquipmentDataSerializer(data_points, many=True)
+        backend = storage.storage_for(upload)
+        if request.query_params.get('all', '').lower() in ('1', 'true', 'yes'):
+            return streaming_json_response(backend.iter_json(upload, query))
 
-        return Response({
-            "filename": latest_upload.file_name,
-            "uploaded_at": latest_upload.uploaded_at,
-            "stats": stats,
-            "distribution": type_dist,
-            "data": serializer.data
-        })
+        rows, next_cursor = backend.page(upload, query)
+        next_url = None
+        if next_cursor is not None:
+            params = request.query_params.copy()
+            params['cursor'] = next_cursor
+            next_url = f"{request.path}?{params.urlencode()}"
+        return Response({"results": rows, "next_cursor": next_cursor, "next": next_url})
+
+class UploadChartView(APIView):
+    """
+    Chart-ready aggregates of one upload (histograms, box plots, LTTB series,
+    Pressure/Temperature density). See core/charts.py for the parameters.
+    """
+    def get(self, request, upload_id):
+        upload = get_object_or_404(FileUpload.objects.select_related('summary'), pk=upload_id)
+        try:
+            options = charts.ChartOptions.from_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        payload, key = charts.get_chart(upload, options)
+        etag = f'"{key[-24:]}"'
+        if not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(payload)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+class UploadDiffView(APIView):
+    """
+    What changed between two uploads, joined on equipment_name: per-unit
+    deltas (?sort=change|flowrate|pressure|temperature|anomaly_score,
+    ?limit=100), newly anomalous and recovered units, added and removed
+    units, and per-type drift. See core/trends.py.
+    """
+    def get(self, request, upload_id, other_id):
+        uploads = FileUpload.objects.select_related('summary')
+        a = get_object_or_404(uploads, pk=upload_id)
+        b = get_object_or_404(uploads, pk=other_id)
+        try:
+            options = trends.DiffOptions.from_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        payload, key = trends.get_diff(a, b, options)
+        etag = f'"{key[-24:]}"'
+        if not_modified(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(payload)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+class TrendsView(APIView):
+    """
+    Per-type series and drift over the retained uploads, oldest first.
+    ?uploads=N keeps the last N, ?type=Pump,Valve filters the types and
+    ?equipment=P-101,P-102 adds per-unit series.
+    """
+    @cached_api('trends')
+    def get(self, request):
+        try:
+            options = trends.TrendOptions.from_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        uploads = FileUpload.objects.select_related('summary').order_by('-uploaded_at', '-id')
+        if options.uploads is not None:
+            uploads = uploads[:options.uploads]
+        return Response(trends.build_trends(list(uploads)[::-1], options))
 
 class HistoryView(APIView):
     """
-    Returns list of last 5 uploads.
+    Returns the last RETENTION_MAX_UPLOADS uploads, the ones retention keeps.
+    ?since=<upload id> only returns newer uploads, for clients that keep
+    their own copy of the history.
     """
+    @cached_api('history')
     def get(self, request):
-        uploads = FileUpload.objects.order_by('-uploaded_at')[:5]
+        uploads = FileUpload.objects.select_related('summary').order_by('-uploaded_at')
+        since = request.query_params.get('since')
+        if since not in (None, ''):
+            try:
+                uploads = uploads.filter(id__gt=int(since))
+            except ValueError:
+                return Response({"error": "since must be an upload id"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = getattr(settings, 'RETENTION_MAX_UPLOADS', 5)
+        if limit is not None:
+            uploads = uploads[:limit]
         serializer = FileUploadSerializer(uploads, many=True)
         return Response(serializer.data)
 
+class CacheStatsView(APIView):
+    """
+    Hit/miss counters of the summary/history response cache.
+    """
+    def get(self, request):
+        return Response(cache_stats())
+
+class UploadReportView(APIView):
+    """
+    The full PDF report of an upload. Reports are rendered in the background;
+    until the file is ready this answers 202 and the client retries.
+    """
+    def get(self, request, upload_id):
+        upload = get_object_or_404(FileUpload, pk=upload_id)
+        path = reports.cached_report(upload)
+        if path:
+            return report_response(upload, path)
+        error = reports.take_failure(upload)
+        if error:
+            return Response({"error": f"Rendering the report failed: {error}"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        reports.submit_report(upload)
+        response = Response({"status": "rendering", "report_url": request.build_absolute_uri()},
+                            status=status.HTTP_202_ACCEPTED)
+        response['Retry-After'] = '2'
+        return response
+
 class ExportPDFView(APIView):
+    """
+    Report of the latest upload. Kept for clients that expect the PDF in the
+    response, so this waits for the background render, but only briefly: a
+    longer render answers 202 with the URL to poll.
+    """
     def get(self, request):
-        latest_upload = FileUpload.objects.order_by('-uploaded_at').first()
+        latest_upload = FileUpload.objects.select_related('summary').order_by('-uploaded_at').first()
         if not latest_upload:
             return Response({"error": "No data to export"}, status=404)
-            
-        data_points = latest_upload.data_points.all()
-        
-        avg_flow = data_points.aggregate(Avg('flowrate'))['flowrate__avg']
-        avg_pressure = data_points.aggregate(Avg('pressure'))['pressure__avg']
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="Report_{latest_upload.file_name}.pdf"'
-        
-        p = canvas.Canvas(response, pagesize=letter)
-        width, height = letter
-        
-        p.setFont("Helvetica-Bold", 20)
-        p.drawString(50, height - 50, "Chemical Equipment Report")
-        
-        p.setFont("Helvetica", 12)
-        p.drawString(50, height - 80, f"Generated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M')}")
-        p.drawString(50, height - 100, f"Source File: {latest_upload.file_name}")
-        
-        p.setStrokeColor(colors.blue)
-        p.rect(50, height - 180, 500, 60, fill=0)
-        p.drawString(70, height - 140, f"Total Units: {data_points.count()}")
-        p.drawString(200, height - 140, f"Avg Flowrate: {int(avg_flow)} m3/h")
-        p.drawString(400, height - 140, f"Avg Pressure: {round(avg_pressure, 1)} bar")
-        
-        y = height - 220
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, y, "Equipment Name")
-        p.drawString(250, y, "Type")
-        p.drawString(400, y, "Flowrate")
-        p.line(50, y-5, 500, y-5)
-        
-        y -= 25
-        p.setFont("Helvetica", 10)
-        for item in data_points[:20]: 
-            if y < 50: break 
-            p.drawString(50, y, item.equipment_name)
-            p.drawString(250, y, item.equipment_type)
-            p.drawString(400, y, str(item.flowrate))
-            y -= 20
-            
-        p.showPage()
-        p.save()
-        
-        return response
+
+        path = reports.cached_report(latest_upload)
+        if not path:
+            try:
+                with stage('report'):
+                    timeout = getattr(settings, 'REPORT_WAIT_TIMEOUT', 10)
+                    path = reports.submit_report(latest_upload).result(timeout=timeout)
+            except FuturesTimeout:
+                response = Response({"status": "rendering",
+                                     "report_url": request.build_absolute_uri(reverse('upload-report', args=[latest_upload.id]))},
+                                    status=status.HTTP_202_ACCEPTED)
+                response['Retry-After'] = '2'
+                return response
+            except Exception as e:
+                # Logged by the render's done callback
+                reports.take_failure(latest_upload)
+                return Response({"error": f"Rendering the report failed: {e or repr(e)}"},
+                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return report_response(latest_upload, path)
+
+def report_response(upload, path):
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=f"Report_{upload.file_name}.pdf",
+                        content_type='application/pdf')
+
+def metrics(request):
+    """
+    Stage, request and ingest histograms plus cache counters in the
+    Prometheus text format. See core/metrics.py.
+    """
+    if not metrics_enabled():
+        return HttpResponse("Metrics are disabled\n", status=404, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 def home(request):
     return HttpResponse("<h1>Chemical Visualizer Backend is Live! 🚀</h1><p>Use /api/summary/ to get data.</p>")
\ No newline at end of file
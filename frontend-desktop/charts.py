@@ -0,0 +1,194 @@
+"""
+Dashboard charts for the desktop client.
+
+Every chart creates its matplotlib artists once and then updates them in
+place (bar heights, line data, scatter offsets) followed by draw_idle(),
+so a refresh never rebuilds the axes. The scatter view holds the full
+columns but only hands matplotlib one point per screen cell, recomputed for
+the visible range after every zoom or pan, so uploads with a million rows
+stay interactive. Series arrive already LTTB-reduced from the server's
+/api/uploads/<id>/chart/ endpoint.
+"""
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+from PyQt5.QtCore import QTimer
+
+MAX_LINE_POINTS = 2000
+SCATTER_GRID = (400, 300) # cells across and down the plot area
+
+NORMAL_COLOR = '#3f51b5'
+ANOMALY_COLOR = '#d32f2f'
+
+
+def thin_scatter(x, y, xlim, ylim, grid=SCATTER_GRID):
+    """
+    Indices of the points inside the limits, keeping one point per grid cell.
+    """
+    inside = np.flatnonzero((x >= xlim[0]) & (x <= xlim[1]) & (y >= ylim[0]) & (y <= ylim[1]))
+    if len(inside) <= grid[0] * grid[1] // 4:
+        return inside
+    width, height = (xlim[1] - xlim[0]) or 1.0, (ylim[1] - ylim[0]) or 1.0
+    col = ((x[inside] - xlim[0]) / width * (grid[0] - 1)).astype(np.int64)
+    row = ((y[inside] - ylim[0]) / height * (grid[1] - 1)).astype(np.int64)
+    _, first = np.unique(row * grid[0] + col, return_index=True)
+    return inside[np.sort(first)]
+
+
+def columns_from_rows(rows):
+    """
+    Turn a row list from the data endpoint into NumPy columns. Runs on the
+    network thread, so the GUI thread only receives arrays.
+    """
+    def column(name):
+        return np.array([np.nan if row[name] is None else row[name] for row in rows], dtype=np.float64)
+
+    return {
+        'flowrate': column('flowrate'),
+        'pressure': column('pressure'),
+        'temperature': column('temperature'),
+        'is_anomaly': np.array([bool(row['is_anomaly']) for row in rows], dtype=bool),
+    }
+
+
+def _padded(values):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return (0.0, 1.0)
+    low, high = float(values.min()), float(values.max())
+    pad = (high - low) * 0.03 or 1.0
+    return (low - pad, high + pad)
+
+
+class ChartCanvas(FigureCanvas):
+
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        self.fig = Figure(figsize=(width, height), dpi=dpi, tight_layout=True)
+        self.axes = self.fig.add_subplot(111)
+        super().__init__(self.fig)
+        self.setParent(parent)
+
+
+class DistributionChart(ChartCanvas):
+    """
+    Stacked bars per equipment type: normal rows and anomalies.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.labels = None
+        self.normal_bars = []
+        self.anomaly_bars = []
+        self.axes.set_title("Equipment Count by Type")
+
+    def update_distribution(self, distribution):
+        labels = [d['equipment_type'] for d in distribution]
+        anomalies = [d.get('anomalies', 0) for d in distribution]
+        normal = [d['count'] - a for d, a in zip(distribution, anomalies)]
+
+        if labels != self.labels:
+            # New set of types: the only case where the bars are rebuilt
+            for bar in self.normal_bars + self.anomaly_bars:
+                bar.remove()
+            positions = np.arange(len(labels))
+            self.normal_bars = list(self.axes.bar(positions, normal, color=NORMAL_COLOR, alpha=0.7, label="Normal"))
+            self.anomaly_bars = list(self.axes.bar(positions, anomalies, bottom=normal, color=ANOMALY_COLOR,
+                                                   alpha=0.8, label="Anomalies"))
+            self.axes.set_xticks(positions)
+            self.axes.set_xticklabels(labels)
+            if self.labels is None:
+                self.axes.legend(loc='upper right')
+            self.labels = labels
+        else:
+            for bar, height in zip(self.normal_bars, normal):
+                bar.set_height(height)
+            for bar, bottom, height in zip(self.anomaly_bars, normal, anomalies):
+                bar.set_y(bottom)
+                bar.set_height(height)
+
+        top = max([n + a for n, a in zip(normal, anomalies)] or [1])
+        self.axes.set_ylim(0, top * 1.1)
+        self.draw_idle()
+
+
+class _ZoomAware(ChartCanvas):
+    """
+    Re-reduces the visible data after the axes limits change. Zooming fires
+    both xlim and ylim callbacks, so the work is coalesced into one pass.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pending = False
+        self.axes.callbacks.connect('xlim_changed', self._limits_changed)
+        self.axes.callbacks.connect('ylim_changed', self._limits_changed)
+
+    def _limits_changed(self, _axes):
+        if not self._pending:
+            self._pending = True
+            QTimer.singleShot(0, self._refresh)
+
+    def _refresh(self):
+        self._pending = False
+        self.reduce()
+        self.draw_idle()
+
+    def reduce(self):
+        raise NotImplementedError
+
+
+class ScatterChart(_ZoomAware):
+    """
+    One variable against another, anomalies drawn on top in red.
+    """
+
+    def __init__(self, x_label, y_label, parent=None):
+        super().__init__(parent)
+        self.x = self.y = np.empty(0)
+        self.flags = np.empty(0, dtype=bool)
+        self.normal = self.axes.scatter([], [], s=4, color=NORMAL_COLOR, alpha=0.35, linewidths=0, label="Normal")
+        self.anomalies = self.axes.scatter([], [], s=10, color=ANOMALY_COLOR, alpha=0.9, linewidths=0,
+                                           label="Anomalies")
+        self.axes.set_xlabel(x_label)
+        self.axes.set_ylabel(y_label)
+        self.axes.legend(loc='upper right')
+
+    def set_data(self, x, y, flags):
+        self.x, self.y, self.flags = x, y, flags
+        self.axes.set_xlim(*_padded(x))
+        self.axes.set_ylim(*_padded(y))
+        self._limits_changed(self.axes)
+
+    def reduce(self):
+        xlim, ylim = self.axes.get_xlim(), self.axes.get_ylim()
+        for collection, mask in ((self.normal, ~self.flags), (self.anomalies, self.flags)):
+            x, y = self.x[mask], self.y[mask]
+            keep = thin_scatter(x, y, xlim, ylim)
+            collection.set_offsets(np.column_stack([x[keep], y[keep]]) if len(keep) else np.empty((0, 2)))
+
+
+class SeriesChart(ChartCanvas):
+    """
+    A variable in upload (row) order, as reduced by the server to at most
+    MAX_LINE_POINTS points: {'x': row numbers, 'y': values, 'anomalies':
+    positions of the flagged points}.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        (self.line,) = self.axes.plot([], [], linewidth=0.8, color=NORMAL_COLOR)
+        self.anomalies = self.axes.scatter([], [], s=10, color=ANOMALY_COLOR, linewidths=0, label="Anomalies")
+        self.axes.set_xlabel("Row")
+        self.axes.legend(loc='upper right')
+
+    def set_data(self, series, label):
+        x = np.asarray(series['x'], dtype=np.float64)
+        y = np.asarray(series['y'], dtype=np.float64)
+        flagged = np.asarray(series['anomalies'], dtype=np.int64)
+        self.line.set_data(x, y)
+        self.anomalies.set_offsets(np.column_stack([x[flagged], y[flagged]]) if len(flagged)
+                                   else np.empty((0, 2)))
+        self.axes.set_ylabel(label)
+        self.axes.set_xlim(*_padded(x))
+        self.axes.set_ylim(*_padded(y))
+        self.draw_idle()
@@ -1,15 +1,31 @@
+import os
 import sys
-import requests
+from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QPushButton, QFileDialog, 
-                             QTableWidget, QTableWidgetItem, QFrame, QMessageBox, QHeaderView)
+                             QTableView, QFrame, QMessageBox, QHeaderView, QLineEdit,
+                             QComboBox, QCheckBox, QAbstractItemView, QTabWidget)
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont, QColor
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+
+from charts import MAX_LINE_POINTS, DistributionChart, ScatterChart, SeriesChart, columns_from_rows
+from network import ApiClient, EventStream
+from offline_cache import LocalCache
+from table_model import EquipmentFilterProxy, EquipmentTableModel
 
 API_URL = "https://chemicalvisualizer-4c97.onrender.com/api"
+POLL_SECONDS = int(os.environ.get('CV_POLL_SECONDS', 60)) # 0 turns background polling off
+LIVE_REFRESH_SECONDS = int(os.environ.get('CV_LIVE_REFRESH_SECONDS', 10)) # dashboard refresh while readings stream in
+CHART_CACHE_UPLOADS = 3 # uploads whose chart data is kept in memory
+
+def rejected_rows_text(data, limit=10):
+    lines = [f"{data['rejected_rows']} rows had bad values and were not imported:"]
+    for error in data.get('row_errors', [])[:limit]:
+        lines.append(f"Row {error['row']}, {error['column']}: {error['reason']} ({error['value']!r})")
+    if len(data.get('row_errors', [])) > limit:
+        lines.append("...")
+    return "\n".join(lines)
 
 class KPICard(QFrame):
     def __init__(self, title, color_code):
@@ -39,11 +55,7 @@ class KPICard(QFrame):
     def set_value(self, value, unit=""):
         self.value_lbl.setText(f"{value} {unit}")
 
-class MplCanvas(FigureCanvas):
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        self.fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = self.fig.add_subplot(111)
-        super(MplCanvas, self).__init__(self.fig)
+SERIES_VARIABLES = [("Flowrate", 'flowrate'), ("Pressure", 'pressure'), ("Temperature", 'temperature')]
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -68,6 +80,9 @@ class MainWindow(QMainWindow):
         self.status_lbl = QLabel("Ready")
         self.status_lbl.setStyleSheet("color: #666;")
 
+        self.live_lbl = QLabel("")
+        self.live_lbl.setStyleSheet("color: #d32f2f;")
+
         btn_upload = QPushButton("Upload CSV")
         btn_upload.setCursor(Qt.PointingHandCursor)
         btn_upload.setStyleSheet("""
@@ -88,11 +103,18 @@ class MainWindow(QMainWindow):
             }
             QPushButton:hover { background-color: #1b5e20; }
         """)
-        btn_refresh.clicked.connect(self.fetch_data)
+        btn_refresh.clicked.connect(lambda: self.fetch_data())
+
+        # Any cached upload can be opened, even offline
+        self.upload_picker = QComboBox()
+        self.upload_picker.setMinimumWidth(220)
+        self.upload_picker.activated.connect(self.on_upload_picked)
 
         header_layout.addWidget(title)
         header_layout.addStretch()
+        header_layout.addWidget(self.live_lbl)
         header_layout.addWidget(self.status_lbl)
+        header_layout.addWidget(self.upload_picker)
         header_layout.addWidget(btn_refresh)
         header_layout.addWidget(btn_upload)
         self.layout.addLayout(header_layout)
@@ -117,57 +139,297 @@ class MainWindow(QMainWindow):
         chart_frame = QFrame()
         chart_frame.setStyleSheet("background-color: white; border-radius: 8px;")
         chart_layout = QVBoxLayout(chart_frame)
-        self.canvas = MplCanvas(self, width=5, height=4, dpi=100)
-        chart_layout.addWidget(QLabel("Equipment Distribution"))
-        chart_layout.addWidget(self.canvas)
+        self.chart_tabs = QTabWidget()
+        self.canvas = DistributionChart()
+        self.chart_tabs.addTab(self.canvas, "Distribution")
+
+        self.scatter = ScatterChart("Temperature", "Pressure")
+        self.chart_tabs.addTab(self.with_toolbar(self.scatter), "Pressure vs Temperature")
+
+        self.series = SeriesChart()
+        self.series_variable = QComboBox()
+        for label, key in SERIES_VARIABLES:
+            self.series_variable.addItem(label, key)
+        self.series_variable.currentIndexChanged.connect(lambda _: self.plot_series())
+        self.chart_tabs.addTab(self.with_toolbar(self.series, self.series_variable), "Series")
+
+        chart_layout.addWidget(self.chart_tabs)
         content_layout.addWidget(chart_frame, stretch=2)
 
         table_frame = QFrame()
         table_frame.setStyleSheet("background-color: white; border-radius: 8px;")
         table_layout = QVBoxLayout(table_frame)
         
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["Name", "Type", "Flowrate"])
+        # Network calls run on a worker thread; results arrive as signals
+        self.api = ApiClient(API_URL, self)
+
+        self.cache = LocalCache()
+
+        # Rows are paged in by the model as the table is scrolled
+        self.table_model = EquipmentTableModel(self.api, self.cache, self)
+        self.table_proxy = EquipmentFilterProxy(self)
+        self.table_proxy.setSourceModel(self.table_model)
+
+        self.table = QTableView()
+        self.table.setModel(self.table_proxy)
+        # Upload order until a header is clicked
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.verticalHeader().setDefaultSectionSize(22)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         self.table.setStyleSheet("border: none;")
-        
-        table_layout.addWidget(QLabel("Recent Records"))
+
+        filter_layout = QHBoxLayout()
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search name...")
+        self.search_box.textChanged.connect(self.table_proxy.set_text)
+        self.type_filter = QComboBox()
+        self.type_filter.addItem("All types", None)
+        self.type_filter.currentIndexChanged.connect(
+            lambda i: self.table_proxy.set_equipment_type(self.type_filter.itemData(i)))
+        self.anomaly_filter = QCheckBox("Anomalies only")
+        self.anomaly_filter.toggled.connect(self.table_proxy.set_anomalies_only)
+        filter_layout.addWidget(self.search_box)
+        filter_layout.addWidget(self.type_filter)
+        filter_layout.addWidget(self.anomaly_filter)
+
+        table_layout.addWidget(QLabel("Records"))
+        table_layout.addLayout(filter_layout)
         table_layout.addWidget(self.table)
-        content_layout.addWidget(table_frame, stretch=1)
+        content_layout.addWidget(table_frame, stretch=2)
 
         self.layout.addLayout(content_layout)
 
+        self.api.finished.connect(self.on_response)
+        self.api.failed.connect(self.on_network_error)
+        self.btn_upload = btn_upload
+        self.refreshing = False
+        self.viewing = None # upload id picked by the user, None follows the latest
+        self.chart_columns = self.chart_series = None # what the charts show
+        # upload id -> {'version', 'rows', 'series'}, newest last; a part is
+        # None until its response arrives
+        self.chart_data = {}
+
+        # Render whatever is on disk right away, then sync in the background
+        self.show_cached()
         self.fetch_data()
+        self.poller = QTimer(self)
+        self.poller.timeout.connect(lambda: self.fetch_data(quiet=True))
+        if POLL_SECONDS > 0:
+            self.poller.start(POLL_SECONDS * 1000)
+
+        # Live readings: a one-line ticker, and the dashboard follows the
+        # stream with at most one quiet refresh per LIVE_REFRESH_SECONDS
+        self.live_refresh = QTimer(self)
+        self.live_refresh.setSingleShot(True)
+        self.live_refresh.timeout.connect(lambda: self.fetch_data(quiet=True))
+        self.live = EventStream(f"{API_URL}/live/events/", self)
+        self.live.event.connect(self.on_live_event)
+        self.live.status.connect(self.on_live_status)
+        self.live.start()
 
     def upload_file(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Open CSV", "", "CSV Files (*.csv)")
         if file_path:
             self.status_lbl.setText("Uploading...")
-            try:
-                files = {'file': open(file_path, 'rb')}
-                response = requests.post(f"{API_URL}/upload/", files=files)
-                if response.status_code == 201:
-                    self.status_lbl.setText("Upload Successful")
-                    self.fetch_data()
+            self.btn_upload.setEnabled(False)
+            self.api.upload('upload', 'upload/', file_path)
+
+    def fetch_data(self, quiet=False):
+        # Repeated clicks while a refresh is running are folded into it
+        if self.refreshing:
+            return
+        self.refreshing = True
+        if not quiet:
+            self.status_lbl.setText("Syncing...")
+        # Unchanged data costs a 304; history only brings uploads we have not seen
+        etag = self.cache.get_meta('summary_etag')
+        self.api.get('summary', 'summary/', headers={'If-None-Match': etag} if etag else None)
+        latest = self.cache.latest_id()
+        self.api.get('history', 'history/', params={'since': latest} if latest else None)
+
+    def with_toolbar(self, chart, *extra):
+        # Zoom/pan toolbar above a chart; the charts re-reduce on every change
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(0, 0, 0, 0)
+        bar = QHBoxLayout()
+        bar.addWidget(NavigationToolbar(chart, widget))
+        for item in extra:
+            bar.addWidget(item)
+        layout.addLayout(bar)
+        layout.addWidget(chart)
+        return widget
+
+    def load_charts(self, upload_id, version):
+        # Rows only change when an upload grows (live streams) or is
+        # re-thresholded, which both show in its counts; refreshes in between
+        # reuse what was already fetched
+        entry = self.chart_data.pop(upload_id, None)
+        if entry is not None and entry['version'] == version:
+            self.chart_data[upload_id] = entry
+            self.plot_charts(entry)
+            return
+        self.chart_data[upload_id] = {'version': version, 'rows': None, 'series': None}
+        while len(self.chart_data) > CHART_CACHE_UPLOADS:
+            del self.chart_data[next(iter(self.chart_data))]
+        context = (upload_id, version)
+        # Only the scatter columns; parsed into NumPy arrays on the network thread
+        self.api.get('chart-rows', f'uploads/{upload_id}/data/',
+                     params={'all': 'true', 'fields': 'flowrate,pressure,temperature,is_anomaly'},
+                     context=context, parse=columns_from_rows)
+        # Series come LTTB-reduced from the server
+        self.api.get('chart-series', f'uploads/{upload_id}/chart/',
+                     params={'include': 'series', 'points': MAX_LINE_POINTS}, context=context)
+
+    def chart_entry(self, context):
+        upload_id, version = context
+        entry = self.chart_data.get(upload_id)
+        return entry if entry is not None and entry['version'] == version else None
+
+    def plot_charts(self, entry):
+        # Redrawing resets the zoom, so only when the data changed
+        if entry['rows'] is not None and entry['rows'] is not self.chart_columns:
+            columns = self.chart_columns = entry['rows']
+            self.scatter.set_data(columns['temperature'], columns['pressure'], columns['is_anomaly'])
+        if entry['series'] is not None and entry['series'] is not self.chart_series:
+            self.chart_series = entry['series']
+            self.plot_series()
+
+    def plot_series(self):
+        if self.chart_series is None:
+            return
+        key = self.series_variable.currentData()
+        self.series.set_data(self.chart_series[key], self.series_variable.currentText())
+
+    def show_cached(self):
+        self.fill_upload_picker()
+        uploads = self.cache.uploads()
+        if uploads:
+            self.show_upload(uploads[0])
+            self.status_lbl.setText(f"Cached: {uploads[0]['filename']}")
+
+    def show_upload(self, payload):
+        self.update_ui(payload)
+        index = self.upload_picker.findData(payload['id'])
+        if index >= 0:
+            self.upload_picker.setCurrentIndex(index)
+
+    def fill_upload_picker(self):
+        self.upload_picker.blockSignals(True)
+        self.upload_picker.clear()
+        for payload in self.cache.uploads():
+            self.upload_picker.addItem(f"#{payload['id']} {payload['filename']}", payload['id'])
+        self.upload_picker.blockSignals(False)
+        current = self.table_model.upload_id
+        if current is not None and self.upload_picker.findData(current) >= 0:
+            self.upload_picker.setCurrentIndex(self.upload_picker.findData(current))
+
+    def on_upload_picked(self, index):
+        upload_id = self.upload_picker.itemData(index)
+        payload = self.cache.upload(upload_id)
+        if payload is None:
+            return
+        # Picking the newest upload goes back to following the latest one
+        self.viewing = None if upload_id == self.cache.latest_id() else upload_id
+        self.show_upload(payload)
+
+    def on_response(self, response):
+        if response.tag == 'upload':
+            self.btn_upload.setEnabled(True)
+            if response.status == 201:
+                rejected = response.data.get('rejected_rows', 0)
+                if rejected:
+                    # Rows with bad values were skipped; show where they are
+                    self.status_lbl.setText(f"Upload Successful ({rejected} rows rejected)")
+                    QMessageBox.warning(self, "Rejected rows", rejected_rows_text(response.data))
                 else:
-                    QMessageBox.critical(self, "Error", f"Upload Failed: {response.text}")
-                    self.status_lbl.setText("Error")
-            except Exception as e:
-                QMessageBox.critical(self, "Error", str(e))
-
-    def fetch_data(self):
-        try:
-            response = requests.get(f"{API_URL}/summary/")
-            if response.status_code == 200:
-                data = response.json()
-                self.update_ui(data)
-                self.status_lbl.setText(f"Data Loaded: {data['filename']}")
-            elif response.status_code == 204:
-                 self.status_lbl.setText("No data available.")
-        except Exception as e:
+                    self.status_lbl.setText("Upload Successful")
+                self.fetch_data()
+            elif response.status == 200 and response.data.get('duplicate'):
+                # Same file as an existing upload; the server hands that one back
+                self.status_lbl.setText(f"Already uploaded (#{response.data['id']})")
+                self.fetch_data()
+            else:
+                QMessageBox.critical(self, "Error", f"Upload Failed: {response.data}")
+                self.status_lbl.setText("Error")
+
+        elif response.tag == 'summary':
+            self.refreshing = False
+            synced = datetime.now().strftime('%H:%M')
+            if response.status == 200:
+                self.cache.save_upload(response.data)
+                self.cache.set_meta('summary_etag', response.headers.get('ETag'))
+                self.fill_upload_picker()
+                if self.viewing is None:
+                    self.show_upload(response.data)
+                self.status_lbl.setText(f"Data Loaded: {response.data['filename']} ({synced})")
+            elif response.status == 304:
+                self.status_lbl.setText(f"Up to date ({synced})")
+            elif response.status == 204:
+                self.status_lbl.setText("No data available.")
+            else:
+                self.status_lbl.setText(f"Server Error ({response.status})")
+
+        elif response.tag in ('chart-rows', 'chart-series'):
+            entry = self.chart_entry(response.context)
+            if entry is None:
+                return
+            if not response.ok:
+                # Let the next refresh try again
+                del self.chart_data[response.context[0]]
+                return
+            if response.tag == 'chart-rows':
+                entry['rows'] = response.data
+            else:
+                entry['series'] = response.data['series']
+            # Keep data of an upload that is no longer on screen, but do not draw it
+            if response.context[0] == self.table_model.upload_id:
+                self.plot_charts(entry)
+
+        elif response.tag == 'history' and response.status == 200:
+            self.cache.save_history(response.data)
+            self.fill_upload_picker()
+
+    def on_network_error(self, request, message):
+        if request.tag == 'upload':
+            self.btn_upload.setEnabled(True)
+            QMessageBox.critical(self, "Error", message)
             self.status_lbl.setText("Connection Error")
-            print(e)
+        elif request.tag == 'summary':
+            self.refreshing = False
+            self.status_lbl.setText("Offline - showing cached data" if self.cache.latest_id() else "Connection Error")
+        elif request.tag in ('chart-rows', 'chart-series') and self.chart_entry(request.context) is not None:
+            # Let the next refresh try again
+            del self.chart_data[request.context[0]]
+        print(message)
+
+    def on_live_event(self, event):
+        if event['type'] == 'batch':
+            self.live_lbl.setText(f"Live {event['stream']}: {event['rows_per_sec']:.0f}/s, "
+                                  f"{event['total_anomalies']} anomalies")
+            if self.viewing is None and not self.live_refresh.isActive():
+                self.live_refresh.start(LIVE_REFRESH_SECONDS * 1000)
+        elif event['type'] == 'anomaly' and event['readings']:
+            top = event['readings'][0]
+            self.live_lbl.setToolTip(f"Latest alert: {top['equipment_name']} ({top['equipment_type']}), "
+                                     f"pressure {top['pressure']}")
+
+    def on_live_status(self, state):
+        if state == 'disconnected':
+            self.live_lbl.setText("Live: reconnecting...")
+        elif state == 'unavailable':
+            self.live_lbl.setText("")
+
+    def closeEvent(self, event):
+        self.poller.stop()
+        self.live_refresh.stop()
+        self.live.stop()
+        self.api.close()
+        self.cache.close()
+        super().closeEvent(event)
 
     def update_ui(self, data):
         stats = data['stats']
@@ -178,19 +440,22 @@ class MainWindow(QMainWindow):
 
         dist = data['distribution']
         labels = [d['equipment_type'] for d in dist]
-        counts = [d['count'] for d in dist]
-        
-        self.canvas.axes.cla() # Clear previous
-        bars = self.canvas.axes.bar(labels, counts, color='#3f51b5', alpha=0.7)
-        self.canvas.axes.set_title("Equipment Count by Type")
-        self.canvas.draw()
-
-        rows = data['data']
-        self.table.setRowCount(len(rows))
-        for i, row in enumerate(rows):
-            self.table.setItem(i, 0, QTableWidgetItem(row['equipment_name']))
-            self.table.setItem(i, 1, QTableWidgetItem(row['equipment_type']))
-            self.table.setItem(i, 2, QTableWidgetItem(str(row['flowrate'])))
+        self.canvas.update_distribution(dist)
+
+        # Keep the selected type if the new upload still has it
+        selected = self.type_filter.currentData()
+        self.type_filter.blockSignals(True)
+        self.type_filter.clear()
+        self.type_filter.addItem("All types", None)
+        for eq_type in labels:
+            self.type_filter.addItem(eq_type, eq_type)
+        self.type_filter.setCurrentIndex(max(self.type_filter.findData(selected), 0))
+        self.type_filter.blockSignals(False)
+        self.table_proxy.set_equipment_type(self.type_filter.currentData())
+
+        # The summary carries aggregates only; the table model pages in the rows
+        self.table_model.load(data['id'])
+        self.load_charts(data['id'], (stats['total_count'], stats['anomaly_count']))
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,247 @@
+"""
+Network layer for the desktop client.
+
+HTTP traffic runs on two worker QThreads, so the GUI thread never blocks on
+the network: one for file uploads, which can take minutes, and one for
+everything else, so a refresh never waits behind an upload. Each worker has
+its own requests.Session that keeps its connection alive, has default
+timeouts, and retries idempotent requests on connection errors and
+502/503/504. Callers queue requests through ApiClient and get the outcome
+back through its `finished` / `failed` signals, which Qt delivers on the GUI
+thread.
+"""
+import json
+import os
+import socket
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PyQt5.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+UPLOAD_TIMEOUT = 600 # large uploads are parsed and scored before the server answers
+RETRIES = 3
+EVENTS_READ_TIMEOUT = 45 # the server pings every 15 s, so silence this long means a dead connection
+EVENTS_MAX_BACKOFF = 60
+
+
+def make_session():
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']), # never replay an upload
+        respect_retry_after_header=True,
+    )
+    # A session serves one worker thread, one request at a time
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept'] = 'application/json'
+    return session
+
+
+class Request:
+    """
+    One queued call. `tag` identifies it in the result signals and `context`
+    is handed back untouched, e.g. to tell stale responses apart.
+    """
+
+    def __init__(self, tag, method, path, params=None, data=None, file_path=None, context=None, headers=None,
+                 parse=None):
+        self.tag = tag
+        self.method = method
+        self.path = path
+        self.params = params
+        self.data = data
+        self.headers = headers
+        self.parse = parse # optional post-processing of the decoded body, run on the worker thread
+        self.file_path = file_path
+        self.context = context
+
+
+class Response:
+
+    def __init__(self, request, status, data, headers):
+        self.tag = request.tag
+        self.context = request.context
+        self.status = status
+        self.data = data
+        self.headers = headers
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+
+class NetworkWorker(QObject):
+    """
+    Lives on the network thread; its slots run there.
+    """
+    finished = pyqtSignal(object) # Response
+    failed = pyqtSignal(object, str) # Request, error message
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+        self.session = None
+
+    @pyqtSlot()
+    def start(self):
+        # Created on the worker thread, the only thread that uses it
+        self.session = make_session()
+
+    @pyqtSlot(object)
+    def execute(self, request):
+        url = f"{self.base_url}/{request.path.lstrip('/')}"
+        try:
+            if request.file_path:
+                with open(request.file_path, 'rb') as f:
+                    files = {'file': (os.path.basename(request.file_path), f)}
+                    response = self.session.request(
+                        request.method, url, params=request.params, data=request.data, files=files,
+                        headers=request.headers, timeout=(CONNECT_TIMEOUT, UPLOAD_TIMEOUT),
+                    )
+            else:
+                response = self.session.request(
+                    request.method, url, params=request.params, data=request.data,
+                    headers=request.headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                )
+        except (requests.RequestException, OSError) as e:
+            self.failed.emit(request, str(e))
+            return
+
+        try:
+            data = response.json() if response.content else None
+        except ValueError:
+            data = response.text
+        if request.parse is not None and response.ok:
+            try:
+                data = request.parse(data)
+            except (TypeError, KeyError, ValueError) as e:
+                self.failed.emit(request, f"Unexpected response: {e}")
+                return
+        self.finished.emit(Response(request, response.status_code, data, dict(response.headers)))
+
+    @pyqtSlot()
+    def stop(self):
+        if self.session is not None:
+            self.session.close()
+
+
+class ApiClient(QObject):
+    """
+    GUI-side handle: queues requests on the worker threads and re-emits the
+    results. Uploads have a worker of their own. Call close() before the
+    application exits.
+    """
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object, str)
+    _submit = pyqtSignal(object)
+    _submit_upload = pyqtSignal(object)
+
+    def __init__(self, base_url, parent=None):
+        super().__init__(parent)
+        self.threads = []
+        self.worker = self._start_worker(base_url, 'network', self._submit)
+        self.upload_worker = self._start_worker(base_url, 'uploads', self._submit_upload)
+
+    def _start_worker(self, base_url, name, submit):
+        thread = QThread()
+        thread.setObjectName(name)
+        worker = NetworkWorker(base_url)
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.start)
+        submit.connect(worker.execute)
+        # finished is emitted on the worker thread, so stop() runs there too
+        thread.finished.connect(worker.stop)
+        worker.finished.connect(self.finished)
+        worker.failed.connect(self.failed)
+        thread.start()
+        self.threads.append(thread)
+        return worker
+
+    def get(self, tag, path, params=None, context=None, headers=None, parse=None):
+        self._submit.emit(Request(tag, 'GET', path, params=params, context=context, headers=headers, parse=parse))
+
+    def post(self, tag, path, data=None, context=None):
+        self._submit.emit(Request(tag, 'POST', path, data=data, context=context))
+
+    def upload(self, tag, path, file_path, data=None, context=None):
+        self._submit_upload.emit(Request(tag, 'POST', path, data=data, file_path=file_path, context=context))
+
+    def close(self):
+        for thread in self.threads:
+            thread.quit()
+        for thread in self.threads:
+            thread.wait()
+
+
+class EventStream(QThread):
+    """
+    Follows a Server-Sent Events endpoint (the live stream) on its own
+    thread and session, reconnecting with backoff. Every event is emitted
+    as a decoded dict. A 404 means the server has no live endpoint (e.g.
+    it runs under WSGI), so the stream gives up quietly.
+    """
+    event = pyqtSignal(object)
+    status = pyqtSignal(str)
+
+    def __init__(self, url, parent=None):
+        super().__init__(parent)
+        self.url = url
+        self.running = False
+        self.response = None
+
+    def run(self):
+        self.running = True
+        backoff = 1
+        with requests.Session() as session:
+            while self.running:
+                try:
+                    self.response = session.get(self.url, stream=True, headers={'Accept': 'text/event-stream'},
+                                                timeout=(CONNECT_TIMEOUT, EVENTS_READ_TIMEOUT))
+                    if self.response.status_code == 404:
+                        self.status.emit('unavailable')
+                        return
+                    self.response.raise_for_status()
+                    self.status.emit('connected')
+                    backoff = 1
+                    for line in self.response.iter_lines(decode_unicode=True):
+                        if not self.running:
+                            return
+                        if line and line.startswith('data: '):
+                            try:
+                                self.event.emit(json.loads(line[6:]))
+                            except ValueError:
+                                pass
+                except (requests.RequestException, OSError):
+                    pass
+                if not self.running:
+                    return
+                self.status.emit('disconnected')
+                for _ in range(backoff * 10):
+                    if not self.running:
+                        return
+                    time.sleep(0.1)
+                backoff = min(backoff * 2, EVENTS_MAX_BACKOFF)
+
+    def stop(self):
+        self.running = False
+        # Shutting the socket down wakes up the blocked read right away;
+        # response.close() would wait for the next event or ping
+        connection = getattr(self.response.raw, 'connection', None) if self.response is not None else None
+        sock = getattr(connection, 'sock', None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.wait(2000)
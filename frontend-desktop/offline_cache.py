@@ -0,0 +1,144 @@
+"""
+On-disk cache for the desktop client (SQLite).
+
+Keeps the dashboard payload of every upload seen so far and the row pages
+fetched for it, keyed by upload id, so the window can render straight
+from disk at startup and keeps working while the backend is asleep or
+unreachable. It also keeps the ETag of the last /api/summary/ response,
+and its highest upload id is the cursor for /api/history/?since=.
+
+Only used from the GUI thread.
+"""
+import json
+import os
+import sqlite3
+
+MAX_UPLOADS = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY,
+    uploaded_at TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    upload_id INTEGER NOT NULL,
+    cursor INTEGER NOT NULL, -- 0 for the first page
+    body TEXT NOT NULL,
+    PRIMARY KEY (upload_id, cursor)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def default_path():
+    root = os.environ.get('CV_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.chemical-visualizer')
+    os.makedirs(root, exist_ok=True)
+    return os.path.join(root, 'cache.sqlite3')
+
+
+class LocalCache:
+
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        self.db = sqlite3.connect(self.path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # Uploads
+
+    def save_upload(self, payload):
+        """
+        Store a dashboard payload (the /api/summary/ shape). A changed payload
+        for a known upload means it was re-flagged, so its pages are dropped.
+        """
+        payload = {key: value for key, value in payload.items() if key != 'data_url'}
+        body = json.dumps(payload, sort_keys=True)
+        with self.db:
+            row = self.db.execute('SELECT payload FROM uploads WHERE id = ?', (payload['id'],)).fetchone()
+            if row is not None and row[0] != body:
+                self.db.execute('DELETE FROM pages WHERE upload_id = ?', (payload['id'],))
+            self.db.execute(
+                'INSERT OR REPLACE INTO uploads (id, uploaded_at, payload) VALUES (?, ?, ?)',
+                (payload['id'], payload.get('uploaded_at'), body),
+            )
+        self._prune()
+
+    def save_history(self, entries):
+        for entry in entries:
+            if entry.get('summary'):
+                self.save_upload(payload_from_history(entry))
+
+    def upload(self, upload_id):
+        row = self.db.execute('SELECT payload FROM uploads WHERE id = ?', (upload_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def uploads(self):
+        """
+        Cached payloads, newest first.
+        """
+        rows = self.db.execute('SELECT payload FROM uploads ORDER BY uploaded_at DESC, id DESC')
+        return [json.loads(row[0]) for row in rows]
+
+    def latest_id(self):
+        return self.db.execute('SELECT MAX(id) FROM uploads').fetchone()[0]
+
+    def _prune(self):
+        with self.db:
+            stale = 'SELECT id FROM uploads ORDER BY uploaded_at DESC, id DESC LIMIT -1 OFFSET ?'
+            self.db.execute(f'DELETE FROM pages WHERE upload_id IN ({stale})', (MAX_UPLOADS,))
+            self.db.execute(f'DELETE FROM uploads WHERE id IN ({stale})', (MAX_UPLOADS,))
+
+    # Row pages
+
+    def save_page(self, upload_id, cursor, page):
+        with self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO pages (upload_id, cursor, body) VALUES (?, ?, ?)',
+                (upload_id, cursor or 0, json.dumps(page)),
+            )
+
+    def page(self, upload_id, cursor):
+        row = self.db.execute(
+            'SELECT body FROM pages WHERE upload_id = ? AND cursor = ?', (upload_id, cursor or 0),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Sync state
+
+    def get_meta(self, key, default=None):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+
+def payload_from_history(entry):
+    """
+    Turn a /api/history/ entry into the /api/summary/ payload shape.
+    """
+    summary = entry['summary']
+    return {
+        'id': entry['id'],
+        'filename': entry['file_name'],
+        'uploaded_at': entry['uploaded_at'],
+        'detector': entry.get('detector'),
+        'model_version': entry.get('model_version'),
+        'stats': {
+            'avg_flow': summary['avg_flow'],
+            'avg_pressure': summary['avg_pressure'],
+            'avg_temp': summary['avg_temp'],
+            'total_count': summary['total_count'],
+            'anomaly_count': summary['anomaly_count'],
+        },
+        'metrics': summary['metrics'],
+        'distribution': summary['distribution'],
+    }
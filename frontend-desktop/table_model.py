@@ -0,0 +1,252 @@
+"""
+Table model for the equipment rows of one upload.
+
+Rows are kept column by column in compact arrays (array.array for the
+numbers and flags, small integer codes for the equipment type) instead of
+one QTableWidgetItem per cell, and cells are only formatted when the view
+asks for a visible one. Further pages are pulled from
+/api/uploads/<id>/data/ through canFetchMore/fetchMore as the user
+scrolls. With a LocalCache, pages already on disk are served from there
+and fetched pages are stored, so rows stay browsable offline. Sorting reorders the arrays in place (a Python sort over one
+column is far cheaper than Qt comparing cells through data()); filtering
+happens in EquipmentFilterProxy.
+"""
+from array import array
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt, QTimer
+from PyQt5.QtGui import QBrush, QColor
+
+PAGE_SIZE = 2000
+FIELDS = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature', 'is_anomaly', 'anomaly_score']
+
+# (header, column key, display format)
+COLUMNS = [
+    ("Name", 'name', '{}'),
+    ("Type", 'type', '{}'),
+    ("Flowrate", 'flowrate', '{:.1f}'),
+    ("Pressure", 'pressure', '{:.2f}'),
+    ("Temperature", 'temperature', '{:.1f}'),
+    ("Anomaly", 'anomaly', None),
+]
+NUMERIC = {'flowrate', 'pressure', 'temperature'}
+
+ANOMALY_BACKGROUND = QBrush(QColor('#fdecea'))
+ANOMALY_FOREGROUND = QBrush(QColor('#c62828'))
+
+
+class EquipmentTableModel(QAbstractTableModel):
+
+    def __init__(self, api, cache=None, parent=None):
+        super().__init__(parent)
+        self.api = api
+        self.cache = cache
+        self.api.finished.connect(self._on_response)
+        self.upload_id = None
+        self.generation = 0
+        self.loading = False
+        self.next_cursor = None
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+        self._clear()
+
+    def _clear(self):
+        self.names = []
+        self.type_codes = array('H')
+        self.types = [] # code -> equipment type
+        self.type_index = {}
+        self.flowrate = array('d')
+        self.pressure = array('d')
+        self.temperature = array('d')
+        self.anomaly = array('b')
+        self.score = array('d')
+
+    def load(self, upload_id):
+        """
+        Show the rows of another upload, starting from the first page.
+        """
+        self.beginResetModel()
+        self._clear()
+        self.upload_id = upload_id
+        self.generation += 1
+        self.loading = False
+        self.next_cursor = None
+        self.endResetModel()
+        self._request(None)
+
+    # Qt model interface
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, key = index.row(), COLUMNS[index.column()][1]
+
+        if role == Qt.DisplayRole:
+            if key == 'anomaly':
+                return f"Yes ({self.score[row]:.2f})" if self.anomaly[row] else ""
+            value = self.value(row, key)
+            if value is None:
+                return ""
+            return COLUMNS[index.column()][2].format(value)
+        if role == Qt.TextAlignmentRole and key in NUMERIC:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role == Qt.BackgroundRole and self.anomaly[row]:
+            return ANOMALY_BACKGROUND
+        if role == Qt.ForegroundRole and self.anomaly[row]:
+            return ANOMALY_FOREGROUND
+        return None
+
+    def value(self, row, key):
+        if key == 'name':
+            return self.names[row]
+        if key == 'type':
+            return self.types[self.type_codes[row]]
+        if key == 'anomaly':
+            return bool(self.anomaly[row])
+        value = getattr(self, key)[row]
+        return None if value != value else value # NaN marks a missing value
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column, self.sort_order = column, order
+        if not self.names:
+            return
+        key = COLUMNS[column][1]
+        if key == 'name':
+            values = self.names
+        elif key == 'type':
+            values = [self.types[code] for code in self.type_codes]
+        elif key == 'anomaly':
+            values = self.score
+        else:
+            values = [float('-inf') if v != v else v for v in getattr(self, key)]
+        permutation = sorted(range(len(values)), key=values.__getitem__, reverse=order == Qt.DescendingOrder)
+
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        self._reorder(permutation)
+        position = {source: target for target, source in enumerate(permutation)}
+        self.changePersistentIndexList(old, [self.index(position[i.row()], i.column()) for i in old])
+        self.layoutChanged.emit()
+
+    def _reorder(self, permutation):
+        self.names = [self.names[i] for i in permutation]
+        for name in ('type_codes', 'flowrate', 'pressure', 'temperature', 'anomaly', 'score'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, [column[i] for i in permutation]))
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.loading and self.next_cursor is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._request(self.next_cursor)
+
+    # Paging
+
+    def _request(self, cursor):
+        if self.upload_id is None:
+            return
+        self.loading = True
+        cached = self.cache.page(self.upload_id, cursor) if self.cache is not None else None
+        if cached is not None:
+            # Not inline: fetchMore may be running inside a view layout pass
+            generation = self.generation
+            QTimer.singleShot(0, lambda: self._add_page(generation, cached))
+            return
+        params = {'limit': PAGE_SIZE, 'fields': ','.join(FIELDS)}
+        if cursor is not None:
+            params['cursor'] = cursor
+        self.api.get('table-page', f'uploads/{self.upload_id}/data/', params=params,
+                     context=(self.generation, self.upload_id, cursor))
+
+    def _on_response(self, response):
+        if response.tag != 'table-page':
+            return
+        generation, upload_id, cursor = response.context
+        if not response.ok:
+            if generation == self.generation:
+                self.loading = False
+                self.next_cursor = None
+            return
+        if self.cache is not None:
+            self.cache.save_page(upload_id, cursor, response.data)
+        self._add_page(generation, response.data)
+
+    def _add_page(self, generation, page):
+        if generation != self.generation:
+            return # a page of an upload no longer shown
+        self.loading = False
+        rows = page['results']
+        self.next_cursor = page['next_cursor']
+        if rows:
+            start = len(self.names)
+            self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+            self._append(rows)
+            self.endInsertRows()
+            if self.sort_column is not None:
+                self.sort(self.sort_column, self.sort_order)
+
+    def _append(self, rows):
+        nan = float('nan')
+        for row in rows:
+            self.names.append(row['equipment_name'])
+            eq_type = row['equipment_type']
+            code = self.type_index.get(eq_type)
+            if code is None:
+                code = self.type_index[eq_type] = len(self.types)
+                self.types.append(eq_type)
+            self.type_codes.append(code)
+            self.flowrate.append(nan if row['flowrate'] is None else row['flowrate'])
+            self.pressure.append(nan if row['pressure'] is None else row['pressure'])
+            self.temperature.append(nan if row['temperature'] is None else row['temperature'])
+            self.anomaly.append(1 if row['is_anomaly'] else 0)
+            self.score.append(row['anomaly_score'] or 0.0)
+
+
+class EquipmentFilterProxy(QSortFilterProxyModel):
+    """
+    Filters on name text, equipment type and the anomaly flag, and hands
+    sorting to the source model. Only the rows fetched so far take part.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.text = ""
+        self.equipment_type = None
+        self.anomalies_only = False
+
+    def set_text(self, text):
+        self.text = text.strip().lower()
+        self.invalidateFilter()
+
+    def set_equipment_type(self, equipment_type):
+        self.equipment_type = equipment_type or None
+        self.invalidateFilter()
+
+    def set_anomalies_only(self, enabled):
+        self.anomalies_only = bool(enabled)
+        self.invalidateFilter()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column >= 0:
+            self.sourceModel().sort(column, order)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        if self.anomalies_only and not model.anomaly[source_row]:
+            return False
+        if self.equipment_type is not None and model.types[model.type_codes[source_row]] != self.equipment_type:
+            return False
+        if self.text and self.text not in model.names[source_row].lower():
+            return False
+        return True
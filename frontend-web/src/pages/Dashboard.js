@@ -9,7 +9,7 @@ import ThermostatIcon from '@mui/icons-material/Thermostat';
 import AssessmentIcon from '@mui/icons-material/Assessment';
 import PictureAsPdfIcon from '@mui/icons-material/PictureAsPdf';
 
-import { getSummary, uploadFile } from '../services/api';
+import { getSummary, getUploadChart, getUploadData, openLiveEvents, uploadFile } from '../services/api';
 import KpiCard from '../components/KpiCard';
 import Navbar from '../components/Navbar';
 
@@ -17,6 +17,11 @@ ChartJS.register(CategoryScale, LinearScale, BarElement, Title, Tooltip, Legend)
 
 const Dashboard = () => {
   const [data, setData] = useState(null);
+  const [rows, setRows] = useState([]);
+  const [anomalies, setAnomalies] = useState([]);
+  const [histogram, setHistogram] = useState(null);
+  const [live, setLive] = useState(null);
+  const [liveAlerts, setLiveAlerts] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
 
@@ -25,6 +30,17 @@ const Dashboard = () => {
       const res = await getSummary();
       setData(res.data);
       setError('');
+      if (res.data?.id) {
+        // The summary only carries aggregates; fetch just the rows we show
+        const [preview, flagged, chart] = await Promise.all([
+          getUploadData(res.data.id, { limit: 8 }),
+          getUploadData(res.data.id, { is_anomaly: true, fields: 'equipment_name', limit: 50 }),
+          getUploadChart(res.data.id, { include: 'histogram', bins: 30 }),
+        ]);
+        setRows(preview.data.results);
+        setAnomalies(flagged.data.results);
+        setHistogram(chart.data.histogram.pressure);
+      }
     } catch (err) {
       console.error(err);
       if(err.response && err.response.status !== 204) setError("Failed to fetch data.");
@@ -33,6 +49,20 @@ const Dashboard = () => {
 
   useEffect(() => { fetchData(); }, []);
 
+  // Live readings: aggregates per micro-batch and the latest flagged readings
+  useEffect(() => {
+    const source = openLiveEvents();
+    source.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type === 'batch') {
+        setLive(event);
+      } else if (event.type === 'anomaly') {
+        setLiveAlerts(prev => [...event.readings, ...prev].slice(0, 10));
+      }
+    };
+    return () => source.close();
+  }, []);
+
   const handleDownloadPdf = () => {
     window.open('http://127.0.0.1:8000/api/export-pdf/', '_blank');
   };
@@ -45,9 +75,15 @@ const Dashboard = () => {
     formData.append('file', e.target.files[0]);
 
     try {
-      await uploadFile(formData);
+      const response = await uploadFile(formData);
       await fetchData(); 
-      setError('');
+      // Rows with bad values are skipped by the server and reported back
+      const { rejected_rows: rejected, row_errors: rowErrors = [] } = response.data;
+      const first = rowErrors[0];
+      setError(rejected
+        ? `${rejected} rows with bad values were skipped` +
+          (first ? ` (row ${first.row}, ${first.column}: ${first.reason})` : '')
+        : '');
     } catch (err) {
       console.error("Upload Error Details:", err); 
       
@@ -71,7 +107,24 @@ const Dashboard = () => {
     ],
   };
 
-  const anomalies = data?.data?.filter(row => row.is_anomaly) || [];
+  // Binned on the server, so this stays a few KB however large the upload is
+  const histogramData = {
+    labels: histogram?.edges.slice(0, -1).map((edge, i) => `${edge}-${histogram.edges[i + 1]}`) || [],
+    datasets: [
+      {
+        label: 'Normal',
+        data: histogram?.counts.map((count, i) => count - histogram.anomalies[i]) || [],
+        backgroundColor: 'rgba(54, 162, 235, 0.6)',
+      },
+      {
+        label: 'Anomalies',
+        data: histogram?.anomalies || [],
+        backgroundColor: 'rgba(211, 47, 47, 0.7)',
+      },
+    ],
+  };
+
+  const anomalyCount = data?.stats?.anomaly_count ?? anomalies.length;
 
   return (
     <div style={{ backgroundColor: '#f4f6f8', minHeight: '100vh', paddingBottom: '20px' }}>
@@ -114,17 +167,34 @@ const Dashboard = () => {
 
         {error && <Alert severity="error" sx={{ mb: 3 }}>{error}</Alert>}
 
+        {live && (
+          <Paper sx={{ p: 3, mb: 3 }}>
+            <Typography component="h2" variant="h6" color="primary" gutterBottom>
+              Live Stream: {live.stream}
+            </Typography>
+            <Typography variant="body2" color="textSecondary">
+              {live.rows_per_sec} readings/s · {live.total_rows} readings · {live.total_anomalies} anomalies ·
+              avg pressure {live.means.pressure ?? '-'} bar
+            </Typography>
+            {liveAlerts.length > 0 && (
+              <Typography variant="body2" sx={{ mt: 1, color: '#d32f2f' }}>
+                Latest alerts: {liveAlerts.map(a => `${a.equipment_name} (${a.pressure} bar)`).join(', ')}
+              </Typography>
+            )}
+          </Paper>
+        )}
+
         {data && (
           <>
             {/* --- NEW AI FEATURE: Anomaly Alert Banner --- */}
-            {anomalies.length > 0 && (
+            {anomalyCount > 0 && (
               <Alert severity="warning" sx={{ mb: 3, border: '1px solid #ff9800', backgroundColor: '#fff4e5' }}>
                 <Typography variant="subtitle1" fontWeight="bold" color="#ed6c02">
-                  ⚠️ AI Alert: {anomalies.length} Anomalies Detected!
+                  ⚠️ AI Alert: {anomalyCount} Anomalies Detected!
                 </Typography>
                 <Typography variant="body2" color="textSecondary">
                   The unusual pressure readings in the following equipment: 
-                  <strong> {anomalies.map(a => a.equipment_name).join(', ')}</strong>.
+                  <strong> {anomalies.map(a => a.equipment_name).join(', ')}{anomalyCount > anomalies.length ? ', ...' : ''}</strong>.
                 </Typography>
               </Alert>
             )}
@@ -177,7 +247,7 @@ const Dashboard = () => {
                       </tr>
                     </thead>
                     <tbody>
-                      {data.data.slice(0, 8).map((row, i) => (
+                      {rows.map((row, i) => (
                         <tr 
                           key={i} 
                           // --- NEW AI FEATURE: Row Highlighting ---
@@ -206,6 +276,25 @@ const Dashboard = () => {
                   </table>
                 </Paper>
               </Grid>
+
+              {/* Pressure histogram from the chart endpoint */}
+              <Grid item xs={12}>
+                <Paper sx={{ p: 3, display: 'flex', flexDirection: 'column', height: 320 }}>
+                  <Typography component="h2" variant="h6" color="primary" gutterBottom>
+                    Pressure Distribution
+                  </Typography>
+                  <Box sx={{ flexGrow: 1, position: 'relative' }}>
+                    <Bar
+                      data={histogramData}
+                      options={{
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        scales: { x: { stacked: true }, y: { stacked: true } },
+                      }}
+                    />
+                  </Box>
+                </Paper>
+              </Grid>
             </Grid>
           </>
         )}
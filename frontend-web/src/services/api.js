@@ -12,3 +12,8 @@ export const uploadFile = (formData) => API.post('/upload/', formData, {
 
 export const getSummary = () => API.get('/summary/');
 export const getHistory = () => API.get('/history/');
+export const getUploadData = (uploadId, params) => API.get(`/uploads/${uploadId}/data/`, { params });
+export const getUploadChart = (uploadId, params) => API.get(`/uploads/${uploadId}/chart/`, { params });
+
+// Server-Sent Events from the live stream (only served by the ASGI app)
+export const openLiveEvents = () => new EventSource(`${API_URL}/live/events/`);
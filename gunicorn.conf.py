@@ -0,0 +1,44 @@
+# gunicorn.conf.py
+"""
+gunicorn settings, read from the working directory:
+
+    gunicorn config.wsgi
+
+CV_PRELOAD decides where the analytics stack (pandas, scikit-learn,
+pyarrow, reportlab; see core/engines.py) is imported:
+
+  * master (default) - once, in the master, before the workers are forked.
+                       Workers start warm and share those pages
+                       copy-on-write instead of holding a copy each.
+  * worker           - in every worker as it boots: warm, but not shared.
+  * off              - on the first request that needs it, per worker.
+                       Needed for `gunicorn --reload`.
+"""
+import os
+
+PRELOAD = os.environ.get('CV_PRELOAD', 'master')
+
+preload_app = PRELOAD == 'master'
+
+# Synchronous uploads of large files are ingested inside the request. Waits
+# in views (REPORT_WAIT_TIMEOUT) must stay well below this.
+timeout = int(os.environ.get('CV_WORKER_TIMEOUT', 120))
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before any worker is forked
+    if PRELOAD != 'master':
+        return
+    from django.db import connections
+
+    from core.engines import preload
+
+    preload(freeze=True)
+    # Every worker would otherwise inherit the same open database connection
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    if PRELOAD == 'worker':
+        from core.engines import preload
+        preload()